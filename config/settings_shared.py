@@ -49,6 +49,7 @@ MIDDLEWARE = [
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "django_structlog.middlewares.RequestMiddleware",
+    "web_app.middleware.AnalyticsMemoizationMiddleware",
 ]
 
 ROOT_URLCONF = "config.urls"
@@ -165,6 +166,30 @@ META_DEFAULT_IMAGE = "img/og.png"
 
 RAW_DATA_DIR = env.str("RAW_DATA_DIR")
 
+# Evaluate analyzer queries on an in-memory copy of the recipe data
+ANALYTICS_SNAPSHOT_ENGINE = env.bool("ANALYTICS_SNAPSHOT_ENGINE", False)
+
+# Seconds to share memoized analysis results across requests, 0 to memoize only within a request
+ANALYTICS_MEMOIZE_TTL = env.int("ANALYTICS_MEMOIZE_TTL", 0)
+
+# Maximum number of memoized analysis results shared across requests, the least recently used ones are evicted
+ANALYTICS_MEMOIZE_MAX_ENTRIES = env.int("ANALYTICS_MEMOIZE_MAX_ENTRIES", 1000)
+
+# Log every analyzer query with its timings and the memoization stats of every request, summarize them with the
+# analytics_query_log command
+ANALYTICS_QUERY_LOG = env.bool("ANALYTICS_QUERY_LOG", False)
+
+# Log the EXPLAIN output of analyzer queries taking at least this many milliseconds, 0 to disable
+ANALYTICS_EXPLAIN_THRESHOLD_MS = env.int("ANALYTICS_EXPLAIN_THRESHOLD_MS", 0)
+
+# Threads per process to run independent analyzer queries in parallel, each one uses a database connection. 0 to run
+# them one after another.
+ANALYTICS_QUERY_THREADS = env.int("ANALYTICS_QUERY_THREADS", 0)
+
+# Threads per process to calculate the charts of the async chart views, each one uses a database connection. 0 to
+# calculate them like other synchronous code.
+ANALYTICS_CHART_THREADS = env.int("ANALYTICS_CHART_THREADS", 4)
+
 WEB_ANALYTICS_ROOT_URL = env.str("WEB_ANALYTICS_ROOT_URL", None)
 WEB_ANALYTICS_SITE_ID = env.str("WEB_ANALYTICS_SITE_ID", None)
 WEB_ANALYTICS_SCRIPT_NAME = "wa.js"
@@ -1,4 +1,5 @@
 import numpy as np
+import pandas as pd
 
 POPULARITY_START_MONTH = "2012-01-01"
 POPULARITY_CUT_OFF_DATE = "2011-12-01"  # One month more to calculate a smooth start
@@ -12,6 +13,16 @@ METRIC_PRECISION = {
 }
 
 
+# Quantiles of the box plot values, see lowerfence(), q1(), q3() and upperfence()
+BOX_PLOT_QUANTILES = {
+    "lowerfence": 0.02,
+    "q1": 0.25,
+    "median": 0.5,
+    "q3": 0.75,
+    "upperfence": 0.98,
+}
+
+
 def lowerfence(x):
     return x.quantile(0.02)
 
@@ -32,3 +43,30 @@ def slope(d):
     if len(d) < 4:
         return 0
     return np.polyfit(np.linspace(0, 1, len(d)), d, 1)[0]
+
+
+# Same as slope(), but for all groups at once. Least squares from the sums per group, the values of each group are
+# placed at equidistant points between 0 and 1 in their given order.
+def grouped_slope(df: pd.DataFrame, group_column: str, value_column: str) -> pd.Series:
+    df = df[df[group_column].notnull()]
+    codes, groups = pd.factorize(df[group_column], sort=True)
+    num_groups = len(groups)
+    n = np.bincount(codes, minlength=num_groups)
+
+    # Position of each value within its group
+    order = np.argsort(codes, kind="stable")
+    group_starts = np.concatenate([[0], np.cumsum(n)[:-1]])
+    positions = np.empty(len(codes), dtype=np.int64)
+    positions[order] = np.arange(len(codes)) - group_starts[codes[order]]
+
+    x = positions / np.maximum(n - 1, 1)[codes]
+    y = df[value_column].values.astype(float)
+    sum_x = np.bincount(codes, weights=x, minlength=num_groups)
+    sum_y = np.bincount(codes, weights=y, minlength=num_groups)
+    sum_xy = np.bincount(codes, weights=x * y, minlength=num_groups)
+    sum_xx = np.bincount(codes, weights=x * x, minlength=num_groups)
+
+    enough_values = n >= 4
+    with np.errstate(invalid="ignore", divide="ignore"):
+        slopes = (n * sum_xy - sum_x * sum_y) / (n * sum_xx - sum_x**2)
+    return pd.Series(np.where(enough_values, slopes, 0.0), index=pd.Index(groups, name=group_column))
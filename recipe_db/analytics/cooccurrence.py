@@ -0,0 +1,61 @@
+from typing import Optional, List, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+# Sparse recipe x entity matrix to count, how often entities are used together in recipes
+class CooccurrenceMatrix:
+    def __init__(self, recipe_ids, entity_ids, amounts=None) -> None:
+        recipe_ids = pd.Series(recipe_ids).values
+        entity_ids = pd.Series(entity_ids).values
+        known = pd.notnull(entity_ids)
+
+        # Entity codes are sorted, so that comparing codes is equal to comparing the entity ids
+        recipe_codes, self.recipe_ids = pd.factorize(recipe_ids[known])
+        entity_codes, self.entity_ids = pd.factorize(entity_ids[known], sort=True)
+        self.entity_index = {entity_id: i for i, entity_id in enumerate(self.entity_ids)}
+
+        shape = (len(self.recipe_ids), len(self.entity_ids))
+        ones = np.ones(len(recipe_codes), dtype=np.int32)
+        self.matrix = sparse.csc_matrix((ones, (recipe_codes, entity_codes)), shape=shape)
+        self.matrix.sum_duplicates()
+        self.matrix.data[:] = 1  # Count recipes, not rows
+
+        self.amounts = None
+        if amounts is not None:
+            amounts = pd.Series(amounts).values[known].astype(float)
+            self.amounts = sparse.csc_matrix((amounts, (recipe_codes, entity_codes)), shape=shape)
+            self.amounts.sum_duplicates()
+
+    def counts(self) -> sparse.csr_matrix:
+        # Entity x entity matrix with the number of recipes using both entities
+        counts = (self.matrix.T @ self.matrix).tocsr()
+        counts.setdiag(0)
+        counts.eliminate_zeros()
+        return counts
+
+    def pairs(self, entity_id: Optional[str] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Unique pairs (first < second) and their number of recipes, optionally only pairs including the entity
+        counts = sparse.triu(self.counts(), k=1).tocoo()
+        first, second, num_recipes = counts.row, counts.col, counts.data
+        if entity_id is not None:
+            code = self.entity_index.get(entity_id, -1)
+            selected = (first == code) | (second == code)
+            first, second, num_recipes = first[selected], second[selected], num_recipes[selected]
+        return first, second, num_recipes
+
+    def top_pairs(self, num_top: int, entity_id: Optional[str] = None) -> List[Tuple[str, str, int]]:
+        first, second, num_recipes = self.pairs(entity_id)
+
+        # Most recipes first, equal number of recipes is ordered by the entity ids
+        order = np.lexsort((second, first, -num_recipes))[:num_top]
+        return [(self.entity_ids[first[i]], self.entity_ids[second[i]], int(num_recipes[i])) for i in order]
+
+    def pair_amounts(self, entity_id_1: str, entity_id_2: str) -> Tuple[np.ndarray, np.ndarray]:
+        # Amounts of both entities in the recipes using them together
+        column_1 = self.amounts.getcol(self.entity_index[entity_id_1])
+        column_2 = self.amounts.getcol(self.entity_index[entity_id_2])
+        _, positions_1, positions_2 = np.intersect1d(column_1.indices, column_2.indices, return_indices=True)
+        return column_1.data[positions_1], column_2.data[positions_2]
@@ -0,0 +1,70 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, Future
+from contextvars import ContextVar
+from threading import Lock
+from typing import Callable, Optional, List
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, close_old_connections
+
+
+# Thread pool with the size from a setting, 0 threads to not use a pool. Every thread uses its own database connection,
+# so the pool size limits the additional connections per process. Context variables (e.g. memoization) are passed
+# on to the pool threads.
+class BoundedExecutor:
+    def __init__(self, threads_setting: str, thread_name_prefix: str) -> None:
+        self.threads_setting = threads_setting
+        self.thread_name_prefix = thread_name_prefix
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.lock = Lock()
+
+        # Set within the pool threads, so nested calls don't wait for a slot of the pool they're occupying
+        self.in_pool: ContextVar[bool] = ContextVar(thread_name_prefix + "_in_pool", default=False)
+
+    def get_executor(self) -> Optional[ThreadPoolExecutor]:
+        num_threads = settings.__getattr__(self.threads_setting)
+        if not num_threads:
+            return None
+
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=num_threads, thread_name_prefix=self.thread_name_prefix)
+            return self.executor
+
+    def submit(self, callback: Callable, *args) -> Future:
+        return self.get_executor().submit(contextvars.copy_context().run, self._run_in_pool, callback, *args)
+
+    def _run_in_pool(self, callback: Callable, *args):
+        self.in_pool.set(True)
+        close_old_connections()
+        try:
+            return callback(*args)
+        finally:
+            close_old_connections()
+
+
+QUERY_EXECUTOR = BoundedExecutor("ANALYTICS_QUERY_THREADS", "analytics-query")
+
+
+# Runs independent analysis callbacks (usually a query each) concurrently and returns their results in order. Runs
+# them sequentially when no pool is configured or within a transaction, because other connections wouldn't see its
+# changes.
+def run_parallel(*callbacks: Callable) -> List:
+    executor = QUERY_EXECUTOR.get_executor()
+    if executor is None or QUERY_EXECUTOR.in_pool.get() or connection.in_atomic_block or len(callbacks) < 2:
+        return [callback() for callback in callbacks]
+
+    # The first callback runs in the calling thread, which would wait anyway
+    futures = [QUERY_EXECUTOR.submit(callback) for callback in callbacks[1:]]
+    first_result = callbacks[0]()
+    return [first_result] + [future.result() for future in futures]
+
+
+# Awaits a synchronous callback, which runs in the pool of the executor. Without a pool it runs like any other
+# synchronous code called from async code.
+async def run_in_executor(executor: BoundedExecutor, callback: Callable, *args):
+    if executor.get_executor() is None:
+        return await sync_to_async(callback)(*args)
+    return await asyncio.wrap_future(executor.submit(callback, *args))
@@ -1,14 +1,16 @@
 from abc import ABC
 from typing import Optional
 
-import pandas as pd
-from django.db import connection
 from pandas import DataFrame
 
-from recipe_db.analytics import METRIC_PRECISION, lowerfence, q1, q3, upperfence
-from recipe_db.analytics.recipe import RecipeLevelAnalysis
+from recipe_db.analytics import METRIC_PRECISION
+from recipe_db.analytics.instrumentation import read_sql
+from recipe_db.analytics.memoize import is_bundled
+from recipe_db.analytics.recipe import RecipeLevelAnalysis, RecipeRowsAnalysis
 from recipe_db.analytics.scope import StyleSelection, FermentableSelection, FermentableScope
-from recipe_db.analytics.utils import remove_outliers, get_style_names_dict, get_fermentable_names_dict, db_query_fetch_dictlist
+from recipe_db.analytics.sketch import load_sketch
+from recipe_db.analytics.utils import get_style_names_dict, get_fermentable_names_dict, db_query_fetch_dictlist, aggregate_box_plot, db_histogram, sketch_box_plot, sum_amounts
+from recipe_db.models import MetricSketch
 
 
 class FermentableLevelAnalysis(ABC):
@@ -18,6 +20,12 @@ class FermentableLevelAnalysis(ABC):
 
 class FermentableAmountRangeAnalysis(FermentableLevelAnalysis):
     def amount_range(self) -> DataFrame:
+        # Optimization: Single fermentable without further filter criteria => use pre-calculated sketch from calculate_metrics
+        if len(self.scope.fermentables) == 1:
+            sketch = load_sketch(MetricSketch.FERMENTABLE, self.scope.fermentables[0].id, "amount_percent")
+            if sketch is not None and sketch.count > 0:
+                return sketch_box_plot(sketch, "amount_percent")
+
         fermentable_scope_filter = self.scope.get_filter()
 
         query = """
@@ -30,13 +38,12 @@ class FermentableAmountRangeAnalysis(FermentableLevelAnalysis):
             )
 
         query_parameters = fermentable_scope_filter.where_parameters
-        df = pd.read_sql(query, connection, params=query_parameters)
+        df = read_sql(query, query_parameters)
         if len(df) == 0:
             return df
 
         # Calculate ranges
-        agg = [lowerfence, q1, "median", "mean", q3, upperfence]
-        aggregated = df.agg({"amount_percent": agg})
+        aggregated = aggregate_box_plot(df, "amount_percent")
 
         return aggregated
 
@@ -46,30 +53,22 @@ class FermentableMetricHistogram(FermentableLevelAnalysis):
         precision = METRIC_PRECISION[metric] if metric in METRIC_PRECISION else METRIC_PRECISION["default"]
 
         fermentable_scope_filter = self.scope.get_filter()
-        query = """
-                SELECT ROUND({metric}, {precision}) as {metric}
+        from_statement = """
                 FROM recipe_db_recipefermentable AS rf
                 WHERE 1 {where}
             """.format(
-                metric=metric,
-                precision=precision,
                 where=fermentable_scope_filter.where_statement,
             )
 
         query_parameters = fermentable_scope_filter.where_parameters
-        df = pd.read_sql(query, connection, params=query_parameters)
-        if len(df) == 0:
-            return df
-
-        df = remove_outliers(df, metric, 0.02)
-        if len(df) == 0:
-            return df
+        value_expression = "ROUND({}, {})".format(metric, precision)
 
-        histogram = df.groupby([pd.cut(df[metric], 16, precision=precision)])[metric].agg(["count"])
-        histogram = histogram.reset_index()
-        histogram[metric] = histogram[metric].map(str)
+        # Optimization: Single fermentable without further filter criteria => outlier limits from the pre-calculated sketch
+        sketch = None
+        if len(self.scope.fermentables) == 1:
+            sketch = load_sketch(MetricSketch.FERMENTABLE, self.scope.fermentables[0].id, metric)
 
-        return histogram
+        return db_histogram(metric, value_expression, from_statement, query_parameters, precision, 16, sketch=sketch)
 
 
 class FermentableAmountAnalysis(RecipeLevelAnalysis):
@@ -79,7 +78,29 @@ class FermentableAmountAnalysis(RecipeLevelAnalysis):
         num_top: Optional[int] = None,
     ) -> DataFrame:
         fermentable_selection = fermentable_selection or FermentableSelection()
+        if is_bundled():
+            df = self._per_fermentable_from_bundle(fermentable_selection)
+        else:
+            df = self._per_fermentable_from_db(fermentable_selection)
+        if len(df) == 0:
+            return df
 
+        # Calculate range
+        per_style = aggregate_box_plot(df, "amount_percent", by="kind_id", extra_aggregations={"recipe_id": "nunique"})
+        per_style = per_style.reset_index()
+
+        # Sort by number of recipes
+        per_style = per_style.sort_values(by=("recipe_id", "nunique"), ascending=False)
+
+        # Show only top values
+        if num_top is not None:
+            per_style = per_style[:num_top]
+
+        # Add style names
+        per_style["fermentable"] = per_style["kind_id"].map(get_fermentable_names_dict())
+        return per_style
+
+    def _per_fermentable_from_db(self, fermentable_selection: FermentableSelection) -> DataFrame:
         recipe_scope_filter = self.scope.get_filter()
         fermentable_selection_filter = fermentable_selection.get_filter()
 
@@ -103,13 +124,33 @@ class FermentableAmountAnalysis(RecipeLevelAnalysis):
         query_params = (recipe_scope_filter.join_parameters
                         + recipe_scope_filter.where_parameters
                         + fermentable_selection_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_params)
+        return read_sql(query, query_params)
+
+    def _per_fermentable_from_bundle(self, fermentable_selection: FermentableSelection) -> DataFrame:
+        df = RecipeRowsAnalysis(self.scope).fermentables()
+        if len(fermentable_selection.fermentables) > 0:
+            df = df[df["kind_id"].isin([fermentable.id for fermentable in fermentable_selection.fermentables])]
+        if len(fermentable_selection.categories) > 0:
+            df = df[df["category"].isin(fermentable_selection.categories)]
+        if len(fermentable_selection.types) > 0:
+            df = df[df["type"].isin(fermentable_selection.types)]
+        return sum_amounts(df, ["recipe_id", "kind_id"])
+
+    def per_style(
+        self,
+        style_selection: Optional[StyleSelection] = None,
+        num_top: Optional[int] = None,
+    ) -> DataFrame:
+        style_selection = style_selection or StyleSelection()
+        if is_bundled():
+            df = self._per_style_from_bundle(style_selection)
+        else:
+            df = self._per_style_from_db(style_selection)
         if len(df) == 0:
             return df
 
         # Calculate range
-        agg = [lowerfence, q1, "median", "mean", q3, upperfence]
-        per_style = df.groupby("kind_id").agg({"amount_percent": agg, "recipe_id": "nunique"})
+        per_style = aggregate_box_plot(df, "amount_percent", by="style_id", extra_aggregations={"recipe_id": "nunique"})
         per_style = per_style.reset_index()
 
         # Sort by number of recipes
@@ -120,16 +161,10 @@ class FermentableAmountAnalysis(RecipeLevelAnalysis):
             per_style = per_style[:num_top]
 
         # Add style names
-        per_style["fermentable"] = per_style["kind_id"].map(get_fermentable_names_dict())
+        per_style["beer_style"] = per_style["style_id"].map(get_style_names_dict())
         return per_style
 
-    def per_style(
-        self,
-        style_selection: Optional[StyleSelection] = None,
-        num_top: Optional[int] = None,
-    ) -> DataFrame:
-        style_selection = style_selection or StyleSelection()
-
+    def _per_style_from_db(self, style_selection: StyleSelection) -> DataFrame:
         recipe_scope_filter = self.scope.get_filter()
         style_selection_filter = style_selection.get_filter()
 
@@ -156,25 +191,16 @@ class FermentableAmountAnalysis(RecipeLevelAnalysis):
         query_parameters = (recipe_scope_filter.join_parameters
                             + recipe_scope_filter.where_parameters
                             + style_selection_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_parameters)
-        if len(df) == 0:
-            return df
+        return read_sql(query, query_parameters)
 
-        # Calculate range
-        agg = [lowerfence, q1, "median", "mean", q3, upperfence]
-        per_style = df.groupby("style_id").agg({"amount_percent": agg, "recipe_id": "nunique"})
-        per_style = per_style.reset_index()
+    def _per_style_from_bundle(self, style_selection: StyleSelection) -> DataFrame:
+        rows = RecipeRowsAnalysis(self.scope)
+        styles = rows.styles()
+        if len(style_selection.styles) > 0:
+            styles = styles[styles["style_id"].isin(style_selection.get_style_ids())]
 
-        # Sort by number of recipes
-        per_style = per_style.sort_values(by=("recipe_id", "nunique"), ascending=False)
-
-        # Show only top values
-        if num_top is not None:
-            per_style = per_style[:num_top]
-
-        # Add style names
-        per_style["beer_style"] = per_style["style_id"].map(get_style_names_dict())
-        return per_style
+        df = rows.fermentables().merge(styles, on="recipe_id")
+        return sum_amounts(df, ["recipe_id", "style_id", "kind_id"])
 
 
 class UnmappedFermentablesAnalysis:
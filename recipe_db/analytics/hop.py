@@ -2,14 +2,26 @@ from abc import ABC
 from typing import Optional
 
 import pandas as pd
-from django.db import connection
 from pandas import DataFrame
 
-from recipe_db.analytics import METRIC_PRECISION, lowerfence, q1, q3, upperfence
-from recipe_db.analytics.recipe import RecipeLevelAnalysis
+from recipe_db.analytics import METRIC_PRECISION
+from recipe_db.analytics.cooccurrence import CooccurrenceMatrix
+from recipe_db.analytics.instrumentation import read_sql
+from recipe_db.analytics.memoize import is_bundled
+from recipe_db.analytics.recipe import RecipeLevelAnalysis, RecipeRowsAnalysis
 from recipe_db.analytics.scope import StyleSelection, HopSelection, HopScope
-from recipe_db.analytics.utils import remove_outliers, get_style_names_dict, get_hop_names_dict, db_query_fetch_dictlist, db_query_fetch_single
-from recipe_db.models import RecipeHop, Tag, IgnoredHop, Hop
+from recipe_db.analytics.sketch import load_sketch
+from recipe_db.analytics.utils import (
+    get_style_names_dict,
+    get_hop_names_dict,
+    db_query_fetch_dictlist,
+    db_query_fetch_single,
+    aggregate_box_plot,
+    db_histogram,
+    sketch_box_plot,
+    sum_amounts,
+)
+from recipe_db.models import RecipeHop, Tag, IgnoredHop, Hop, MetricSketch
 
 
 class HopLevelAnalysis(ABC):
@@ -19,6 +31,12 @@ class HopLevelAnalysis(ABC):
 
 class HopAmountRangeAnalysis(HopLevelAnalysis):
     def amount_range(self) -> DataFrame:
+        # Optimization: Single hop without further filter criteria => use pre-calculated sketch from calculate_metrics
+        if len(self.scope.hops) == 1:
+            sketch = load_sketch(MetricSketch.HOP, self.scope.hops[0].id, "amount_percent")
+            if sketch is not None and sketch.count > 0:
+                return sketch_box_plot(sketch, "amount_percent")
+
         hop_scope_filter = self.scope.get_filter()
 
         query = """
@@ -31,13 +49,12 @@ class HopAmountRangeAnalysis(HopLevelAnalysis):
             )
 
         query_parameters = hop_scope_filter.where_parameters
-        df = pd.read_sql(query, connection, params=query_parameters)
+        df = read_sql(query, query_parameters)
         if len(df) == 0:
             return df
 
         # Calculate ranges
-        agg = [lowerfence, q1, "median", "mean", q3, upperfence]
-        aggregated = df.agg({"amount_percent": agg})
+        aggregated = aggregate_box_plot(df, "amount_percent")
 
         return aggregated
 
@@ -47,30 +64,22 @@ class HopMetricHistogram(HopLevelAnalysis):
         precision = METRIC_PRECISION[metric] if metric in METRIC_PRECISION else METRIC_PRECISION["default"]
 
         hop_scope_filter = self.scope.get_filter()
-        query = """
-                SELECT ROUND({metric}, {precision}) as {metric}
+        from_statement = """
                 FROM recipe_db_recipehop AS rh
                 WHERE 1 {where}
             """.format(
-            metric=metric,
-            precision=precision,
-            where=hop_scope_filter.where_statement
-        )
+                where=hop_scope_filter.where_statement,
+            )
 
         query_parameters = hop_scope_filter.where_parameters
-        df = pd.read_sql(query, connection, params=query_parameters)
-        if len(df) == 0:
-            return df
+        value_expression = "ROUND({}, {})".format(metric, precision)
 
-        df = remove_outliers(df, metric, 0.02)
-        if len(df) == 0:
-            return df
-
-        histogram = df.groupby([pd.cut(df[metric], 16, precision=precision)])[metric].agg(["count"])
-        histogram = histogram.reset_index()
-        histogram[metric] = histogram[metric].map(str)
+        # Optimization: Single hop without further filter criteria => outlier limits from the pre-calculated sketch
+        sketch = None
+        if len(self.scope.hops) == 1:
+            sketch = load_sketch(MetricSketch.HOP, self.scope.hops[0].id, metric)
 
-        return histogram
+        return db_histogram(metric, value_expression, from_statement, query_parameters, precision, 16, sketch=sketch)
 
 
 class HopAmountAnalysis(RecipeLevelAnalysis):
@@ -104,13 +113,12 @@ class HopAmountAnalysis(RecipeLevelAnalysis):
         query_parameters = (recipe_scope_filter.join_parameters
                             + recipe_scope_filter.where_parameters
                             + hop_selection_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_parameters)
+        df = read_sql(query, query_parameters)
         if len(df) == 0:
             return df
 
         # Calculate range
-        agg = [lowerfence, q1, "median", "mean", q3, upperfence]
-        per_style = df.groupby("kind_id").agg({"amount_percent": agg, "recipe_id": "nunique"})
+        per_style = aggregate_box_plot(df, "amount_percent", by="kind_id", extra_aggregations={"recipe_id": "nunique"})
         per_style = per_style.reset_index()
 
         # Sort by number of recipes
@@ -130,7 +138,29 @@ class HopAmountAnalysis(RecipeLevelAnalysis):
         num_top: Optional[int] = None,
     ) -> DataFrame:
         style_selection = style_selection or StyleSelection()
+        if is_bundled():
+            df = self._per_style_from_bundle(style_selection)
+        else:
+            df = self._per_style_from_db(style_selection)
+        if len(df) == 0:
+            return df
 
+        # Calculate range
+        per_style = aggregate_box_plot(df, "amount_percent", by="style_id", extra_aggregations={"recipe_id": "nunique"})
+        per_style = per_style.reset_index()
+
+        # Sort by number of recipes
+        per_style = per_style.sort_values(by=("recipe_id", "nunique"), ascending=False)
+
+        # Show only top values
+        if num_top is not None:
+            per_style = per_style[:num_top]
+
+        # Add style names
+        per_style["beer_style"] = per_style["style_id"].map(get_style_names_dict())
+        return per_style
+
+    def _per_style_from_db(self, style_selection: StyleSelection) -> DataFrame:
         recipe_scope_filter = self.scope.get_filter()
         style_selection_filter = style_selection.get_filter()
 
@@ -157,29 +187,41 @@ class HopAmountAnalysis(RecipeLevelAnalysis):
         query_parameters = (recipe_scope_filter.join_parameters
                             + recipe_scope_filter.where_parameters
                             + style_selection_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_parameters)
+        return read_sql(query, query_parameters)
+
+    def _per_style_from_bundle(self, style_selection: StyleSelection) -> DataFrame:
+        rows = RecipeRowsAnalysis(self.scope)
+        styles = rows.styles()
+        if len(style_selection.styles) > 0:
+            styles = styles[styles["style_id"].isin(style_selection.get_style_ids())]
+
+        df = rows.hops().merge(styles, on="recipe_id")
+        return sum_amounts(df, ["recipe_id", "style_id", "kind_id"])
+
+    def per_use(self, hop_selection: Optional[HopSelection] = None) -> DataFrame:
+        hop_selection = hop_selection or HopSelection()
+        if is_bundled():
+            df = self._per_use_from_bundle(hop_selection)
+        else:
+            df = self._per_use_from_db(hop_selection)
         if len(df) == 0:
             return df
 
         # Calculate range
-        agg = [lowerfence, q1, "median", "mean", q3, upperfence]
-        per_style = df.groupby("style_id").agg({"amount_percent": agg, "recipe_id": "nunique"})
-        per_style = per_style.reset_index()
-
-        # Sort by number of recipes
-        per_style = per_style.sort_values(by=("recipe_id", "nunique"), ascending=False)
-
-        # Show only top values
-        if num_top is not None:
-            per_style = per_style[:num_top]
+        per_use = aggregate_box_plot(df, "amount_percent", by="use_id")
+        per_use = per_use.reset_index()
 
-        # Add style names
-        per_style["beer_style"] = per_style["style_id"].map(get_style_names_dict())
-        return per_style
+        # Sort by use (in brewing order)
+        per_use["use_id"] = pd.Categorical(
+            per_use["use_id"], categories=list(RecipeHop.get_uses().keys()), ordered=True
+        )
+        per_use = per_use.sort_values(by="use_id")
 
-    def per_use(self, hop_selection: Optional[HopSelection] = None) -> DataFrame:
-        hop_selection = hop_selection or HopSelection()
+        # Finally, add use names
+        per_use["use"] = per_use["use_id"].map(RecipeHop.get_uses())
+        return per_use
 
+    def _per_use_from_db(self, hop_selection: HopSelection) -> DataFrame:
         recipe_scope_filter = self.scope.get_filter()
         hop_selection_filter = hop_selection.get_filter()
         query = """
@@ -203,28 +245,57 @@ class HopAmountAnalysis(RecipeLevelAnalysis):
         query_parameters = (recipe_scope_filter.join_parameters
                             + recipe_scope_filter.where_parameters
                             + hop_selection_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_parameters)
-        if len(df) == 0:
-            return df
+        return read_sql(query, query_parameters)
 
-        # Calculate range
-        agg = [lowerfence, q1, "median", "mean", q3, upperfence]
-        per_use = df.groupby("use_id").agg({"amount_percent": agg})
-        per_use = per_use.reset_index()
+    def _per_use_from_bundle(self, hop_selection: HopSelection) -> DataFrame:
+        df = RecipeRowsAnalysis(self.scope).hops()
+        df = df[df["use_id"].notnull()]
+        if len(hop_selection.hops) > 0:
+            df = df[df["kind_id"].isin([hop.id for hop in hop_selection.hops])]
+        if len(hop_selection.uses) > 0:
+            df = df[df["use_id"].isin(hop_selection.uses)]
+        return sum_amounts(df, ["recipe_id", "use_id", "kind_id"])
 
-        # Sort by use (in brewing order)
-        per_use["use_id"] = pd.Categorical(
-            per_use["use_id"], categories=list(RecipeHop.get_uses().keys()), ordered=True
+
+class HopPairingAnalysis(RecipeLevelAnalysis):
+    def pairings(self, hop_selection: Optional[Hop] = None) -> DataFrame:
+        if is_bundled():
+            df = RecipeRowsAnalysis(self.scope).hops()
+            df = sum_amounts(df[df["amount_percent"] > 0], ["recipe_id", "kind_id"])
+        else:
+            df = self._pairings_from_db()
+
+        # Count pairs in a sparse recipe x hop matrix, only the top pairs are materialized
+        matrix = CooccurrenceMatrix(df["recipe_id"], df["kind_id"], df["amount_percent"])
+        hop_id = hop_selection.id if hop_selection is not None else None
+        pairs_dfs = []
+        for kind_id_1, kind_id_2, _ in matrix.top_pairs(12, hop_id):
+            pairing = kind_id_1 + " " + kind_id_2
+            amounts_1, amounts_2 = matrix.pair_amounts(kind_id_1, kind_id_2)
+            pairs_dfs.append(DataFrame({"pairing": pairing, "kind_id": kind_id_1, "amount_percent": amounts_1}))
+            pairs_dfs.append(DataFrame({"pairing": pairing, "kind_id": kind_id_2, "amount_percent": amounts_2}))
+
+        # Merge left and right hop into one dataset
+        if len(pairs_dfs) == 0:
+            top_pairings = DataFrame({"pairing": [], "kind_id": [], "amount_percent": pd.Series(dtype=float)})
+        else:
+            top_pairings = pd.concat(pairs_dfs)
+
+        # Calculate boxplot values
+        aggregated = aggregate_box_plot(
+            top_pairings, "amount_percent", by=["pairing", "kind_id"], extra_aggregations={"amount_percent": "count"}
+        )
+        aggregated = aggregated.reset_index()
+        aggregated = aggregated.sort_values(
+            by=[("amount_percent", "count"), "pairing", "kind_id"], ascending=[False, True, True]
         )
-        per_use = per_use.sort_values(by="use_id")
 
-        # Finally, add use names
-        per_use["use"] = per_use["use_id"].map(RecipeHop.get_uses())
-        return per_use
+        # Finally, add hop names
+        aggregated["hop"] = aggregated["kind_id"].map(get_hop_names_dict())
 
+        return aggregated
 
-class HopPairingAnalysis(RecipeLevelAnalysis):
-    def pairings(self, hop_selection: Optional[Hop] = None) -> DataFrame:
+    def _pairings_from_db(self) -> DataFrame:
         recipe_scope_filter = self.scope.get_filter()
         query = """
             SELECT
@@ -245,38 +316,7 @@ class HopPairingAnalysis(RecipeLevelAnalysis):
 
         query_parameters = (recipe_scope_filter.join_parameters
                             + recipe_scope_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_parameters)
-
-        # Create unique pairs per recipe
-        pairs = pd.merge(df, df, on="recipe_id", suffixes=("_1", "_2"))
-        pairs = pairs[pairs["kind_id_1"] < pairs["kind_id_2"]]
-        pairs["pairing"] = pairs["kind_id_1"] + " " + pairs["kind_id_2"]
-
-        # Filter pairs for hops within selection
-        if hop_selection is not None:
-            pairs = pairs[(pairs["kind_id_1"] == hop_selection.id) | (pairs["kind_id_2"] == hop_selection.id)]
-
-        # Filter only the top pairs
-        top_pairings = pairs["pairing"].value_counts()[:12].index.values
-        pairs = pairs[pairs["pairing"].isin(top_pairings)]
-
-        # Merge left and right hop into one dataset
-        df1 = pairs[["pairing", "kind_id_1", "amount_percent_1"]]
-        df1.columns = ["pairing", "kind_id", "amount_percent"]
-        df2 = pairs[["pairing", "kind_id_2", "amount_percent_2"]]
-        df2.columns = ["pairing", "kind_id", "amount_percent"]
-        top_pairings = pd.concat([df1, df2])
-
-        # Calculate boxplot values
-        agg = [lowerfence, q1, "median", "mean", q3, upperfence, "count"]
-        aggregated = top_pairings.groupby(["pairing", "kind_id"]).agg({"amount_percent": agg})
-        aggregated = aggregated.reset_index()
-        aggregated = aggregated.sort_values(by=[("amount_percent", "count"), "pairing", "kind_id"], ascending=[False, True, True])
-
-        # Finally, add hop names
-        aggregated["hop"] = aggregated["kind_id"].map(get_hop_names_dict())
-
-        return aggregated
+        return read_sql(query, query_parameters)
 
 
 class UnmappedHopsAnalysis:
@@ -335,7 +375,7 @@ class HopSearchAnalysis:
             LIMIT 10
         """
 
-        df = pd.read_sql(query, connection)
+        df = read_sql(query)
         df['volume'] = (df['volume'] / max_volume * 100).round()
 
         return df
@@ -352,7 +392,7 @@ class HopSearchAnalysis:
             LIMIT 10
         """
 
-        df = pd.read_sql(query, connection)
+        df = read_sql(query)
         df['volume'] = (df['volume'] / max_volume * 100).round()
 
         return df
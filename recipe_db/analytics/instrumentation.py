@@ -0,0 +1,139 @@
+import hashlib
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+import structlog
+from django.conf import settings
+from django.db import connection, DatabaseError
+from pandas import DataFrame
+
+QUERY_LOG_EVENT = "analytics_query"
+MEMOIZE_LOG_EVENT = "analytics_memoize"
+
+logger = structlog.get_logger("recipe_db.analytics.query")
+
+# Chart, which is currently calculated, see chart_context()
+_chart_type: ContextVar[Optional[str]] = ContextVar("chart_type", default=None)
+
+_whitespace = re.compile(r"\s+")
+_placeholder_list = re.compile(r"\(\s*%s(?:\s*,\s*%s)*\s*\)")
+_literal = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+@contextmanager
+def chart_context(chart_type: str):
+    token = _chart_type.set(chart_type)
+    try:
+        yield
+    finally:
+        _chart_type.reset(token)
+
+
+def is_query_log_enabled() -> bool:
+    return settings.__getattr__("ANALYTICS_QUERY_LOG")
+
+
+def get_explain_threshold() -> int:
+    return settings.__getattr__("ANALYTICS_EXPLAIN_THRESHOLD_MS")
+
+
+# Queries, which only differ in their literals or the number of values in an IN list, share the same fingerprint
+def normalize_query(query: str) -> str:
+    query = _whitespace.sub(" ", query).strip()
+    query = _placeholder_list.sub("(%s, ...)", query)
+    return _literal.sub("?", query)
+
+
+def query_fingerprint(query: str) -> str:
+    return hashlib.sha1(normalize_query(query).encode()).hexdigest()[:12]
+
+
+# Drop-in replacement for pd.read_sql on the default connection, which times the database and the DataFrame part
+def read_sql(query: str, params: Optional[list] = None) -> DataFrame:
+    if params is None:
+        params = []
+
+    start = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        rows = cursor.fetchall()
+    db_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    df = DataFrame.from_records(rows, columns=columns, coerce_float=True)
+    pandas_time = time.perf_counter() - start
+
+    record_query(query, params, len(rows), db_time, pandas_time, caller_depth=2)
+    return df
+
+
+def record_query(
+    query: str,
+    params: list,
+    num_rows: int,
+    db_time: float,
+    pandas_time: Optional[float] = None,
+    caller_depth: int = 1,
+) -> None:
+    if not is_query_log_enabled():
+        return
+
+    event = dict(
+        fingerprint=query_fingerprint(query),
+        query=normalize_query(query),
+        params_count=len(params),
+        params_types=sorted({type(param).__name__ for param in params}),
+        rows=num_rows,
+        db_ms=round(db_time * 1000, 3),
+        pandas_ms=round(pandas_time * 1000, 3) if pandas_time is not None else None,
+        analysis=get_calling_analysis(caller_depth + 1),
+        chart_type=_chart_type.get(),
+    )
+
+    threshold = get_explain_threshold()
+    if threshold and db_time * 1000 >= threshold:
+        event["explain"] = explain_query(query, params)
+
+    logger.info(QUERY_LOG_EVENT, **event)
+
+
+# Logs the memoization stats of a request, see memoization()
+def log_memoize_stats(stats, path: str) -> None:
+    if not is_query_log_enabled() or stats.hits + stats.misses == 0:
+        return
+
+    logger.info(
+        MEMOIZE_LOG_EVENT,
+        path=path,
+        hits=stats.hits,
+        misses=stats.misses,
+        saved_ms=round(stats.saved_seconds * 1000, 3),
+    )
+
+
+# Class of the first method up the stack, starting from the code which executed the query
+def get_calling_analysis(depth: int, max_frames: int = 5) -> Optional[str]:
+    frame = sys._getframe(depth)
+    for _ in range(max_frames):
+        if frame is None:
+            break
+        instance = frame.f_locals.get("self")
+        if instance is not None:
+            return type(instance).__name__
+        frame = frame.f_back
+    return None
+
+
+def explain_query(query: str, params: list) -> Optional[list]:
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN " + query, params)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except DatabaseError:
+        return None
@@ -0,0 +1,174 @@
+import functools
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Optional, Tuple
+
+from django.conf import settings
+from pandas import DataFrame
+
+from recipe_db.data_version import get_data_version
+
+# Results memoized within the current request or warmup batch, see memoization()
+_memoized_results: ContextVar[Optional[dict]] = ContextVar("memoized_results", default=None)
+_bundled: ContextVar[bool] = ContextVar("bundled", default=False)
+
+# Results shared across requests, only used when ANALYTICS_MEMOIZE_TTL is set. Least recently used results are
+# evicted beyond ANALYTICS_MEMOIZE_MAX_ENTRIES.
+_shared_results = OrderedDict()
+_shared_results_lock = Lock()
+
+
+class MemoizeStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+        self.lock = Lock()
+
+    def hit(self, duration: float) -> None:
+        with self.lock:
+            self.hits += 1
+            self.saved_seconds += duration
+
+    def miss(self) -> None:
+        with self.lock:
+            self.misses += 1
+
+    def reset(self) -> None:
+        with self.lock:
+            self.hits = 0
+            self.misses = 0
+            self.saved_seconds = 0.0
+
+
+# Totals of the process, the stats of a single block are yielded by memoization()
+MEMOIZE_STATS = MemoizeStats()
+_block_stats: ContextVar[Optional[MemoizeStats]] = ContextVar("memoize_block_stats", default=None)
+
+
+# Deduplicates memoized analyses within the block, e.g. a request or a batch of charts, and yields its stats. Nested
+# blocks share the results and stats of the outer block.
+@contextmanager
+def memoization():
+    if _memoized_results.get() is not None:
+        yield _block_stats.get()
+        return
+
+    stats = MemoizeStats()
+    token = _memoized_results.set({})
+    stats_token = _block_stats.set(stats)
+    try:
+        yield stats
+    finally:
+        _block_stats.reset(stats_token)
+        _memoized_results.reset(token)
+
+
+# Analyses within the block derive their data from rows shared by all charts of an entity (see RecipeRowsAnalysis),
+# instead of running a query per chart. Only worth it when most charts of the entity are calculated.
+@contextmanager
+def bundle():
+    token = _bundled.set(True)
+    try:
+        with memoization():
+            yield
+    finally:
+        _bundled.reset(token)
+
+
+def is_bundled() -> bool:
+    return _bundled.get()
+
+
+def scope_fingerprint(scope) -> Tuple:
+    scope_filter = scope.get_filter()
+    return (
+        scope_filter.join_statement,
+        tuple(scope_filter.join_parameters),
+        scope_filter.where_statement,
+        tuple(scope_filter.where_parameters),
+    )
+
+
+def get_memoize_ttl() -> int:
+    return settings.__getattr__("ANALYTICS_MEMOIZE_TTL")
+
+
+def get_memoize_max_entries() -> int:
+    return settings.__getattr__("ANALYTICS_MEMOIZE_MAX_ENTRIES")
+
+
+# Memoizes the result of an analysis method by its scope and arguments. Arguments have to be hashable values, so
+# only use it on methods without selection objects. DataFrames are copied, so callers can modify the result.
+def memoized(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        results = _memoized_results.get()
+        ttl = get_memoize_ttl()
+        if results is None and not ttl:
+            return method(self, *args, **kwargs)
+
+        key = (method.__qualname__, scope_fingerprint(self.scope), args, tuple(sorted(kwargs.items())))
+        entry = results.get(key) if results is not None else None
+        if entry is None and ttl:
+            entry = _get_shared_result(key)
+
+        block_stats = _block_stats.get()
+        if entry is not None:
+            result, duration = entry
+            MEMOIZE_STATS.hit(duration)
+            if block_stats is not None:
+                block_stats.hit(duration)
+        else:
+            MEMOIZE_STATS.miss()
+            if block_stats is not None:
+                block_stats.miss()
+            start = time.perf_counter()
+            result = method(self, *args, **kwargs)
+            entry = (result, time.perf_counter() - start)
+            if ttl:
+                _set_shared_result(key, entry, ttl)
+
+        if results is not None:
+            results[key] = entry
+        return result.copy() if isinstance(result, DataFrame) else result
+
+    return wrapper
+
+
+def clear_shared_results() -> None:
+    with _shared_results_lock:
+        _shared_results.clear()
+
+
+def _get_shared_result(key) -> Optional[tuple]:
+    with _shared_results_lock:
+        shared = _shared_results.get(key)
+        if shared is not None:
+            _shared_results.move_to_end(key)
+    if shared is None:
+        return None
+
+    expires, data_version, entry = shared
+    if expires < time.monotonic() or data_version != get_data_version():
+        return None
+    return entry
+
+
+def _set_shared_result(key, entry: tuple, ttl: int) -> None:
+    now = time.monotonic()
+    data_version = get_data_version()
+    max_entries = get_memoize_max_entries()
+    with _shared_results_lock:
+        # Remove expired results
+        for expired_key in [k for k, (expires, _, _) in _shared_results.items() if expires < now]:
+            del _shared_results[expired_key]
+        _shared_results.pop(key, None)
+        _shared_results[key] = (now + ttl, data_version, entry)
+
+        # Evict least recently used results
+        while len(_shared_results) > max_entries:
+            _shared_results.popitem(last=False)
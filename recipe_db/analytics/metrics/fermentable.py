@@ -1,11 +1,11 @@
 from enum import Enum
 from typing import Optional, Dict, List
 
-import pandas as pd
-from django.db import connection
 from pandas import DataFrame
 
 from recipe_db.analytics import lowerfence, upperfence
+from recipe_db.analytics.instrumentation import read_sql
+from recipe_db.analytics.sketch import QuantileSketch
 from recipe_db.models import Fermentable
 
 
@@ -28,7 +28,7 @@ class FermentableMetricCalculator:
     def _get_recipe_fermentables(self) -> DataFrame:
         if self.aggregated is None:
             self.aggregated = (
-                pd.read_sql("SELECT * FROM recipe_db_recipefermentable WHERE kind_id IS NOT NULL", connection)
+                read_sql("SELECT * FROM recipe_db_recipefermentable WHERE kind_id IS NOT NULL")
                 .groupby(["recipe_id", "kind_id"])
                 .agg({"amount_percent": "sum", "color_lovibond": "mean", "color_ebc": "mean"})
                 .reset_index()
@@ -49,7 +49,11 @@ class FermentableMetricCalculator:
         field_name = metric.value
         return lowerfence(recipes[field_name]), recipes[field_name].median(), upperfence(recipes[field_name])
 
+    def calc_sketch(self, fermentable: Fermentable, metric: FermentableMetric) -> QuantileSketch:
+        recipes = self._get_fermentable(fermentable)
+        return QuantileSketch.from_values(recipes[metric.value])
+
     def calc_percentiles(self) -> dict:
-        df = pd.read_sql_query("SELECT id, recipes_count FROM recipe_db_fermentable", connection)
+        df = read_sql("SELECT id, recipes_count FROM recipe_db_fermentable")
         df["percentile"] = df["recipes_count"].rank(pct=True)
         return df.set_index("id")["percentile"].to_dict()
@@ -1,11 +1,11 @@
 from enum import Enum
 from typing import List, Optional, Dict
 
-import pandas as pd
-from django.db import connection
 from pandas import DataFrame
 
 from recipe_db.analytics import lowerfence, upperfence
+from recipe_db.analytics.instrumentation import read_sql
+from recipe_db.analytics.sketch import QuantileSketch
 from recipe_db.analytics.utils import db_query_fetch_tuples
 from recipe_db.models import Hop
 
@@ -29,7 +29,7 @@ class HopMetricCalculator:
     def _get_recipe_hops(self) -> DataFrame:
         if self.aggregated is None:
             self.aggregated = (
-                pd.read_sql("SELECT * FROM recipe_db_recipehop WHERE kind_id IS NOT NULL", connection)
+                read_sql("SELECT * FROM recipe_db_recipehop WHERE kind_id IS NOT NULL")
                 .groupby(["recipe_id", "kind_id"])
                 .agg({"amount_percent": "sum", "alpha": "mean", "beta": "mean"})
                 .reset_index()
@@ -59,24 +59,11 @@ class HopMetricCalculator:
         """
         return dict(db_query_fetch_tuples(query, [hop.id]))
 
+    def calc_sketch(self, hop: Hop, metric: HopMetric) -> QuantileSketch:
+        recipes = self._get_hop(hop)
+        return QuantileSketch.from_values(recipes[metric.value])
+
     def calc_percentiles(self) -> dict:
-        df = pd.read_sql_query("SELECT id, recipes_count FROM recipe_db_hop", connection)
+        df = read_sql("SELECT id, recipes_count FROM recipe_db_hop")
         df["percentile"] = df["recipes_count"].rank(pct=True)
         return df.set_index("id")["percentile"].to_dict()
-
-    def clac_pairings(self, hop: Hop) -> dict:
-        query = """
-            SELECT
-                rh2.kind_id,
-                COUNT(DISTINCT rh2.recipe_id) AS num_recipes
-            FROM recipe_db_hop AS h
-            JOIN recipe_db_recipehop AS rh1
-                ON h.id = rh1.kind_id
-            JOIN recipe_db_recipehop AS rh2
-                ON rh1.recipe_id = rh2.recipe_id AND rh1.kind_id != rh2.kind_id
-            WHERE rh1.kind_id = %s
-            GROUP BY rh1.kind_id, rh2.kind_id
-            ORDER BY num_recipes DESC
-        """
-
-        return dict(db_query_fetch_tuples(query, [hop.id]))
@@ -1,11 +1,11 @@
 from enum import Enum
 from typing import Optional, List, Dict
 
-import pandas as pd
-from django.db import connection
 from pandas import DataFrame
 
 from recipe_db.analytics import lowerfence, upperfence
+from recipe_db.analytics.instrumentation import read_sql
+from recipe_db.analytics.sketch import QuantileSketch
 from recipe_db.models import Style
 
 
@@ -32,7 +32,7 @@ class StyleMetricCalculator:
 
     def _get_recipes(self) -> DataFrame:
         if self.recipes is None:
-            self.recipes = pd.read_sql("SELECT * FROM recipe_db_recipe WHERE style_id IS NOT NULL", connection)
+            self.recipes = read_sql("SELECT * FROM recipe_db_recipe WHERE style_id IS NOT NULL")
         return self.recipes
 
     def _get_style_recipes(self, style: Style) -> DataFrame:
@@ -49,7 +49,11 @@ class StyleMetricCalculator:
         field_name = metric.value
         return lowerfence(recipes[field_name]), recipes[field_name].median(), upperfence(recipes[field_name])
 
+    def calc_sketch(self, style: Style, metric: StyleMetric) -> QuantileSketch:
+        recipes = self._get_style_recipes(style)
+        return QuantileSketch.from_values(recipes[metric.value])
+
     def calc_percentiles(self) -> dict:
-        df = pd.read_sql_query("SELECT id, recipes_count FROM recipe_db_style", connection)
+        df = read_sql("SELECT id, recipes_count FROM recipe_db_style")
         df["percentile"] = df["recipes_count"].rank(pct=True)
         return df.set_index("id")["percentile"].to_dict()
@@ -1,6 +1,4 @@
-import pandas as pd
-from django.db import connection
-
+from recipe_db.analytics.instrumentation import read_sql
 from recipe_db.analytics.utils import db_query_fetch_single
 from recipe_db.models import Yeast
 
@@ -18,6 +16,6 @@ class YeastMetricCalculator:
         return db_query_fetch_single(query, [yeast.id])
 
     def calc_percentiles(self) -> dict:
-        df = pd.read_sql_query("SELECT id, recipes_count FROM recipe_db_yeast", connection)
+        df = read_sql("SELECT id, recipes_count FROM recipe_db_yeast")
         df["percentile"] = df["recipes_count"].rank(pct=True)
         return df.set_index("id")["percentile"].to_dict()
@@ -1,19 +1,26 @@
 import math
 from abc import ABC
-from typing import Optional, Iterable
+from threading import Lock
+from typing import Optional, Iterable, List
 
+import numpy as np
 import pandas as pd
-from django.db import connection
 from pandas import DataFrame
 
 from recipe_db.analytics import METRIC_PRECISION, POPULARITY_START_MONTH, POPULARITY_CUT_OFF_DATE
+from recipe_db.analytics.executor import run_parallel
+from recipe_db.analytics.instrumentation import read_sql
+from recipe_db.analytics.memoize import memoized, is_bundled
 from recipe_db.analytics.scope import (
+    FilterInterface,
     RecipeScope,
     StyleSelection,
     YeastSelection,
     HopSelection,
     FermentableSelection,
 )
+from recipe_db.analytics.sketch import load_sketch
+from recipe_db.analytics.snapshot import get_snapshot, SNAPSHOT_METRICS
 from recipe_db.analytics.utils import (
     remove_outliers,
     get_style_names_dict,
@@ -22,9 +29,14 @@ from recipe_db.analytics.utils import (
     get_fermentable_names_dict,
     RollingAverage,
     Trending,
-    months_ago, db_query_fetch_single,
+    months_ago, db_query_fetch_single, db_histogram,
 )
-from recipe_db.models import Recipe, Style
+from recipe_db.data_version import get_data_version, get_popularity_version
+from recipe_db.models import Recipe, Style, MonthlyPopularity, MetricSketch
+
+# Random recipes of scopes with less than this multiple of the requested recipes are sampled from all their recipes.
+# Otherwise, at most this multiple of random positions is drawn.
+RANDOM_CANDIDATES_PER_RECIPE = 4
 
 
 class RecipeLevelAnalysis(ABC):
@@ -32,15 +44,252 @@ class RecipeLevelAnalysis(ABC):
         self.scope = scope
 
 
+# Reads the monthly recipe counts, which are pre-calculated by the calculate_popularity command
+class PrecalculatedPopularity:
+    # Whether the counts were calculated at the current data version, so they aren't outdated by later changes (e.g.
+    # import_recipes). Checked again when the data version was changed.
+    _available: Optional[bool] = None
+    _data_version: Optional[int] = None
+    _lock = Lock()
+
+    @classmethod
+    def is_available(cls) -> bool:
+        data_version = get_data_version()
+        with cls._lock:
+            if cls._available is None or cls._data_version != data_version:
+                cls._available = get_popularity_version() == data_version
+                cls._data_version = data_version
+            return cls._available
+
+    def per_month(self, entity_type: str, alias: str, id_column: str, selection_filter: FilterInterface) -> DataFrame:
+        # Expose the pre-calculated values under the alias and id column of the original table,
+        # so that the selection filter can be applied as it is
+        query = """
+                SELECT
+                    {alias}.month,
+                    {alias}.{id_column},
+                    {alias}.recipes
+                FROM (
+                    SELECT month, entity_id AS {id_column}, recipes
+                    FROM recipe_db_monthlypopularity
+                    WHERE entity_type = %s
+                        AND month >= %s  -- Cut-off date for popularity charts
+                ) AS {alias}
+                WHERE 1 {where}
+                ORDER BY {alias}.month ASC
+            """.format(
+                alias=alias,
+                id_column=id_column,
+                where=selection_filter.where_statement,
+            )
+
+        query_parameters = ([entity_type, POPULARITY_CUT_OFF_DATE]
+                            + selection_filter.where_parameters)
+        return read_sql(query, query_parameters)
+
+    def total_per_month(self) -> DataFrame:
+        query = """
+                SELECT
+                    c.month,
+                    c.recipes AS total_recipes
+                FROM recipe_db_monthlyrecipecount AS c
+                ORDER BY c.month ASC
+            """
+
+        df = read_sql(query)
+        df = df.set_index("month")
+        return df
+
+
+# Ingredient rows of all recipes in the scope, shared by the analyses in bundle mode (see memoize.bundle)
+class RecipeRowsAnalysis(RecipeLevelAnalysis):
+    @memoized
+    def hops(self) -> DataFrame:
+        recipe_scope_filter = self.scope.get_filter()
+        query = """
+                SELECT
+                    rh.recipe_id,
+                    rh.kind_id,
+                    rh.use AS use_id,
+                    rh.amount_percent
+                FROM recipe_db_recipe AS r
+                {join}
+                JOIN recipe_db_recipehop AS rh
+                    ON r.uid = rh.recipe_id
+                WHERE 1 {where}
+            """.format(
+                join=recipe_scope_filter.join_statement,
+                where=recipe_scope_filter.where_statement,
+            )
+
+        query_parameters = (recipe_scope_filter.join_parameters
+                            + recipe_scope_filter.where_parameters)
+        return read_sql(query, query_parameters)
+
+    @memoized
+    def styles(self) -> DataFrame:
+        recipe_scope_filter = self.scope.get_filter()
+        query = """
+                SELECT
+                    ras.recipe_id,
+                    ras.style_id
+                FROM recipe_db_recipe AS r
+                {join}
+                JOIN recipe_db_recipe_associated_styles AS ras
+                    ON r.uid = ras.recipe_id
+                WHERE 1 {where}
+            """.format(
+                join=recipe_scope_filter.join_statement,
+                where=recipe_scope_filter.where_statement,
+            )
+
+        query_parameters = (recipe_scope_filter.join_parameters
+                            + recipe_scope_filter.where_parameters)
+        return read_sql(query, query_parameters)
+
+    @memoized
+    def fermentables(self) -> DataFrame:
+        recipe_scope_filter = self.scope.get_filter()
+        query = """
+                SELECT
+                    rf.recipe_id,
+                    rf.kind_id,
+                    f.category,
+                    f.type,
+                    rf.amount_percent
+                FROM recipe_db_recipe AS r
+                {join}
+                JOIN recipe_db_recipefermentable AS rf
+                    ON r.uid = rf.recipe_id
+                LEFT JOIN recipe_db_fermentable AS f
+                    ON rf.kind_id = f.id
+                WHERE 1 {where}
+            """.format(
+                join=recipe_scope_filter.join_statement,
+                where=recipe_scope_filter.where_statement,
+            )
+
+        query_parameters = (recipe_scope_filter.join_parameters
+                            + recipe_scope_filter.where_parameters)
+        return read_sql(query, query_parameters)
+
+    @memoized
+    def yeasts(self) -> DataFrame:
+        recipe_scope_filter = self.scope.get_filter()
+        query = """
+                SELECT
+                    r.created_month AS month,
+                    ry.recipe_id,
+                    ry.kind_id,
+                    y.type
+                FROM recipe_db_recipe AS r
+                {join}
+                JOIN recipe_db_recipeyeast AS ry
+                    ON r.uid = ry.recipe_id
+                LEFT JOIN recipe_db_yeast AS y
+                    ON ry.kind_id = y.id
+                WHERE 1 {where}
+            """.format(
+                join=recipe_scope_filter.join_statement,
+                where=recipe_scope_filter.where_statement,
+            )
+
+        query_parameters = (recipe_scope_filter.join_parameters
+                            + recipe_scope_filter.where_parameters)
+        return read_sql(query, query_parameters)
+
+    # Same as COUNT(DISTINCT r.uid) ... GROUP BY month, ry.kind_id on the recipes since the popularity cut-off date
+    def yeasts_per_month(self, yeast_selection: YeastSelection) -> DataFrame:
+        df = self.yeasts()
+        df = df[pd.to_datetime(df["month"]) >= pd.Timestamp(POPULARITY_CUT_OFF_DATE)]
+        if len(yeast_selection.yeasts) > 0:
+            df = df[df["kind_id"].isin([yeast.id for yeast in yeast_selection.yeasts])]
+        if len(yeast_selection.types) > 0:
+            df = df[df["type"].isin(yeast_selection.types)]
+        return df.groupby(["month", "kind_id"], dropna=False)["recipe_id"].nunique().rename("recipes").reset_index()
+
+
 class RecipesListAnalysis(RecipeLevelAnalysis):
-    def random(self, num_recipes: int) -> Iterable[Recipe]:
+    # Random recipes from the scope, the same seed returns the same recipes as long as the data isn't changed
+    def random(self, num_recipes: int, seed: Optional[int] = None) -> Iterable[Recipe]:
+        # Optimization: Sample from the in-memory recipe ids, when the snapshot engine is enabled
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            recipe_ids = snapshot.sample(self.scope, num_recipes, seed)
+        else:
+            rng = np.random.default_rng(seed)
+
+            # Sample from all recipes, when there are only a few in the scope
+            num_candidates = num_recipes * RANDOM_CANDIDATES_PER_RECIPE
+            recipe_ids = self._recipe_ids_by_sample_key(0.0, num_candidates)
+            if len(recipe_ids) < num_candidates:
+                if len(recipe_ids) > num_recipes:
+                    recipe_ids = rng.choice(recipe_ids, num_recipes, replace=False).tolist()
+            else:
+                recipe_ids = self._random_recipe_ids(rng, num_recipes)
+
+        if len(recipe_ids) == 0:
+            return []
+
+        return Recipe.objects.filter(uid__in=recipe_ids).order_by("name")
+
+    # The recipes following independent random positions in the sample_key index, wrapping around at the end. Recipes
+    # drawn twice are replaced by further draws.
+    def _random_recipe_ids(self, rng: np.random.Generator, num_recipes: int) -> List[str]:
+        recipe_ids = []
+        remaining_draws = num_recipes * RANDOM_CANDIDATES_PER_RECIPE
+        while len(recipe_ids) < num_recipes and remaining_draws > 0:
+            starts = rng.random(min(num_recipes - len(recipe_ids), remaining_draws))
+            remaining_draws -= len(starts)
+            for recipe_id in self._recipe_ids_at_sample_keys(starts):
+                if recipe_id is None:
+                    return recipe_ids
+                if recipe_id not in recipe_ids and len(recipe_ids) < num_recipes:
+                    recipe_ids.append(recipe_id)
+        return recipe_ids
+
+    # The first recipe at or after each of the positions in the sample_key index, or the first recipe of the scope at
+    # the end of the index. Optimization: All positions are looked up with a single query.
+    def _recipe_ids_at_sample_keys(self, starts: Iterable[float]) -> List[Optional[str]]:
+        recipe_scope_filter = self.scope.get_filter()
+        starts = list(starts) + [0.0]
+        probe_query = """
+                SELECT * FROM (
+                    SELECT {probe} AS probe, r.uid AS recipe_id
+                    FROM recipe_db_recipe AS r
+                    {join}
+                    WHERE r.sample_key >= %s {where}
+                    ORDER BY r.sample_key ASC
+                    LIMIT 1
+                ) AS p{probe}
+            """
+        query = " UNION ALL ".join(
+            probe_query.format(
+                probe=probe,
+                join=recipe_scope_filter.join_statement,
+                where=recipe_scope_filter.where_statement,
+            )
+            for probe in range(len(starts))
+        )
+
+        query_parameters = []
+        for start in starts:
+            query_parameters += (recipe_scope_filter.join_parameters
+                                 + [float(start)]
+                                 + recipe_scope_filter.where_parameters)
+        df = read_sql(query, query_parameters)
+        recipe_ids = dict(zip(df["probe"], df["recipe_id"]))
+        first_recipe_id = recipe_ids.get(len(starts) - 1)
+        return [recipe_ids.get(probe, first_recipe_id) for probe in range(len(starts) - 1)]
+
+    def _recipe_ids_by_sample_key(self, start: float, num_recipes: int) -> List[str]:
         recipe_scope_filter = self.scope.get_filter()
         query = """
                 SELECT r.uid AS recipe_id
                 FROM recipe_db_recipe AS r
                 {join}
-                WHERE 1 {where}
-                ORDER BY RAND()
+                WHERE r.sample_key >= %s {where}
+                ORDER BY r.sample_key ASC
                 LIMIT %s
             """.format(
                 join=recipe_scope_filter.join_statement,
@@ -48,18 +297,20 @@ class RecipesListAnalysis(RecipeLevelAnalysis):
             )
 
         query_parameters = (recipe_scope_filter.join_parameters
+                            + [float(start)]
                             + recipe_scope_filter.where_parameters
                             + [num_recipes])
-        df = pd.read_sql(query, connection, params=query_parameters)
-        recipe_ids = df["recipe_id"].values.tolist()
-        if len(recipe_ids) == 0:
-            return []
-
-        return Recipe.objects.filter(uid__in=recipe_ids).order_by("name")
+        df = read_sql(query, query_parameters)
+        return df["recipe_id"].values.tolist()
 
 
 class RecipesCountAnalysis(RecipeLevelAnalysis):
     def total(self) -> int:
+        # Optimization: Evaluate the scope in-memory, when the snapshot engine is enabled
+        snapshot = get_snapshot()
+        if snapshot is not None:
+            return snapshot.count(self.scope)
+
         recipe_scope_filter = self.scope.get_filter()
         query = """
                 SELECT
@@ -80,12 +331,12 @@ class RecipesCountAnalysis(RecipeLevelAnalysis):
         recipe_scope_filter = self.scope.get_filter()
         query = """
                 SELECT
-                    DATE(r.created) AS day,
+                    r.created AS day,
                     COUNT(*) AS total_recipes
                 FROM recipe_db_recipe AS r
                 {join}
-                WHERE created IS NOT NULL {where}
-                GROUP BY date(r.created)
+                WHERE r.created IS NOT NULL {where}
+                GROUP BY r.created
             """.format(
                 join=recipe_scope_filter.join_statement,
                 where=recipe_scope_filter.where_statement,
@@ -93,20 +344,26 @@ class RecipesCountAnalysis(RecipeLevelAnalysis):
 
         query_parameters = (recipe_scope_filter.join_parameters
                             + recipe_scope_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_parameters)
+        df = read_sql(query, query_parameters)
         df = df.set_index("day")
 
         return df
 
+    @memoized
     def per_month(self) -> DataFrame:
         recipe_scope_filter = self.scope.get_filter()
+
+        # Optimization: No filter criteria given => use pre-calculated values from the popularity table
+        if not recipe_scope_filter.has_filter() and PrecalculatedPopularity.is_available():
+            return PrecalculatedPopularity().total_per_month()
+
         query = """
                 SELECT
-                    DATE_ADD(DATE(r.created), INTERVAL -DAY(r.created)+1 DAY) AS month,
+                    r.created_month AS month,
                     COUNT(*) AS total_recipes
                 FROM recipe_db_recipe AS r
                 {join}
-                WHERE created IS NOT NULL {where}
+                WHERE r.created_month IS NOT NULL {where}
                 GROUP BY month
                 ORDER BY month ASC
             """.format(
@@ -116,11 +373,12 @@ class RecipesCountAnalysis(RecipeLevelAnalysis):
 
         query_parameters = (recipe_scope_filter.join_parameters
                             + recipe_scope_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_parameters)
+        df = read_sql(query, query_parameters)
         df = df.set_index("month")
 
         return df
 
+    @memoized
     def per_style(self) -> DataFrame:
         recipe_scope_filter = self.scope.get_filter()
 
@@ -146,7 +404,7 @@ class RecipesCountAnalysis(RecipeLevelAnalysis):
 
         query_parameters = (recipe_scope_filter.join_parameters
                             + recipe_scope_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_parameters)
+        df = read_sql(query, query_parameters)
         df = df.set_index("style_id")
         return df
 
@@ -158,7 +416,7 @@ class RecipesCountAnalysis(RecipeLevelAnalysis):
                 FROM recipe_db_style AS s
             """
 
-        df = pd.read_sql(query, connection)
+        df = read_sql(query)
         df = df.set_index("style_id")
         return df
 
@@ -174,31 +432,39 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
 
         recipe_scope_filter = self.scope.get_filter()
         style_selection_filter = style_selection.get_filter()
-        query = """
-                SELECT
-                    DATE_ADD(DATE(r.created), INTERVAL -DAY(r.created)+1 DAY) AS month,
-                    ras.style_id,
-                    COUNT(*) AS recipes
-                FROM recipe_db_recipe AS r
-                {join}
-                JOIN recipe_db_recipe_associated_styles AS ras
-                    ON r.uid = ras.recipe_id
-                WHERE
-                    r.created >= %s  -- Cut-off date for popularity charts
-                    {where1} {where2}
-                GROUP BY month, ras.style_id
-                ORDER BY month ASC
-            """.format(
-                join=recipe_scope_filter.join_statement,
-                where1=recipe_scope_filter.where_statement,
-                where2=style_selection_filter.where_statement,
-            )
 
-        query_parameters = (recipe_scope_filter.join_parameters
-                            + [POPULARITY_CUT_OFF_DATE]
-                            + recipe_scope_filter.where_parameters
-                            + style_selection_filter.where_parameters)
-        per_month = pd.read_sql(query, connection, params=query_parameters)
+        def load_per_month() -> DataFrame:
+            # Optimization: No filter criteria given => use pre-calculated values from the popularity table
+            if not recipe_scope_filter.has_filter() and PrecalculatedPopularity.is_available():
+                return PrecalculatedPopularity().per_month(MonthlyPopularity.STYLE, "ras", "style_id", style_selection_filter)
+
+            query = """
+                    SELECT
+                        r.created_month AS month,
+                        ras.style_id,
+                        COUNT(*) AS recipes
+                    FROM recipe_db_recipe AS r
+                    {join}
+                    JOIN recipe_db_recipe_associated_styles AS ras
+                        ON r.uid = ras.recipe_id
+                    WHERE
+                        r.created_month >= %s  -- Cut-off date for popularity charts
+                        {where1} {where2}
+                    GROUP BY month, ras.style_id
+                    ORDER BY month ASC
+                """.format(
+                    join=recipe_scope_filter.join_statement,
+                    where1=recipe_scope_filter.where_statement,
+                    where2=style_selection_filter.where_statement,
+                )
+
+            query_parameters = (recipe_scope_filter.join_parameters
+                                + [POPULARITY_CUT_OFF_DATE]
+                                + recipe_scope_filter.where_parameters
+                                + style_selection_filter.where_parameters)
+            return read_sql(query, query_parameters)
+
+        per_month, recipes_per_month = run_parallel(load_per_month, RecipesCountAnalysis(self.scope).per_month)
         if len(per_month) == 0:
             return per_month
 
@@ -211,7 +477,6 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
             top_ids = top_scope.groupby("style_id")["recipes"].sum().sort_values(ascending=False).index.values[:num_top]
             per_month = per_month[per_month["style_id"].isin(top_ids)]
 
-        recipes_per_month = RecipesCountAnalysis(self.scope).per_month()
         per_month = per_month.merge(recipes_per_month, on="month")
         per_month["recipes_percent"] = per_month["recipes"] / per_month["total_recipes"]
 
@@ -241,30 +506,38 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
 
         recipe_scope_filter = self.scope.get_filter()
         hop_selection_filter = hop_selection.get_filter()
-        query = """
-                SELECT
-                    DATE_ADD(DATE(r.created), INTERVAL -DAY(r.created)+1 DAY) AS month,
-                    rh.kind_id,
-                    COUNT(DISTINCT r.uid) AS recipes
-                FROM recipe_db_recipe AS r
-                {join}
-                JOIN recipe_db_recipehop AS rh
-                    ON r.uid = rh.recipe_id
-                WHERE
-                    r.created >= %s  -- Cut-off date for popularity charts
-                    {where1} {where2}
-                GROUP BY month, rh.kind_id
-            """.format(
-                join=recipe_scope_filter.join_statement,
-                where1=recipe_scope_filter.where_statement,
-                where2=hop_selection_filter.where_statement,
-            )
 
-        query_parameters = (recipe_scope_filter.join_parameters
-                            + [POPULARITY_CUT_OFF_DATE]
-                            + recipe_scope_filter.where_parameters
-                            + hop_selection_filter.where_parameters)
-        per_month = pd.read_sql(query, connection, params=query_parameters)
+        def load_per_month() -> DataFrame:
+            # Optimization: No filter criteria given => use pre-calculated values from the popularity table
+            if not recipe_scope_filter.has_filter() and len(hop_selection.uses) == 0 and PrecalculatedPopularity.is_available():
+                return PrecalculatedPopularity().per_month(MonthlyPopularity.HOP, "rh", "kind_id", hop_selection_filter)
+
+            query = """
+                    SELECT
+                        r.created_month AS month,
+                        rh.kind_id,
+                        COUNT(DISTINCT r.uid) AS recipes
+                    FROM recipe_db_recipe AS r
+                    {join}
+                    JOIN recipe_db_recipehop AS rh
+                        ON r.uid = rh.recipe_id
+                    WHERE
+                        r.created_month >= %s  -- Cut-off date for popularity charts
+                        {where1} {where2}
+                    GROUP BY month, rh.kind_id
+                """.format(
+                    join=recipe_scope_filter.join_statement,
+                    where1=recipe_scope_filter.where_statement,
+                    where2=hop_selection_filter.where_statement,
+                )
+
+            query_parameters = (recipe_scope_filter.join_parameters
+                                + [POPULARITY_CUT_OFF_DATE]
+                                + recipe_scope_filter.where_parameters
+                                + hop_selection_filter.where_parameters)
+            return read_sql(query, query_parameters)
+
+        per_month, recipes_per_month = run_parallel(load_per_month, RecipesCountAnalysis(self.scope).per_month)
         if len(per_month) == 0:
             return per_month
 
@@ -277,7 +550,6 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
             top_ids = top_scope.groupby("kind_id")["recipes"].sum().sort_values(ascending=False).index.values[:num_top]
             per_month = per_month[per_month["kind_id"].isin(top_ids)]
 
-        recipes_per_month = RecipesCountAnalysis(self.scope).per_month()
         per_month = per_month.merge(recipes_per_month, on="month")
         per_month["recipes_percent"] = per_month["recipes"] / per_month["total_recipes"]
 
@@ -306,30 +578,38 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
 
         recipe_scope_filter = self.scope.get_filter()
         fermentable_selection_filter = fermentable_selection.get_filter()
-        query = """
-                SELECT
-                    DATE_ADD(DATE(r.created), INTERVAL -DAY(r.created)+1 DAY) AS month,
-                    rf.kind_id,
-                    COUNT(DISTINCT r.uid) AS recipes
-                FROM recipe_db_recipe AS r
-                {join}
-                JOIN recipe_db_recipefermentable AS rf
-                    ON r.uid = rf.recipe_id
-                WHERE
-                    r.created >= %s  -- Cut-off date for popularity charts
-                    {where1} {where2}
-                GROUP BY month, rf.kind_id
-            """.format(
-                join=recipe_scope_filter.join_statement,
-                where1=recipe_scope_filter.where_statement,
-                where2=fermentable_selection_filter.where_statement,
-            )
 
-        query_parameters = (recipe_scope_filter.join_parameters
-                            + [POPULARITY_CUT_OFF_DATE]
-                            + recipe_scope_filter.where_parameters
-                            + fermentable_selection_filter.where_parameters)
-        per_month = pd.read_sql(query, connection, params=query_parameters)
+        def load_per_month() -> DataFrame:
+            # Optimization: No filter criteria given => use pre-calculated values from the popularity table
+            if not recipe_scope_filter.has_filter() and PrecalculatedPopularity.is_available():
+                return PrecalculatedPopularity().per_month(MonthlyPopularity.FERMENTABLE, "rf", "kind_id", fermentable_selection_filter)
+
+            query = """
+                    SELECT
+                        r.created_month AS month,
+                        rf.kind_id,
+                        COUNT(DISTINCT r.uid) AS recipes
+                    FROM recipe_db_recipe AS r
+                    {join}
+                    JOIN recipe_db_recipefermentable AS rf
+                        ON r.uid = rf.recipe_id
+                    WHERE
+                        r.created_month >= %s  -- Cut-off date for popularity charts
+                        {where1} {where2}
+                    GROUP BY month, rf.kind_id
+                """.format(
+                    join=recipe_scope_filter.join_statement,
+                    where1=recipe_scope_filter.where_statement,
+                    where2=fermentable_selection_filter.where_statement,
+                )
+
+            query_parameters = (recipe_scope_filter.join_parameters
+                                + [POPULARITY_CUT_OFF_DATE]
+                                + recipe_scope_filter.where_parameters
+                                + fermentable_selection_filter.where_parameters)
+            return read_sql(query, query_parameters)
+
+        per_month, recipes_per_month = run_parallel(load_per_month, RecipesCountAnalysis(self.scope).per_month)
         if len(per_month) == 0:
             return per_month
 
@@ -340,7 +620,6 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
             top_ids = top_scope.groupby("kind_id")["recipes"].sum().sort_values(ascending=False).index.values[:num_top]
             per_month = per_month[per_month["kind_id"].isin(top_ids)]
 
-        recipes_per_month = RecipesCountAnalysis(self.scope).per_month()
         per_month = per_month.merge(recipes_per_month, on="month")
         per_month["recipes_percent"] = per_month["recipes"] / per_month["total_recipes"]
 
@@ -370,30 +649,40 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
 
         recipe_scope_filter = self.scope.get_filter()
         yeast_selection_filter = yeast_selection.get_filter()
-        query = """
-                SELECT
-                    DATE_ADD(DATE(r.created), INTERVAL -DAY(r.created)+1 DAY) AS month,
-                    ry.kind_id,
-                    COUNT(DISTINCT r.uid) AS recipes
-                FROM recipe_db_recipe AS r
-                {join}
-                JOIN recipe_db_recipeyeast AS ry
-                    ON r.uid = ry.recipe_id
-                WHERE
-                    r.created >= %s  -- Cut-off date for popularity charts
-                    {where1} {where2}
-                GROUP BY month, ry.kind_id
-            """.format(
-                join=recipe_scope_filter.join_statement,
-                where1=recipe_scope_filter.where_statement,
-                where2=yeast_selection_filter.where_statement,
-            )
 
-        query_parameters = (recipe_scope_filter.join_parameters
-                            + [POPULARITY_CUT_OFF_DATE]
-                            + recipe_scope_filter.where_parameters
-                            + yeast_selection_filter.where_parameters)
-        per_month = pd.read_sql(query, connection, params=query_parameters)
+        def load_per_month() -> DataFrame:
+            # Optimization: No filter criteria given => use pre-calculated values from the popularity table
+            if not recipe_scope_filter.has_filter() and PrecalculatedPopularity.is_available():
+                return PrecalculatedPopularity().per_month(MonthlyPopularity.YEAST, "ry", "kind_id", yeast_selection_filter)
+            if is_bundled():
+                return RecipeRowsAnalysis(self.scope).yeasts_per_month(yeast_selection)
+
+            query = """
+                    SELECT
+                        r.created_month AS month,
+                        ry.kind_id,
+                        COUNT(DISTINCT r.uid) AS recipes
+                    FROM recipe_db_recipe AS r
+                    {join}
+                    JOIN recipe_db_recipeyeast AS ry
+                        ON r.uid = ry.recipe_id
+                    WHERE
+                        r.created_month >= %s  -- Cut-off date for popularity charts
+                        {where1} {where2}
+                    GROUP BY month, ry.kind_id
+                """.format(
+                    join=recipe_scope_filter.join_statement,
+                    where1=recipe_scope_filter.where_statement,
+                    where2=yeast_selection_filter.where_statement,
+                )
+
+            query_parameters = (recipe_scope_filter.join_parameters
+                                + [POPULARITY_CUT_OFF_DATE]
+                                + recipe_scope_filter.where_parameters
+                                + yeast_selection_filter.where_parameters)
+            return read_sql(query, query_parameters)
+
+        per_month, recipes_per_month = run_parallel(load_per_month, RecipesCountAnalysis(self.scope).per_month)
         if len(per_month) == 0:
             return per_month
 
@@ -406,7 +695,6 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
             top_ids = top_scope.groupby("kind_id")["recipes"].sum().sort_values(ascending=False).index.values[:num_top]
             per_month = per_month[per_month["kind_id"].isin(top_ids)]
 
-        recipes_per_month = RecipesCountAnalysis(self.scope).per_month()
         per_month = per_month.merge(recipes_per_month, on="month")
         per_month["recipes_percent"] = per_month["recipes"] / per_month["total_recipes"]
 
@@ -430,7 +718,7 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
         recipe_scope_filter = self.scope.get_filter()
         query = """
                 SELECT
-                    DATE(r.created) AS day,
+                    r.created AS day,
                     r.source,
                     COUNT(*) AS recipes_number
                 FROM recipe_db_recipe AS r
@@ -447,57 +735,67 @@ class RecipesPopularityAnalysis(RecipeLevelAnalysis):
         query_parameters = (recipe_scope_filter.join_parameters
                             + [POPULARITY_CUT_OFF_DATE]
                             + recipe_scope_filter.where_parameters)
-        per_month = pd.read_sql(query, connection, params=query_parameters)
+        per_month = read_sql(query, query_parameters)
         return per_month
 
 
 class RecipesMetricHistogram(RecipeLevelAnalysis):
     def metric_histogram(self, metric: str) -> DataFrame:
         precision = METRIC_PRECISION[metric] if metric in METRIC_PRECISION else METRIC_PRECISION["default"]
-        recipe_scope_filter = self.scope.get_filter()
 
-        query = """
-                SELECT ROUND({metric}, {precision}) as {metric}
-                FROM recipe_db_recipe AS r
-                {join}
-                WHERE
-                    {metric} IS NOT NULL {where}
-            """.format(
-                metric=metric,
-                precision=precision,
-                join=recipe_scope_filter.join_statement,
-                where=recipe_scope_filter.where_statement,
-            )
-
-        query_parameters = (recipe_scope_filter.join_parameters
-                            + recipe_scope_filter.where_parameters)
-        df = pd.read_sql(query, connection, params=query_parameters)
+        # Optimization: Evaluate the scope in-memory, when the snapshot engine is enabled
+        snapshot = get_snapshot() if metric in SNAPSHOT_METRICS else None
+        if snapshot is None:
+            recipe_scope_filter = self.scope.get_filter()
+            from_statement = """
+                    FROM recipe_db_recipe AS r
+                    {join}
+                    WHERE 1 {where}
+                """.format(
+                    join=recipe_scope_filter.join_statement,
+                    where=recipe_scope_filter.where_statement,
+                )
+
+            query_parameters = (recipe_scope_filter.join_parameters
+                                + recipe_scope_filter.where_parameters)
+            value_expression = "ROUND({}, {})".format(metric, precision)
+
+            # Optimization: Single style without further filter criteria => outlier limits from the pre-calculated sketch
+            sketch = None
+            style = self.scope.get_single_style()
+            if style is not None:
+                sketch = load_sketch(MetricSketch.STYLE, style.id, metric)
+
+            return db_histogram(metric, value_expression, from_statement, query_parameters, precision,
+                                lambda value_range: self.get_bins(metric, value_range), sketch=sketch)
+
+        df = snapshot.metric_values(self.scope, metric, precision)
         df = remove_outliers(df, metric, 0.02)
         if len(df) == 0:
             return df
 
+        bins = self.get_bins(metric, df[metric].max() - df[metric].min())
+        histogram = df.groupby([pd.cut(df[metric], bins, precision=precision)])[metric].agg(["count"])
+        histogram = histogram.reset_index()
+        histogram[metric] = histogram[metric].map(str)
+
+        return histogram
+
+    def get_bins(self, metric: str, value_range: float) -> int:
         bins = 16
-        if metric in ["og", "fg"] and len(df) > 0:
-            abs = df[metric].max() - df[metric].min()
-            bins = max([1, round(abs / 0.002)])
+        if metric in ["og", "fg"]:
+            bins = max([1, round(value_range / 0.002)])
             if bins > 18:
                 bins = round(bins / math.ceil(bins / 12))
-        if metric in ["abv", "srm"] and len(df) > 0:
-            abs = df[metric].max() - df[metric].min()
-            bins = max([1, round(abs / 0.1)])
+        if metric in ["abv", "srm"]:
+            bins = max([1, round(value_range / 0.1)])
             if bins > 18:
                 bins = round(bins / math.ceil(bins / 12))
-        if metric in ["ibu"] and len(df) > 0:
-            abs = df[metric].max() - df[metric].min()
-            bins = max([1, round(abs)])
+        if metric in ["ibu"]:
+            bins = max([1, round(value_range)])
             if bins > 18:
                 bins = round(bins / math.ceil(bins / 12))
-
-        histogram = df.groupby([pd.cut(df[metric], bins, precision=precision)])[metric].agg(["count"])
-        histogram = histogram.reset_index()
-        histogram[metric] = histogram[metric].map(str)
-
-        return histogram
+        return bins
 
 
 class RecipesTrendAnalysis(RecipeLevelAnalysis):
@@ -505,31 +803,37 @@ class RecipesTrendAnalysis(RecipeLevelAnalysis):
         return RecipesCountAnalysis(self.scope).per_month()
 
     def trending_styles(self, trend_window_months: int = 24) -> DataFrame:
-        recipes_per_month = self._recipes_per_month_in_scope()
-
         recipe_scope_filter = self.scope.get_filter()
-        query = """
-                SELECT
-                    DATE_ADD(DATE(r.created), INTERVAL -DAY(r.created)+1 DAY) AS month,
-                    ras.style_id,
-                    COUNT(*) AS recipes
-                FROM recipe_db_recipe AS r
-                {join}
-                JOIN recipe_db_recipe_associated_styles AS ras
-                    ON r.uid = ras.recipe_id
-                WHERE
-                    r.created >= %s  -- Cut-off date for popularity charts
-                    {where}
-                GROUP BY month, ras.style_id
-            """.format(
-                join=recipe_scope_filter.join_statement,
-                where=recipe_scope_filter.where_statement
-            )
 
-        query_parameters = (recipe_scope_filter.join_parameters
-                            + [POPULARITY_CUT_OFF_DATE]
-                            + recipe_scope_filter.where_parameters)
-        per_month = pd.read_sql(query, connection, params=query_parameters)
+        def load_per_month() -> DataFrame:
+            # Optimization: No filter criteria given => use pre-calculated values from the popularity table
+            if not recipe_scope_filter.has_filter() and PrecalculatedPopularity.is_available():
+                return PrecalculatedPopularity().per_month(MonthlyPopularity.STYLE, "ras", "style_id", StyleSelection().get_filter())
+
+            query = """
+                    SELECT
+                        r.created_month AS month,
+                        ras.style_id,
+                        COUNT(*) AS recipes
+                    FROM recipe_db_recipe AS r
+                    {join}
+                    JOIN recipe_db_recipe_associated_styles AS ras
+                        ON r.uid = ras.recipe_id
+                    WHERE
+                        r.created_month >= %s  -- Cut-off date for popularity charts
+                        {where}
+                    GROUP BY month, ras.style_id
+                """.format(
+                    join=recipe_scope_filter.join_statement,
+                    where=recipe_scope_filter.where_statement
+                )
+
+            query_parameters = (recipe_scope_filter.join_parameters
+                                + [POPULARITY_CUT_OFF_DATE]
+                                + recipe_scope_filter.where_parameters)
+            return read_sql(query, query_parameters)
+
+        per_month, recipes_per_month = run_parallel(load_per_month, self._recipes_per_month_in_scope)
         if len(per_month) == 0:
             return per_month
 
@@ -562,35 +866,41 @@ class RecipesTrendAnalysis(RecipeLevelAnalysis):
 
     def trending_hops(self, hop_selection: Optional[HopSelection] = None, trend_window_months: int = 24) -> DataFrame:
         hop_selection = hop_selection or HopSelection()
-        recipes_per_month = self._recipes_per_month_in_scope()
-
         recipe_scope_filter = self.scope.get_filter()
         hop_selection_filter = hop_selection.get_filter()
-        query = """
-                SELECT
-                    DATE_ADD(DATE(r.created), INTERVAL -DAY(r.created)+1 DAY) AS month,
-                    rh.kind_id,
-                    COUNT(DISTINCT r.uid) AS recipes
-                FROM recipe_db_recipe AS r
-                {join}
-                JOIN recipe_db_recipehop AS rh
-                    ON r.uid = rh.recipe_id
-                WHERE
-                    r.created >= %s  -- Cut-off date for popularity charts
-                    AND rh.kind_id IS NOT NULL
-                    {where1} {where2}
-                GROUP BY month, rh.kind_id
-            """.format(
-                join=recipe_scope_filter.join_statement,
-                where1=recipe_scope_filter.where_statement,
-                where2=hop_selection_filter.where_statement
-            )
 
-        query_parameters = (recipe_scope_filter.join_parameters
-                            + [POPULARITY_CUT_OFF_DATE]
-                            + recipe_scope_filter.where_parameters
-                            + hop_selection_filter.where_parameters)
-        per_month = pd.read_sql(query, connection, params=query_parameters)
+        def load_per_month() -> DataFrame:
+            # Optimization: No filter criteria given => use pre-calculated values from the popularity table
+            if not recipe_scope_filter.has_filter() and len(hop_selection.uses) == 0 and PrecalculatedPopularity.is_available():
+                return PrecalculatedPopularity().per_month(MonthlyPopularity.HOP, "rh", "kind_id", hop_selection_filter)
+
+            query = """
+                    SELECT
+                        r.created_month AS month,
+                        rh.kind_id,
+                        COUNT(DISTINCT r.uid) AS recipes
+                    FROM recipe_db_recipe AS r
+                    {join}
+                    JOIN recipe_db_recipehop AS rh
+                        ON r.uid = rh.recipe_id
+                    WHERE
+                        r.created_month >= %s  -- Cut-off date for popularity charts
+                        AND rh.kind_id IS NOT NULL
+                        {where1} {where2}
+                    GROUP BY month, rh.kind_id
+                """.format(
+                    join=recipe_scope_filter.join_statement,
+                    where1=recipe_scope_filter.where_statement,
+                    where2=hop_selection_filter.where_statement
+                )
+
+            query_parameters = (recipe_scope_filter.join_parameters
+                                + [POPULARITY_CUT_OFF_DATE]
+                                + recipe_scope_filter.where_parameters
+                                + hop_selection_filter.where_parameters)
+            return read_sql(query, query_parameters)
+
+        per_month, recipes_per_month = run_parallel(load_per_month, self._recipes_per_month_in_scope)
         if len(per_month) == 0:
             return per_month
 
@@ -623,35 +933,44 @@ class RecipesTrendAnalysis(RecipeLevelAnalysis):
 
     def trending_yeasts(self, yeast_selection: Optional[YeastSelection] = None, trend_window_months: int = 24) -> DataFrame:
         yeast_selection = yeast_selection or YeastSelection()
-        recipes_per_month = self._recipes_per_month_in_scope()
-
         recipe_scope_filter = self.scope.get_filter()
         yeast_selection_filter = yeast_selection.get_filter()
-        query = """
-                SELECT
-                    DATE_ADD(DATE(r.created), INTERVAL -DAY(r.created)+1 DAY) AS month,
-                    ry.kind_id,
-                    COUNT(DISTINCT r.uid) AS recipes
-                FROM recipe_db_recipe AS r
-                {join}
-                JOIN recipe_db_recipeyeast AS ry
-                    ON r.uid = ry.recipe_id
-                WHERE
-                    r.created >= %s  -- Cut-off date for popularity charts
-                    AND ry.kind_id IS NOT NULL
-                    {where1} {where2}
-                GROUP BY month, ry.kind_id
-            """.format(
-                join=recipe_scope_filter.join_statement,
-                where1=recipe_scope_filter.where_statement,
-                where2=yeast_selection_filter.where_statement,
-            )
 
-        query_parameters = (recipe_scope_filter.join_parameters
-                            + [POPULARITY_CUT_OFF_DATE]
-                            + recipe_scope_filter.where_parameters
-                            + yeast_selection_filter.where_parameters)
-        per_month = pd.read_sql(query, connection, params=query_parameters)
+        def load_per_month() -> DataFrame:
+            # Optimization: No filter criteria given => use pre-calculated values from the popularity table
+            if not recipe_scope_filter.has_filter() and PrecalculatedPopularity.is_available():
+                return PrecalculatedPopularity().per_month(MonthlyPopularity.YEAST, "ry", "kind_id", yeast_selection_filter)
+            if is_bundled():
+                per_month = RecipeRowsAnalysis(self.scope).yeasts_per_month(yeast_selection)
+                return per_month[per_month["kind_id"].notnull()]
+
+            query = """
+                    SELECT
+                        r.created_month AS month,
+                        ry.kind_id,
+                        COUNT(DISTINCT r.uid) AS recipes
+                    FROM recipe_db_recipe AS r
+                    {join}
+                    JOIN recipe_db_recipeyeast AS ry
+                        ON r.uid = ry.recipe_id
+                    WHERE
+                        r.created_month >= %s  -- Cut-off date for popularity charts
+                        AND ry.kind_id IS NOT NULL
+                        {where1} {where2}
+                    GROUP BY month, ry.kind_id
+                """.format(
+                    join=recipe_scope_filter.join_statement,
+                    where1=recipe_scope_filter.where_statement,
+                    where2=yeast_selection_filter.where_statement,
+                )
+
+            query_parameters = (recipe_scope_filter.join_parameters
+                                + [POPULARITY_CUT_OFF_DATE]
+                                + recipe_scope_filter.where_parameters
+                                + yeast_selection_filter.where_parameters)
+            return read_sql(query, query_parameters)
+
+        per_month, recipes_per_month = run_parallel(load_per_month, self._recipes_per_month_in_scope)
         if len(per_month) == 0:
             return per_month
 
@@ -693,19 +1012,23 @@ class CommonStylesAnalysis(RecipeLevelAnalysis):
         return self._return(df, num_top)
 
     def common_styles_relative(self, num_top: Optional[int] = None) -> DataFrame:
-        df = self._common_styles_data()
+        df, recipes_per_style = run_parallel(self._common_styles_data, RecipesCountAnalysis(RecipeScope()).per_style)
         if len(df) == 0:
             return df
 
         # Calculate percent
-        recipes_per_style = RecipesCountAnalysis(RecipeScope()).per_style()
         df = df.merge(recipes_per_style, on="style_id")
         df["recipes_percent"] = df["recipes"] / df["total_recipes"]
 
         df = df.sort_values("recipes_percent", ascending=False)
         return self._return(df, num_top)
 
+    @memoized
     def _common_styles_data(self) -> DataFrame:
+        if is_bundled():
+            styles = RecipeRowsAnalysis(self.scope).styles()
+            return styles.groupby("style_id")["recipe_id"].nunique().rename("recipes").reset_index()
+
         recipe_scope_filter = self.scope.get_filter()
         query = """
             SELECT
@@ -724,7 +1047,7 @@ class CommonStylesAnalysis(RecipeLevelAnalysis):
 
         query_parameters = (recipe_scope_filter.join_parameters
                             + recipe_scope_filter.where_parameters)
-        return pd.read_sql(query, connection, params=query_parameters)
+        return read_sql(query, query_parameters)
 
     def _return(self, df: DataFrame, num_top: Optional[int]) -> DataFrame:
         df["beer_style"] = df["style_id"].map(get_style_names_dict())
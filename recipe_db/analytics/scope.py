@@ -209,6 +209,29 @@ class YeastCriteriaMixin:
         return WhereFilterCriteria.in_filter("ry.kind_id", yeast_ids)
 
 
+# Recipes associated with any of the entities, which is the meaning of several styles, hops, fermentables or yeasts in
+# a scope. Several entities are first reduced to distinct recipe ids, so that the join doesn't duplicate recipes.
+# There's no bitmap index of the recipes per entity, scopes are evaluated with these joins or in-memory by the snapshot
+# engine (see snapshot module).
+def any_entity_filter(table: str, column: str, alias: str, entity_ids: List[str]) -> JoinFilterCriteria:
+    if len(entity_ids) > 1:
+        entity_filter = WhereFilterCriteria.in_filter(column, entity_ids)
+        return JoinFilterCriteria(
+            "(SELECT DISTINCT recipe_id FROM {table} WHERE {where}) AS {alias} ON {alias}.recipe_id = r.uid".format(
+                table=table, where=entity_filter.where_statement, alias=alias
+            ),
+            entity_filter.where_parameters,
+        )
+
+    entity_filter = WhereFilterCriteria.in_filter("{}.{}".format(alias, column), entity_ids)
+    return JoinFilterCriteria(
+        "{table} AS {alias} ON {alias}.recipe_id = r.uid AND {where}".format(
+            table=table, alias=alias, where=entity_filter.where_statement
+        ),
+        entity_filter.where_parameters,
+    )
+
+
 ################### ANALYSIS SCOPES
 ################### The scope defines which recipes should be analyzed. The set of these recipes equals 100%.
 
@@ -223,20 +246,7 @@ class RecipeScope:
                 return NoFilterCriteria()
 
             style_ids = list(map(lambda y: y.id, self.styles))
-            if len(style_ids) > 1:
-                # This approach avoids duplicating recipes through the join
-                style_filter = WhereFilterCriteria.in_filter("style_id", style_ids)
-                return JoinFilterCriteria(
-                    "(SELECT DISTINCT recipe_id FROM recipe_db_recipe_associated_styles WHERE %s) AS f_ras ON f_ras.recipe_id = r.uid" % style_filter.where_statement,
-                    style_filter.where_parameters
-                )
-            else:
-                style_filter = WhereFilterCriteria.in_filter("f_ras.style_id", style_ids)
-                return JoinFilterCriteria(
-                    "recipe_db_recipe_associated_styles AS f_ras ON f_ras.recipe_id = r.uid AND %s" % style_filter.where_statement,
-                    style_filter.where_parameters
-                )
-
+            return any_entity_filter("recipe_db_recipe_associated_styles", "style_id", "f_ras", style_ids)
 
     class HopCriteria:
         def __init__(self):
@@ -246,15 +256,8 @@ class RecipeScope:
             if len(self.hops) <= 0:
                 return NoFilterCriteria()
 
-            if len(self.hops) > 1:
-                raise Exception("Filtering recipes by multiple hops is currently not supported")
-
             hop_ids = list(map(lambda y: y.id, self.hops))
-            hop_filter = WhereFilterCriteria.in_filter("f_rah.hop_id", hop_ids)
-            return JoinFilterCriteria(
-                "recipe_db_recipe_associated_hops AS f_rah ON f_rah.recipe_id = r.uid AND %s" % hop_filter.where_statement,
-                hop_filter.where_parameters
-            )
+            return any_entity_filter("recipe_db_recipe_associated_hops", "hop_id", "f_rah", hop_ids)
 
     class FermentableCriteria:
         def __init__(self):
@@ -264,14 +267,9 @@ class RecipeScope:
             if len(self.fermentables) <= 0:
                 return NoFilterCriteria()
 
-            if len(self.fermentables) > 1:
-                raise Exception("Filtering recipes by multiple fermentables is currently not supported")
-
             fermentable_ids = list(map(lambda y: y.id, self.fermentables))
-            fermentable_filter = WhereFilterCriteria.in_filter("f_raf.fermentable_id", fermentable_ids)
-            return JoinFilterCriteria(
-                "recipe_db_recipe_associated_fermentables AS f_raf ON f_raf.recipe_id = r.uid AND %s" % fermentable_filter.where_statement,
-                fermentable_filter.where_parameters
+            return any_entity_filter(
+                "recipe_db_recipe_associated_fermentables", "fermentable_id", "f_raf", fermentable_ids
             )
 
     class YeastCriteria:
@@ -282,15 +280,8 @@ class RecipeScope:
             if len(self.yeasts) <= 0:
                 return NoFilterCriteria()
 
-            if len(self.yeasts) > 1:
-                raise Exception("Filtering recipes by multiple yeasts is currently not supported")
-
             yeast_ids = list(map(lambda y: y.id, self.yeasts))
-            yeast_filter = WhereFilterCriteria.in_filter("f_ray.yeast_id", yeast_ids)
-            return JoinFilterCriteria(
-                "recipe_db_recipe_associated_yeasts AS f_ray ON f_ray.recipe_id = r.uid AND %s" % yeast_filter.where_statement,
-                yeast_filter.where_parameters
-            )
+            return any_entity_filter("recipe_db_recipe_associated_yeasts", "yeast_id", "f_ray", yeast_ids)
 
     def __init__(self) -> None:
         self.search_term = None
@@ -356,6 +347,52 @@ class RecipeScope:
     def has_filter(self) -> bool:
         return self.get_filter().has_filter()
 
+    # The style, when the scope selects all recipes of a single style without further criteria, e.g. to use the
+    # metrics pre-calculated per style
+    def get_single_style(self) -> Optional[Style]:
+        styles = self.style_criteria.styles if self.style_criteria is not None else []
+        if len(styles) != 1 or self.get_key() != "styles={}".format(styles[0].id):
+            return None
+        return styles[0]
+
+    # Stable key for scopes selecting the same recipes, e.g. to cache analysis results
+    def get_key(self) -> str:
+        parts = []
+        if self.search_term is not None:
+            parts.append("term=" + " ".join(self.search_term.lower().split()))
+
+        ranges = [
+            ("created", self.creation_date_min, self.creation_date_max),
+            ("abv", self.abv_min, self.abv_max),
+            ("ibu", self.ibu_min, self.ibu_max),
+            ("srm", self.srm_min, self.srm_max),
+            ("og", self.og_min, self.og_max),
+            ("fg", self.fg_min, self.fg_max),
+        ]
+        for name, min_value, max_value in ranges:
+            if min_value is not None or max_value is not None:
+                parts.append("{}={}:{}".format(name, _key_value(min_value), _key_value(max_value)))
+
+        entities = [
+            ("styles", self.style_criteria.styles if self.style_criteria is not None else []),
+            ("hops", self.hop_criteria.hops if self.hop_criteria is not None else []),
+            ("fermentables", self.fermentable_criteria.fermentables if self.fermentable_criteria is not None else []),
+            ("yeasts", self.yeast_criteria.yeasts if self.yeast_criteria is not None else []),
+        ]
+        for name, items in entities:
+            if len(items) > 0:
+                parts.append("{}={}".format(name, ",".join(sorted(set(map(lambda i: i.id, items))))))
+
+        return ";".join(parts)
+
+
+def _key_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, (int, float)):
+        return repr(round(float(value), 6))  # Avoid float artifacts, e.g. from 1050 * 0.001
+    return str(value)
+
 
 # Analyze hops only
 class HopScope(HopCriteriaMixin):
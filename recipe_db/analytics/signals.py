@@ -0,0 +1,22 @@
+from django.db import transaction
+from django.db.models import Model
+
+from recipe_db.analytics.utils import STYLE_NAMES, HOP_NAMES, FERMENTABLE_NAMES, YEAST_NAMES
+from recipe_db.data_version import bump_data_version
+from recipe_db.models import Style, Hop, Fermentable, Yeast
+
+
+def entity_changed(sender: Model, instance: object, **kwargs) -> None:
+    if isinstance(instance, Style):
+        STYLE_NAMES.invalidate()
+    elif isinstance(instance, Hop):
+        HOP_NAMES.invalidate()
+    elif isinstance(instance, Fermentable):
+        FERMENTABLE_NAMES.invalidate()
+    elif isinstance(instance, Yeast):
+        YEAST_NAMES.invalidate()
+    else:
+        return
+
+    # The other processes reload the names, once they see the changed data version
+    transaction.on_commit(bump_data_version)
@@ -0,0 +1,107 @@
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from recipe_db.models import MetricSketch
+
+DEFAULT_COMPRESSION = 200
+
+
+# Mergeable quantile sketch (t-digest with the k1 scale function). The values are summarized by centroids, which are
+# small at the tails of the distribution and larger towards the median, so that the fences stay accurate. Min, max
+# and mean are exact. As long as there are only a few values, every value is kept and quantiles are exact.
+class QuantileSketch:
+    def __init__(
+        self,
+        means=None,
+        weights=None,
+        minimum: float = np.nan,
+        maximum: float = np.nan,
+        compression: int = DEFAULT_COMPRESSION,
+    ) -> None:
+        self.means = np.asarray(means if means is not None else [], dtype=np.float64)
+        self.weights = np.asarray(weights if weights is not None else [], dtype=np.float64)
+        self.min = float(minimum)
+        self.max = float(maximum)
+        self.compression = int(compression)
+
+    @classmethod
+    def from_values(cls, values, compression: int = DEFAULT_COMPRESSION) -> "QuantileSketch":
+        values = pd.Series(values, dtype=np.float64).dropna().values
+        if len(values) == 0:
+            return cls(compression=compression)
+        sketch = cls(values, np.ones(len(values)), values.min(), values.max(), compression)
+        sketch._compress()
+        return sketch
+
+    @property
+    def count(self) -> int:
+        return int(round(self.weights.sum()))
+
+    @property
+    def mean(self) -> float:
+        if len(self.weights) == 0:
+            return np.nan
+        return float(np.sum(self.means * self.weights) / self.weights.sum())
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        merged = QuantileSketch(
+            np.concatenate([self.means, other.means]),
+            np.concatenate([self.weights, other.weights]),
+            np.fmin(self.min, other.min),
+            np.fmax(self.max, other.max),
+            max(self.compression, other.compression),
+        )
+        merged._compress()
+        return merged
+
+    def _compress(self) -> None:
+        order = np.argsort(self.means, kind="stable")
+        means, weights = self.means[order], self.weights[order]
+
+        # Centroids, which start within the same unit of the scale function, are merged together
+        q_left = (np.cumsum(weights) - weights) / weights.sum()
+        k_left = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        buckets = np.floor(k_left - k_left[0]).astype(np.int64)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    def quantiles(self, quantiles) -> np.ndarray:
+        quantiles = np.asarray(quantiles, dtype=np.float64)
+        if len(self.weights) == 0:
+            return np.full(len(quantiles), np.nan)
+
+        # Same as linear interpolation on the sorted values, when every centroid is a single value
+        count = self.weights.sum()
+        centers = np.r_[0.0, np.cumsum(self.weights) - (self.weights + 1) / 2, count - 1]
+        values = np.r_[self.min, self.means, self.max]
+        return np.interp(quantiles * (count - 1), centers, values)
+
+    def quantile(self, quantile: float) -> float:
+        return float(self.quantiles([quantile])[0])
+
+    def to_bytes(self) -> bytes:
+        header = [self.compression, self.min, self.max]
+        return np.concatenate([header, self.means, self.weights]).astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "QuantileSketch":
+        values = np.frombuffer(data, dtype="<f8")
+        compression, minimum, maximum = values[:3]
+        num_centroids = (len(values) - 3) // 2
+        means, weights = values[3 : 3 + num_centroids], values[3 + num_centroids :]
+        return cls(means, weights, minimum, maximum, int(compression))
+
+
+def load_sketch(entity_type: str, entity_id: str, metric: str) -> Optional[QuantileSketch]:
+    data = (
+        MetricSketch.objects.filter(entity_type=entity_type, entity_id=entity_id, metric=metric)
+        .values_list("sketch", flat=True)
+        .first()
+    )
+    if data is None:
+        return None
+    return QuantileSketch.from_bytes(bytes(data))
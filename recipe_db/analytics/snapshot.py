@@ -0,0 +1,139 @@
+from threading import Lock
+from typing import Optional, Dict, List
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from pandas import DataFrame
+
+from recipe_db.analytics.instrumentation import read_sql
+from recipe_db.analytics.scope import RecipeScope
+from recipe_db.data_version import get_data_version
+
+SNAPSHOT_METRICS = ["abv", "ibu", "srm", "og", "fg"]
+
+SNAPSHOT = None
+SNAPSHOT_LOCK = Lock()
+_snapshot_building = False
+
+
+# Maps entity ids to the recipes associated with them (CSR-style adjacency arrays)
+class Adjacency:
+    def __init__(self, recipe_positions: np.ndarray, entity_ids: np.ndarray, num_recipes: int) -> None:
+        codes, unique_ids = pd.factorize(entity_ids)
+        order = np.argsort(codes, kind="stable")
+
+        self.num_recipes = num_recipes
+        self.entity_index: Dict[str, int] = {entity_id: i for i, entity_id in enumerate(unique_ids)}
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(codes, minlength=len(unique_ids)))])
+        self.indices = recipe_positions[order]
+
+    def recipes(self, entity_id: str) -> np.ndarray:
+        i = self.entity_index.get(entity_id)
+        if i is None:
+            return np.empty(0, dtype=np.int64)
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    # Recipes associated with any of the entities
+    def mask(self, entity_ids: List[str]) -> np.ndarray:
+        mask = np.zeros(self.num_recipes, dtype=bool)
+        for entity_id in entity_ids:
+            mask[self.recipes(entity_id)] = True
+        return mask
+
+
+# Columnar in-memory copy of the recipe metrics and associated entities, evaluates recipe scopes without DB queries
+class RecipeSnapshot:
+    def __init__(self, data_version: int) -> None:
+        self.data_version = data_version
+
+        recipes = read_sql("SELECT uid, created, {} FROM recipe_db_recipe".format(", ".join(SNAPSHOT_METRICS)))
+        self.num_recipes = len(recipes)
+        self.uids = recipes["uid"].values
+        self.created = pd.to_datetime(recipes["created"]).values.astype("datetime64[D]")
+        self.metrics = {metric: recipes[metric].astype(float).values for metric in SNAPSHOT_METRICS}
+
+        recipe_index = pd.Index(self.uids)
+        self.styles = self._load_adjacency(recipe_index, "recipe_db_recipe_associated_styles", "style_id")
+        self.hops = self._load_adjacency(recipe_index, "recipe_db_recipe_associated_hops", "hop_id")
+        self.fermentables = self._load_adjacency(
+            recipe_index, "recipe_db_recipe_associated_fermentables", "fermentable_id"
+        )
+        self.yeasts = self._load_adjacency(recipe_index, "recipe_db_recipe_associated_yeasts", "yeast_id")
+
+    def _load_adjacency(self, recipe_index: pd.Index, table: str, column: str) -> Adjacency:
+        df = read_sql("SELECT recipe_id, {} FROM {}".format(column, table))
+        positions = recipe_index.get_indexer(df["recipe_id"])
+        known = positions >= 0
+        return Adjacency(positions[known], df[column].values[known], self.num_recipes)
+
+    def mask(self, scope: RecipeScope) -> np.ndarray:
+        mask = np.ones(self.num_recipes, dtype=bool)
+
+        if scope.creation_date_min is not None:
+            mask &= self.created >= np.datetime64(scope.creation_date_min, "D")
+        if scope.creation_date_max is not None:
+            mask &= self.created <= np.datetime64(scope.creation_date_max, "D")
+
+        # Comparisons with NaN are false, same as comparisons with NULL in SQL
+        for metric in SNAPSHOT_METRICS:
+            min_value = getattr(scope, metric + "_min")
+            max_value = getattr(scope, metric + "_max")
+            if min_value is not None:
+                mask &= self.metrics[metric] >= min_value
+            if max_value is not None:
+                mask &= self.metrics[metric] <= max_value
+
+        if scope.style_criteria is not None and len(scope.style_criteria.styles) > 0:
+            mask &= self.styles.mask([style.id for style in scope.style_criteria.styles])
+        if scope.hop_criteria is not None and len(scope.hop_criteria.hops) > 0:
+            mask &= self.hops.mask([hop.id for hop in scope.hop_criteria.hops])
+        if scope.fermentable_criteria is not None and len(scope.fermentable_criteria.fermentables) > 0:
+            fermentable_ids = [fermentable.id for fermentable in scope.fermentable_criteria.fermentables]
+            mask &= self.fermentables.mask(fermentable_ids)
+        if scope.yeast_criteria is not None and len(scope.yeast_criteria.yeasts) > 0:
+            mask &= self.yeasts.mask([yeast.id for yeast in scope.yeast_criteria.yeasts])
+
+        return mask
+
+    def count(self, scope: RecipeScope) -> int:
+        return int(np.count_nonzero(self.mask(scope)))
+
+    def sample(self, scope: RecipeScope, num_recipes: int, seed: Optional[int] = None) -> List[str]:
+        positions = np.flatnonzero(self.mask(scope))
+        if len(positions) > num_recipes:
+            positions = np.random.default_rng(seed).choice(positions, num_recipes, replace=False)
+        return self.uids[positions].tolist()
+
+    def metric_values(self, scope: RecipeScope, metric: str, precision: int) -> DataFrame:
+        values = self.metrics[metric]
+        values = values[self.mask(scope) & ~np.isnan(values)]
+        return DataFrame({metric: np.round(values, precision)})
+
+
+def is_snapshot_enabled() -> bool:
+    return settings.__getattr__("ANALYTICS_SNAPSHOT_ENGINE")
+
+
+# Returns the snapshot for the current data version, or None when the snapshot engine is disabled. While a thread
+# builds a new snapshot, the others keep using the previous one (or the database, when there's none yet).
+def get_snapshot() -> Optional[RecipeSnapshot]:
+    global SNAPSHOT, _snapshot_building
+    if not is_snapshot_enabled():
+        return None
+
+    data_version = get_data_version()
+    with SNAPSHOT_LOCK:
+        current = SNAPSHOT
+        if (current is not None and current.data_version == data_version) or _snapshot_building:
+            return current
+        _snapshot_building = True
+
+    try:
+        snapshot = RecipeSnapshot(data_version)
+        with SNAPSHOT_LOCK:
+            SNAPSHOT = snapshot
+        return snapshot
+    finally:
+        with SNAPSHOT_LOCK:
+            _snapshot_building = False
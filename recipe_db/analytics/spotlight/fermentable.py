@@ -1,4 +1,4 @@
-from typing import Iterable
+from typing import Iterable, Optional
 
 from pandas import DataFrame
 
@@ -72,6 +72,6 @@ class FermentableAnalysis:
         analysis = CommonStylesAnalysis(self.recipe_scope)
         return analysis.common_styles_relative(num_top=16)
 
-    def random_recipes(self, num_recipes: int) -> Iterable[Recipe]:
+    def random_recipes(self, num_recipes: int, seed: Optional[int] = None) -> Iterable[Recipe]:
         analysis = RecipesListAnalysis(self.recipe_scope)
-        return analysis.random(num_recipes)
+        return analysis.random(num_recipes, seed)
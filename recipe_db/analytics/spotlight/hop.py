@@ -1,4 +1,4 @@
-from typing import Iterable
+from typing import Iterable, Optional
 
 from pandas import DataFrame
 
@@ -83,6 +83,6 @@ class HopAnalysis:
         analysis = RecipesTrendAnalysis(self.recipe_scope)
         return analysis.trending_yeasts()
 
-    def random_recipes(self, num_recipes: int) -> Iterable[Recipe]:
+    def random_recipes(self, num_recipes: int, seed: Optional[int] = None) -> Iterable[Recipe]:
         analysis = RecipesListAnalysis(self.recipe_scope)
-        return analysis.random(num_recipes)
+        return analysis.random(num_recipes, seed)
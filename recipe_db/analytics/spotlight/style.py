@@ -83,6 +83,6 @@ class StyleAnalysis:
         analysis = FermentableAmountAnalysis(self.recipe_scope)
         return analysis.per_fermentable(fermentable_selection, num_top=8)
 
-    def random_recipes(self, num_recipes: int) -> Iterable[Recipe]:
+    def random_recipes(self, num_recipes: int, seed: Optional[int] = None) -> Iterable[Recipe]:
         analysis = RecipesListAnalysis(self.recipe_scope)
-        return analysis.random(num_recipes)
+        return analysis.random(num_recipes, seed)
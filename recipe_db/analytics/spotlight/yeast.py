@@ -1,4 +1,4 @@
-from typing import Iterable
+from typing import Iterable, Optional
 
 from pandas import DataFrame
 
@@ -61,6 +61,6 @@ class YeastAnalysis:
         analysis = RecipesPopularityAnalysis(self.recipe_scope)
         return analysis.popularity_per_hop(num_top=8)
 
-    def random_recipes(self, num_recipes: int) -> Iterable[Recipe]:
+    def random_recipes(self, num_recipes: int, seed: Optional[int] = None) -> Iterable[Recipe]:
         analysis = RecipesListAnalysis(self.recipe_scope)
-        return analysis.random(num_recipes)
+        return analysis.random(num_recipes, seed)
@@ -0,0 +1,792 @@
+import datetime
+import threading
+from io import StringIO
+from typing import List
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from pandas import DataFrame
+
+from recipe_db.analytics import slope, grouped_slope, lowerfence, q1, q3, upperfence, METRIC_PRECISION
+from recipe_db.analytics.cooccurrence import CooccurrenceMatrix
+from recipe_db.analytics.executor import run_parallel
+from recipe_db.analytics.hop import HopAmountAnalysis, HopPairingAnalysis
+from recipe_db.analytics import instrumentation
+from recipe_db.analytics.instrumentation import chart_context, query_fingerprint, read_sql, QUERY_LOG_EVENT, \
+    MEMOIZE_LOG_EVENT
+from recipe_db.analytics.memoize import memoization, MEMOIZE_STATS, clear_shared_results, bundle
+from recipe_db.analytics.fermentable import FermentableAmountAnalysis
+from recipe_db.analytics.recipe import RecipesCountAnalysis, RecipesListAnalysis, CommonStylesAnalysis, RecipesMetricHistogram, \
+    RecipesPopularityAnalysis, RecipesTrendAnalysis, PrecalculatedPopularity
+from recipe_db.analytics.scope import RecipeScope, HopSelection, FermentableSelection, YeastSelection
+from recipe_db.analytics.sketch import QuantileSketch
+from recipe_db.analytics.utils import RollingAverage, aggregate_box_plot, sketch_box_plot, get_hop_names_dict, \
+    db_histogram, remove_outliers
+from recipe_db.analytics import snapshot
+from recipe_db.data_version import get_data_version, bump_data_version, bump_popularity_version
+from recipe_db.models import Hop, Style, Recipe, RecipeHop, MetricSketch, Fermentable, RecipeFermentable, Yeast, \
+    RecipeYeast
+
+
+def create_series_data(num_series: int, num_months: int, seed: int = 1) -> DataFrame:
+    rng = np.random.default_rng(seed)
+    months = pd.date_range(start="2012-01-01", periods=num_months, freq="MS")
+    rows = []
+    for series in range(num_series):
+        # Series start at different months and have gaps
+        start = rng.integers(0, num_months - 1)
+        for month in months[start:]:
+            if rng.random() < 0.2:
+                continue
+            recipes = int(rng.integers(1, 100))
+            total_recipes = int(rng.integers(100, 1000))
+            rows.append([month.date(), "series-%d" % series, recipes, total_recipes, recipes / total_recipes])
+    return DataFrame(rows, columns=["month", "kind_id", "recipes", "total_recipes", "recipes_percent"])
+
+
+# The former per-series implementation, used as a reference
+def rolling_multiple_series_reference(smoothing: RollingAverage, df: DataFrame, series_column: str, time_column: str) -> DataFrame:
+    if len(df) == 0:
+        return df
+
+    series_dfs = []
+    series_values = df[series_column].unique()
+    for series_value in series_values:
+        series_df = df[df[series_column].eq(series_value)]
+        series_df = series_df.drop([series_column], axis=1)
+        rolling_series_df = smoothing.rolling(series_df, time_column)
+        if len(rolling_series_df) > 0:
+            rolling_series_df[series_column] = series_value
+            series_dfs.append(rolling_series_df)
+
+    if len(series_dfs) == 0:
+        dummy = DataFrame(columns=df.columns)
+        return dummy
+
+    return pd.concat(series_dfs)
+
+
+class RollingAverageTest(TestCase):
+    def test_rolling_multiple_series_equals_reference(self):
+        df = create_series_data(num_series=30, num_months=60)
+        for window in [7, 13, 25]:
+            smoothing = RollingAverage(window=window)
+            expected = rolling_multiple_series_reference(smoothing, df, "kind_id", "month")
+            actual = smoothing.rolling_multiple_series(df, "kind_id", "month")
+            pd.testing.assert_frame_equal(expected, actual)
+
+    def test_rolling_multiple_series_with_datetime_column(self):
+        df = create_series_data(num_series=10, num_months=40, seed=2)
+        df["month"] = pd.to_datetime(df["month"])
+        smoothing = RollingAverage(window=25)
+        expected = rolling_multiple_series_reference(smoothing, df, "kind_id", "month")
+        actual = smoothing.rolling_multiple_series(df, "kind_id", "month")
+        pd.testing.assert_frame_equal(expected, actual)
+
+    def test_rolling_multiple_series_skips_short_series(self):
+        df = DataFrame([
+            [datetime.date(2020, 1, 1), "a", 1.0],
+            [datetime.date(2020, 2, 1), "a", 2.0],
+            [datetime.date(2020, 1, 1), "b", 1.0],
+        ], columns=["month", "kind_id", "recipes"])
+        actual = RollingAverage().rolling_multiple_series(df, "kind_id", "month")
+
+        self.assertEquals(0, len(actual))
+        self.assertEquals(list(df.columns), list(actual.columns))
+
+
+class SlopeTest(TestCase):
+    def test_grouped_slope_equals_slope(self):
+        df = create_series_data(num_series=30, num_months=24)
+        df = df.sample(frac=1, random_state=1)  # Groups are not contiguous
+
+        expected = df.groupby("kind_id")["recipes_percent"].agg(slope)
+        actual = grouped_slope(df, "kind_id", "recipes_percent")
+        pd.testing.assert_series_equal(expected, actual, check_names=False)
+
+    def test_grouped_slope_too_few_values(self):
+        df = DataFrame({"kind_id": ["a", "a", "a", "b", "b", "b", "b"], "value": [1, 2, 3, 1, 2, 3, 4]})
+        actual = grouped_slope(df, "kind_id", "value")
+
+        self.assertEquals(0, actual["a"])
+        self.assertAlmostEqual(3.0, actual["b"])
+
+
+def create_recipe_hops_data(num_recipes: int, num_hops: int, seed: int = 1) -> DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = []
+    for recipe in range(num_recipes):
+        hops = rng.choice(num_hops, size=rng.integers(1, 6), replace=False)
+        for hop in hops:
+            rows.append(["recipe-%d" % recipe, "hop-%02d" % hop, float(rng.integers(1, 100))])
+    return DataFrame(rows, columns=["recipe_id", "kind_id", "amount_percent"])
+
+
+class CooccurrenceMatrixTest(TestCase):
+    def test_top_pairs_equal_pairs_from_merge(self):
+        df = create_recipe_hops_data(num_recipes=500, num_hops=15)
+        pairs = pd.merge(df, df, on="recipe_id", suffixes=("_1", "_2"))
+        pairs = pairs[pairs["kind_id_1"] < pairs["kind_id_2"]]
+        expected = pairs.groupby(["kind_id_1", "kind_id_2"]).size()
+        expected = expected.reset_index().sort_values([0, "kind_id_1", "kind_id_2"], ascending=[False, True, True])
+
+        matrix = CooccurrenceMatrix(df["recipe_id"], df["kind_id"], df["amount_percent"])
+        top_pairs = matrix.top_pairs(12)
+
+        self.assertEquals(list(map(tuple, expected.values[:12])), top_pairs)
+
+    def test_top_pairs_for_entity(self):
+        df = create_recipe_hops_data(num_recipes=200, num_hops=10)
+        matrix = CooccurrenceMatrix(df["recipe_id"], df["kind_id"], df["amount_percent"])
+
+        for kind_id_1, kind_id_2, _ in matrix.top_pairs(12, "hop-03"):
+            self.assertTrue("hop-03" in [kind_id_1, kind_id_2])
+
+    def test_pair_amounts(self):
+        df = DataFrame([
+            ["r1", "a", 10.0], ["r1", "b", 90.0],
+            ["r2", "a", 40.0], ["r2", "b", 50.0], ["r2", "c", 10.0],
+            ["r3", "a", 100.0],
+        ], columns=["recipe_id", "kind_id", "amount_percent"])
+        matrix = CooccurrenceMatrix(df["recipe_id"], df["kind_id"], df["amount_percent"])
+        amounts_a, amounts_b = matrix.pair_amounts("a", "b")
+
+        self.assertEquals([10.0, 40.0], list(amounts_a))
+        self.assertEquals([90.0, 50.0], list(amounts_b))
+        self.assertEquals(("a", "b", 2), matrix.top_pairs(1)[0])
+
+
+class BoxPlotAggregationTest(TestCase):
+    BOX_PLOT_AGGREGATION = [lowerfence, q1, "median", "mean", q3, upperfence]
+
+    def test_aggregate_box_plot_per_group(self):
+        df = create_recipe_hops_data(num_recipes=500, num_hops=15)
+        expected = df.groupby("kind_id").agg({"amount_percent": self.BOX_PLOT_AGGREGATION, "recipe_id": "nunique"})
+        actual = aggregate_box_plot(df, "amount_percent", by="kind_id", extra_aggregations={"recipe_id": "nunique"})
+        pd.testing.assert_frame_equal(expected, actual)
+
+    def test_aggregate_box_plot_per_multiple_groups(self):
+        df = create_recipe_hops_data(num_recipes=500, num_hops=15)
+        df["pairing"] = df["recipe_id"].str.len()
+        expected = df.groupby(["pairing", "kind_id"]).agg({"amount_percent": self.BOX_PLOT_AGGREGATION + ["count"]})
+        actual = aggregate_box_plot(df, "amount_percent", by=["pairing", "kind_id"], extra_aggregations={"amount_percent": "count"})
+        pd.testing.assert_frame_equal(expected, actual)
+
+    def test_aggregate_box_plot_without_groups(self):
+        df = create_recipe_hops_data(num_recipes=100, num_hops=5)
+        expected = df.agg({"amount_percent": self.BOX_PLOT_AGGREGATION})
+        actual = aggregate_box_plot(df, "amount_percent")
+        pd.testing.assert_frame_equal(expected, actual)
+
+
+class QuantileSketchTest(TestCase):
+    QUANTILES = [0.0, 0.02, 0.25, 0.5, 0.75, 0.98, 1.0]
+
+    def test_few_values_are_exact(self):
+        values = pd.Series([5.0, 1.0, 3.0, np.nan, 2.0, 8.0, 13.0])
+        sketch = QuantileSketch.from_values(values)
+
+        self.assertEquals(6, sketch.count)
+        self.assertEquals(list(values.quantile(self.QUANTILES)), list(sketch.quantiles(self.QUANTILES)))
+        self.assertAlmostEqual(values.mean(), sketch.mean)
+
+    def test_many_values_are_approximated(self):
+        values = pd.Series(np.random.default_rng(1).lognormal(2.0, 0.5, 100000))
+        sketch = QuantileSketch.from_values(values)
+
+        self.assertLess(len(sketch.means), 200)
+        self.assertEquals(100000, sketch.count)
+        for expected, actual in zip(values.quantile(self.QUANTILES), sketch.quantiles(self.QUANTILES)):
+            self.assertAlmostEqual(expected, actual, delta=expected * 0.01)
+
+    def test_merge(self):
+        values = pd.Series(np.random.default_rng(2).normal(50.0, 10.0, 20000))
+        sketch = QuantileSketch.from_values(values[:5000]).merge(QuantileSketch.from_values(values[5000:]))
+
+        self.assertEquals(20000, sketch.count)
+        self.assertEquals(values.min(), sketch.min)
+        self.assertEquals(values.max(), sketch.max)
+        for expected, actual in zip(values.quantile(self.QUANTILES), sketch.quantiles(self.QUANTILES)):
+            self.assertAlmostEqual(expected, actual, delta=0.5)
+
+    def test_serialization(self):
+        sketch = QuantileSketch.from_values(np.random.default_rng(3).normal(50.0, 10.0, 5000))
+        restored = QuantileSketch.from_bytes(sketch.to_bytes())
+
+        self.assertEquals(sketch.compression, restored.compression)
+        self.assertEquals(list(sketch.quantiles(self.QUANTILES)), list(restored.quantiles(self.QUANTILES)))
+
+    def test_empty(self):
+        sketch = QuantileSketch.from_bytes(QuantileSketch.from_values([]).to_bytes())
+
+        self.assertEquals(0, sketch.count)
+        self.assertTrue(np.isnan(sketch.quantile(0.5)))
+
+    def test_sketch_box_plot_equals_aggregate_box_plot(self):
+        df = create_recipe_hops_data(num_recipes=20, num_hops=5)
+        expected = aggregate_box_plot(df, "amount_percent")
+        actual = sketch_box_plot(QuantileSketch.from_values(df["amount_percent"]), "amount_percent")
+        pd.testing.assert_frame_equal(expected, actual)
+
+
+class HistogramTest(TestCase):
+    # The 2%/98% percentiles are exactly the second smallest and second largest value
+    VALUES = [0.5] + [round(4.0 + i * 0.1, 1) for i in range(49)] + [40.0]
+
+    def setUp(self) -> None:
+        for (i, abv) in enumerate(self.VALUES):
+            Recipe.objects.create(uid="r%02d" % i, abv=abv)
+
+    def histogram(self, sketch=None) -> DataFrame:
+        analysis = RecipesMetricHistogram(RecipeScope())
+        bins = lambda value_range: analysis.get_bins("abv", value_range)
+        return db_histogram("abv", "ROUND(abv, 1)", "FROM recipe_db_recipe AS r WHERE 1", [], 1, bins, sketch=sketch)
+
+    def expected_histogram(self) -> DataFrame:
+        df = remove_outliers(DataFrame({"abv": self.VALUES}), "abv", 0.02)
+        bins = RecipesMetricHistogram(RecipeScope()).get_bins("abv", df["abv"].max() - df["abv"].min())
+        return df.groupby(pd.cut(df["abv"], bins, precision=1), observed=False)["abv"].count()
+
+    def assert_histogram(self, histogram: DataFrame) -> None:
+        expected = self.expected_histogram()
+        self.assertEquals(list(map(str, expected.index)), list(histogram["abv"].astype(str)))
+        self.assertEquals(expected.tolist(), histogram["count"].tolist())
+        self.assertEquals(49, histogram["count"].sum())
+
+    def test_approximated_limits(self):
+        self.assert_histogram(self.histogram())
+
+    def test_limits_from_sketch(self):
+        self.assert_histogram(self.histogram(QuantileSketch.from_values(self.VALUES)))
+
+    def test_limits_from_style_sketch(self):
+        style = Style.objects.create(id="21A", name="American IPA")
+        for recipe in Recipe.objects.all():
+            recipe.associated_styles.add(style)
+        sketch = QuantileSketch.from_values([5.0, 6.0])
+        MetricSketch.objects.create(entity_type=MetricSketch.STYLE, entity_id="21A", metric="abv", sketch=sketch.to_bytes())
+
+        scope = RecipeScope()
+        scope.style_criteria.styles = [style]
+        histogram = RecipesMetricHistogram(scope).metric_histogram("abv")
+        self.assertEquals(9, histogram["count"].sum())  # Between the 2%/98% percentiles 5.02 and 5.98
+
+    def test_single_value(self):
+        Recipe.objects.update(abv=5.0)
+        histogram = self.histogram()
+        self.assertEquals(51, histogram["count"].sum())
+        self.assertEquals(1, (histogram["count"] > 0).sum())
+
+    def test_no_values(self):
+        Recipe.objects.update(abv=None)
+        self.assertEquals(0, len(self.histogram()))
+
+
+class NamesRegistryTest(TestCase):
+    def test_names_are_cached_and_invalidated(self):
+        Hop.objects.create(id="citra", name="Citra")
+        self.assertEquals({"citra": "Citra"}, get_hop_names_dict())
+        with self.assertNumQueries(0):
+            self.assertEquals({"citra": "Citra"}, get_hop_names_dict())
+
+        Hop.objects.create(id="mosaic", name="Mosaic")
+        self.assertEquals({"citra": "Citra", "mosaic": "Mosaic"}, get_hop_names_dict())
+
+        Hop.objects.filter(id="citra").get().delete()
+        self.assertEquals({"mosaic": "Mosaic"}, get_hop_names_dict())
+
+    def test_data_version_is_bumped_on_commit(self):
+        data_version = get_data_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            Hop.objects.create(id="citra", name="Citra")
+            self.assertEquals(data_version, get_data_version())
+
+        self.assertNotEqual(data_version, get_data_version())
+
+
+class PrecalculatedPopularityTest(TestCase):
+    def tearDown(self) -> None:
+        bump_data_version()  # Don't leave the cached availability to other tests
+
+    def test_available_at_popularity_version(self):
+        bump_data_version()
+        self.assertFalse(PrecalculatedPopularity.is_available())
+
+        bump_popularity_version()
+        self.assertTrue(PrecalculatedPopularity.is_available())
+        with self.assertNumQueries(0):
+            self.assertTrue(PrecalculatedPopularity.is_available())
+
+        # Outdated by later changes, e.g. import_recipes
+        bump_data_version()
+        self.assertFalse(PrecalculatedPopularity.is_available())
+
+    def analyze(self) -> list:
+        scope = RecipeScope()
+        hop_selection = HopSelection()
+        hop_selection.hops = [Hop.objects.get(pk="hop-1")]
+        return [
+            RecipesCountAnalysis(scope).per_month(),
+            RecipesPopularityAnalysis(scope).popularity_per_style(),
+            RecipesPopularityAnalysis(scope).popularity_per_style(num_top=2),
+            RecipesPopularityAnalysis(scope).popularity_per_hop(),
+            RecipesPopularityAnalysis(scope).popularity_per_hop(hop_selection),
+            RecipesPopularityAnalysis(scope).popularity_per_fermentable(),
+            RecipesPopularityAnalysis(scope).popularity_per_yeast(num_top=2),
+        ]
+
+    def test_precalculated_equals_queries(self):
+        create_ingredient_recipes(pd.date_range(start="2020-01-01", periods=24, freq="MS"))
+        bump_data_version()
+        self.assertFalse(PrecalculatedPopularity.is_available())
+        expected = self.analyze()
+
+        call_command("calculate_popularity", stdout=StringIO())
+        self.assertTrue(PrecalculatedPopularity.is_available())
+        actual = self.analyze()
+
+        for expected_df, actual_df in zip(expected, actual):
+            self.assertGreater(len(expected_df), 0)
+            pd.testing.assert_frame_equal(expected_df, actual_df)
+
+
+class MemoizeTest(TestCase):
+    def setUp(self) -> None:
+        MEMOIZE_STATS.reset()
+        clear_shared_results()
+
+    def test_memoized_within_block(self):
+        with memoization():
+            first = RecipesCountAnalysis(RecipeScope()).per_style()
+            with self.assertNumQueries(0):
+                second = RecipesCountAnalysis(RecipeScope()).per_style()
+
+        pd.testing.assert_frame_equal(first, second)
+        self.assertIsNot(first, second)
+        self.assertEquals((1, 1), (MEMOIZE_STATS.hits, MEMOIZE_STATS.misses))
+
+        with self.assertNumQueries(1):
+            RecipesCountAnalysis(RecipeScope()).per_style()
+        self.assertEquals((1, 1), (MEMOIZE_STATS.hits, MEMOIZE_STATS.misses))
+
+    def test_different_scopes_are_not_shared(self):
+        scope = RecipeScope()
+        scope.abv_min = 5.0
+        with memoization():
+            RecipesCountAnalysis(RecipeScope()).per_style()
+            RecipesCountAnalysis(scope).per_style()
+        self.assertEquals((0, 2), (MEMOIZE_STATS.hits, MEMOIZE_STATS.misses))
+
+    @override_settings(ANALYTICS_MEMOIZE_TTL=60)
+    def test_shared_across_blocks_with_ttl(self):
+        with memoization():
+            RecipesCountAnalysis(RecipeScope()).per_style()
+        with memoization():
+            RecipesCountAnalysis(RecipeScope()).per_style()
+        self.assertEquals((1, 1), (MEMOIZE_STATS.hits, MEMOIZE_STATS.misses))
+
+    @override_settings(ANALYTICS_MEMOIZE_TTL=60, ANALYTICS_MEMOIZE_MAX_ENTRIES=1)
+    def test_shared_results_evicted(self):
+        scope = RecipeScope()
+        scope.abv_min = 5.0
+        RecipesCountAnalysis(RecipeScope()).per_style()
+        RecipesCountAnalysis(scope).per_style()
+        with self.assertNumQueries(0):
+            RecipesCountAnalysis(scope).per_style()
+        with self.assertNumQueries(1):
+            RecipesCountAnalysis(RecipeScope()).per_style()
+
+    def test_block_stats(self):
+        with memoization() as stats:
+            RecipesCountAnalysis(RecipeScope()).per_style()
+            with memoization() as nested_stats:
+                RecipesCountAnalysis(RecipeScope()).per_style()
+            self.assertIs(stats, nested_stats)
+        with memoization() as other_stats:
+            RecipesCountAnalysis(RecipeScope()).per_style()
+
+        self.assertEqual((1, 1), (stats.hits, stats.misses))
+        self.assertEqual((0, 1), (other_stats.hits, other_stats.misses))
+        self.assertEqual((1, 2), (MEMOIZE_STATS.hits, MEMOIZE_STATS.misses))
+
+    @override_settings(ANALYTICS_QUERY_LOG=True)
+    def test_log_stats(self):
+        with mock.patch.object(instrumentation, "logger") as logger:
+            with memoization() as stats:
+                RecipesCountAnalysis(RecipeScope()).per_style()
+                RecipesCountAnalysis(RecipeScope()).per_style()
+            instrumentation.log_memoize_stats(stats, "/analyze/")
+
+        event = logger.info.call_args_list[-1]
+        self.assertEqual((MEMOIZE_LOG_EVENT,), event.args)
+        self.assertEqual(("/analyze/", 1, 1), (event.kwargs["path"], event.kwargs["hits"], event.kwargs["misses"]))
+
+
+class ScopeKeyTest(TestCase):
+    def test_equal_scopes_have_equal_keys(self):
+        scope1 = RecipeScope()
+        scope1.search_term = " Hazy  IPA"
+        scope1.abv_min = 5
+        scope1.og_max = 1060 * 0.001
+        scope1.style_criteria.styles = [Style(id="21A"), Style(id="18B")]
+
+        scope2 = RecipeScope()
+        scope2.search_term = "hazy ipa"
+        scope2.abv_min = 5.0
+        scope2.og_max = 1.06
+        scope2.style_criteria.styles = [Style(id="18B"), Style(id="21A")]
+
+        self.assertEquals(scope1.get_key(), scope2.get_key())
+        self.assertEquals("term=hazy ipa;abv=5.0:;og=:1.06;styles=18B,21A", scope1.get_key())
+
+    def test_different_scopes_have_different_keys(self):
+        scope1 = RecipeScope()
+        scope1.ibu_min = 20
+        scope2 = RecipeScope()
+        scope2.ibu_max = 20
+
+        self.assertNotEqual(scope1.get_key(), scope2.get_key())
+        self.assertEquals("", RecipeScope().get_key())
+
+    def test_single_style(self):
+        scope = RecipeScope()
+        scope.style_criteria.styles = [Style(id="21A")]
+        self.assertEquals("21A", scope.get_single_style().id)
+
+        scope.abv_min = 5
+        self.assertIsNone(scope.get_single_style())
+        self.assertIsNone(RecipeScope().get_single_style())
+
+
+class MultipleEntitiesScopeTest(TestCase):
+    def setUp(self) -> None:
+        snapshot.SNAPSHOT = None
+        citra = Hop.objects.create(id="citra", name="Citra")
+        mosaic = Hop.objects.create(id="mosaic", name="Mosaic")
+        simcoe = Hop.objects.create(id="simcoe", name="Simcoe")
+        ipa = Style.objects.create(id="21A", slug="american-ipa", name="American IPA")
+        pale_ale = Style.objects.create(id="18B", slug="american-pale-ale", name="American Pale Ale")
+        stout = Style.objects.create(id="20B", slug="american-stout", name="American Stout")
+
+        r1 = Recipe.objects.create(uid="r1", abv=5.0)
+        r1.associated_hops.set([citra, mosaic])
+        r1.associated_styles.set([pale_ale])
+        r2 = Recipe.objects.create(uid="r2", abv=7.0)
+        r2.associated_hops.set([citra, mosaic, simcoe])
+        r2.associated_styles.set([ipa])
+        r3 = Recipe.objects.create(uid="r3", abv=7.0)
+        r3.associated_hops.set([simcoe])
+        r3.associated_styles.set([stout])
+        self.hops = [citra, mosaic]
+        self.styles = [ipa, pale_ale]
+
+    def tearDown(self) -> None:
+        snapshot.SNAPSHOT = None
+
+    def assert_any_of(self):
+        # Recipes with any of the hops, each counted once
+        scope = RecipeScope()
+        scope.hop_criteria.hops = self.hops
+        self.assertEqual(2, RecipesCountAnalysis(scope).total())
+        scope.abv_min = 6.0
+        self.assertEqual(1, RecipesCountAnalysis(scope).total())
+
+        # Recipes with any of the styles
+        scope = RecipeScope()
+        scope.style_criteria.styles = self.styles
+        self.assertEqual(2, RecipesCountAnalysis(scope).total())
+        scope.abv_min = 6.0
+        self.assertEqual(1, RecipesCountAnalysis(scope).total())
+
+        scope = RecipeScope()
+        scope.hop_criteria.hops = [Hop(id="mosaic"), Hop(id="simcoe")]
+        scope.style_criteria.styles = [Style(id="21A"), Style(id="20B")]
+        self.assertEqual(2, RecipesCountAnalysis(scope).total())
+
+    def test_recipes_with_any_entity(self):
+        self.assert_any_of()
+
+    @override_settings(ANALYTICS_SNAPSHOT_ENGINE=True)
+    def test_recipes_with_any_entity_from_snapshot(self):
+        self.assert_any_of()
+
+
+class SnapshotTest(TestCase):
+    def setUp(self) -> None:
+        snapshot.SNAPSHOT = None
+        rng = np.random.default_rng(1)
+        styles = [Style.objects.create(id="1%s" % c, slug="style-%s" % c, name="Style %s" % c) for c in "ABC"]
+        hops = [Hop.objects.create(id="hop-%d" % i, name="Hop %d" % i) for i in range(4)]
+        fermentables = [Fermentable.objects.create(id="fermentable-%d" % i, name="Fermentable %d" % i) for i in range(3)]
+        yeasts = [Yeast.objects.create(id="yeast-%d" % i, name="Yeast %d" % i) for i in range(3)]
+        metric_ranges = dict(abv=(3, 10), ibu=(5, 80), srm=(2, 40), og=(1.03, 1.09), fg=(1.005, 1.02))
+        for i in range(80):
+            metrics = {
+                metric: None if rng.random() < 0.1 else float(rng.uniform(*value_range))
+                for (metric, value_range) in metric_ranges.items()
+            }
+            created = datetime.date(2020, 1, 1) + datetime.timedelta(days=int(rng.integers(700)))
+            recipe = Recipe.objects.create(uid="r%02d" % i, created=created, **metrics)
+            recipe.associated_styles.set(rng.choice(styles, size=rng.integers(0, 3), replace=False))
+            recipe.associated_hops.set(rng.choice(hops, size=rng.integers(0, 4), replace=False))
+            recipe.associated_fermentables.set(rng.choice(fermentables, size=rng.integers(0, 3), replace=False))
+            recipe.associated_yeasts.set(rng.choice(yeasts, size=rng.integers(0, 3), replace=False))
+
+        self.scopes = [RecipeScope() for _ in range(6)]
+        self.scopes[1].abv_min = 5.0
+        self.scopes[1].ibu_max = 40
+        self.scopes[2].creation_date_min = datetime.date(2020, 6, 1)
+        self.scopes[2].creation_date_max = datetime.date(2021, 3, 31)
+        self.scopes[3].style_criteria.styles = styles[:2]
+        self.scopes[3].og_min = 1.05
+        self.scopes[4].hop_criteria.hops = hops[:2]
+        self.scopes[4].srm_max = 20
+        self.scopes[5].fermentable_criteria.fermentables = fermentables[:1]
+        self.scopes[5].yeast_criteria.yeasts = yeasts[:1]
+
+    def tearDown(self) -> None:
+        snapshot.SNAPSHOT = None
+        bump_data_version()  # Don't leave a bumped data version to other tests
+
+    def query(self, scope: RecipeScope, select: str) -> DataFrame:
+        scope_filter = scope.get_filter()
+        query = "SELECT {} FROM recipe_db_recipe AS r {} WHERE 1 {}".format(
+            select, scope_filter.join_statement, scope_filter.where_statement
+        )
+        return read_sql(query, scope_filter.join_parameters + scope_filter.where_parameters)
+
+    def test_snapshot_equals_queries(self):
+        recipe_snapshot = snapshot.RecipeSnapshot(get_data_version())
+        for scope in self.scopes:
+            uids = set(self.query(scope, "r.uid")["uid"])
+            self.assertGreater(len(uids), 0)
+            self.assertEqual(len(uids), recipe_snapshot.count(scope))
+            self.assertEqual(uids, set(recipe_snapshot.sample(scope, 100)))
+            self.assertLessEqual(set(recipe_snapshot.sample(scope, 3, seed=1)), uids)
+
+            for metric in snapshot.SNAPSHOT_METRICS:
+                precision = METRIC_PRECISION.get(metric, METRIC_PRECISION["default"])
+                expected = self.query(scope, "ROUND(r.{0}, {1}) AS {0}".format(metric, precision))[metric].dropna()
+                actual = recipe_snapshot.metric_values(scope, metric, precision)[metric]
+                np.testing.assert_allclose(np.sort(expected.astype(float)), np.sort(actual), atol=10 ** -precision)
+
+    @override_settings(ANALYTICS_SNAPSHOT_ENGINE=True)
+    def test_counts_from_snapshot(self):
+        for scope in self.scopes:
+            self.assertEqual(len(self.query(scope, "r.uid")), RecipesCountAnalysis(scope).total())
+
+    @override_settings(ANALYTICS_SNAPSHOT_ENGINE=True)
+    def test_previous_snapshot_while_building(self):
+        bump_data_version()
+        previous = snapshot.get_snapshot()
+        bump_data_version()
+        with mock.patch.object(snapshot, "_snapshot_building", True):
+            self.assertIs(previous, snapshot.get_snapshot())
+
+        current = snapshot.get_snapshot()
+        self.assertIsNot(previous, current)
+        self.assertEqual(get_data_version(), current.data_version)
+
+
+class CreatedMonthTest(TestCase):
+    def setUp(self) -> None:
+        Recipe.objects.create(uid="r1", created=datetime.datetime(2020, 3, 17))
+        Recipe.objects.create(uid="r2", created=datetime.date(2020, 3, 1))
+        Recipe.objects.create(uid="r3", created=datetime.date(2020, 4, 30))
+        Recipe.objects.create(uid="r4")
+
+    def test_created_month_is_set_on_save(self):
+        months = dict(Recipe.objects.values_list("uid", "created_month"))
+        self.assertEquals(datetime.date(2020, 3, 1), months["r1"])
+        self.assertEquals(datetime.date(2020, 3, 1), months["r2"])
+        self.assertEquals(datetime.date(2020, 4, 1), months["r3"])
+        self.assertIsNone(months["r4"])
+
+    def test_per_month(self):
+        per_month = RecipesCountAnalysis(RecipeScope()).per_month()
+        self.assertEquals([2, 1], per_month["total_recipes"].tolist())
+        self.assertEquals(["2020-03-01", "2020-04-01"], [str(month) for month in per_month.index])
+
+
+class RandomRecipesTest(TestCase):
+    def setUp(self) -> None:
+        snapshot.SNAPSHOT = None
+        for i in range(30):
+            Recipe.objects.create(uid="r%02d" % i, abv=4.0 + (i % 2) * 2)
+
+    def tearDown(self) -> None:
+        snapshot.SNAPSHOT = None
+
+    def assert_random_recipes(self):
+        scope = RecipeScope()
+        scope.abv_min = 5.0
+        recipes = list(RecipesListAnalysis(scope).random(10, seed=1))
+
+        self.assertEquals(10, len(recipes))
+        self.assertEquals(10, len(set(recipes)))
+        self.assertTrue(all(recipe.abv >= 5.0 for recipe in recipes))
+        self.assertEquals(recipes, list(RecipesListAnalysis(scope).random(10, seed=1)))
+        self.assertEquals(15, len(list(RecipesListAnalysis(scope).random(20))))
+
+    def test_random(self):
+        self.assert_random_recipes()
+
+    @override_settings(ANALYTICS_SNAPSHOT_ENGINE=True)
+    def test_random_from_snapshot(self):
+        self.assert_random_recipes()
+
+    @mock.patch("recipe_db.analytics.recipe.RANDOM_CANDIDATES_PER_RECIPE", 2)
+    def test_random_positions(self):
+        scope = RecipeScope()
+        scope.abv_min = 5.0
+        recipes = list(RecipesListAnalysis(scope).random(5, seed=1))
+
+        self.assertEquals(5, len(set(recipes)))
+        self.assertTrue(all(recipe.abv >= 5.0 for recipe in recipes))
+        self.assertEquals(recipes, list(RecipesListAnalysis(scope).random(5, seed=1)))
+
+    def test_random_positions_in_one_query(self):
+        scope = RecipeScope()
+        scope.abv_min = 5.0
+        analysis = RecipesListAnalysis(scope)
+        with self.assertNumQueries(1):
+            recipe_ids = analysis._recipe_ids_at_sample_keys([0.0, 0.5, 0.5, 1.0])
+
+        self.assertEquals(4, len(recipe_ids))
+        self.assertEquals(recipe_ids[1], recipe_ids[2])
+        self.assertEquals(recipe_ids[0], recipe_ids[3])  # Wraps around at the end
+        self.assertEquals(analysis._recipe_ids_by_sample_key(0.0, 1)[0], recipe_ids[0])
+
+
+# Recipes with random styles and ingredients, including unmapped ones, created in the given months
+def create_ingredient_recipes(months: pd.DatetimeIndex) -> List[Hop]:
+    rng = np.random.default_rng(1)
+    hops = [Hop.objects.create(id="hop-%d" % i, name="Hop %d" % i) for i in range(6)]
+    styles = [Style.objects.create(id="1%s" % c, slug="style-%s" % c, name="Style %s" % c) for c in "ABCD"]
+    fermentables = [
+        Fermentable.objects.create(id="fermentable-%d" % i, name="Fermentable %d" % i, category=category, type=type)
+        for (i, (category, type)) in enumerate([
+            (Fermentable.GRAIN, Fermentable.BASE),
+            (Fermentable.GRAIN, Fermentable.CARA_CRYSTAL),
+            (Fermentable.GRAIN, Fermentable.ROASTED),
+            (Fermentable.SUGAR, None),
+        ])
+    ]
+    yeasts = [
+        Yeast.objects.create(id="yeast-%d" % i, name="Yeast %d" % i, type=type)
+        for (i, type) in enumerate([Yeast.ALE, Yeast.ALE, Yeast.LAGER])
+    ]
+    uses = [RecipeHop.BOIL, RecipeHop.AROMA, RecipeHop.DRY_HOP, None]
+    for i in range(60):
+        recipe = Recipe.objects.create(uid="r%02d" % i, created=months[rng.integers(len(months))].date())
+        recipe.associated_styles.set(rng.choice(styles, size=rng.integers(1, 3), replace=False))
+        for fermentable in list(rng.choice(fermentables, size=rng.integers(1, 4), replace=False)) + [None]:
+            amount = None if rng.random() < 0.1 else float(rng.integers(1, 80))
+            RecipeFermentable.objects.create(recipe=recipe, kind=fermentable, amount_percent=amount)
+        for yeast in rng.choice(yeasts + [None], size=rng.integers(1, 3), replace=False):
+            RecipeYeast.objects.create(recipe=recipe, kind=yeast)
+        recipe_hops = list(rng.choice(hops, size=rng.integers(1, 4), replace=False)) + [None]
+        for hop in recipe_hops:
+            for _ in range(rng.integers(1, 3)):
+                amount = None if rng.random() < 0.1 else float(rng.integers(0, 50))
+                RecipeHop.objects.create(recipe=recipe, kind=hop, use=rng.choice(uses), amount_percent=amount)
+        recipe.associated_hops.set([hop for hop in recipe_hops if hop is not None])
+
+    return hops
+
+
+class BundleTest(TestCase):
+    def setUp(self) -> None:
+        hops = create_ingredient_recipes(pd.date_range(start="2015-01-01", periods=60, freq="MS"))
+        self.hop = hops[0]
+        self.scope = RecipeScope()
+        self.scope.hop_criteria.hops = [self.hop]
+        self.hop_selection = HopSelection()
+        self.hop_selection.hops = [self.hop]
+        self.fermentable_selection = FermentableSelection()
+        self.fermentable_selection.categories = [Fermentable.GRAIN]
+        self.fermentable_selection.types = [Fermentable.BASE, Fermentable.ROASTED]
+        self.yeast_selection = YeastSelection()
+        self.yeast_selection.types = [Yeast.ALE]
+
+    def analyze(self) -> list:
+        return [
+            FermentableAmountAnalysis(self.scope).per_fermentable().sort_values("kind_id").reset_index(drop=True),
+            FermentableAmountAnalysis(self.scope).per_fermentable(self.fermentable_selection).reset_index(drop=True),
+            FermentableAmountAnalysis(self.scope).per_style().sort_values("style_id").reset_index(drop=True),
+            RecipesPopularityAnalysis(self.scope).popularity_per_yeast().reset_index(drop=True),
+            RecipesPopularityAnalysis(self.scope).popularity_per_yeast(self.yeast_selection, num_top=1).reset_index(drop=True),
+            RecipesTrendAnalysis(self.scope).trending_yeasts(trend_window_months=12).reset_index(drop=True),
+            HopAmountAnalysis(self.scope).per_style(num_top=20).sort_values("style_id").reset_index(drop=True),
+            HopAmountAnalysis(self.scope).per_use(),
+            HopAmountAnalysis(self.scope).per_use(self.hop_selection),
+            HopPairingAnalysis(self.scope).pairings(self.hop).reset_index(drop=True),
+            CommonStylesAnalysis(self.scope).common_styles_absolute().sort_values("style_id").reset_index(drop=True),
+        ]
+
+    def test_bundle_equals_queries(self):
+        expected = self.analyze()
+        with bundle():
+            # Hops, styles, fermentables, yeasts and the recipes per month
+            with self.assertNumQueries(5):
+                actual = self.analyze()
+
+        for expected_df, actual_df in zip(expected, actual):
+            pd.testing.assert_frame_equal(expected_df, actual_df)
+
+
+class QueryInstrumentationTest(TestCase):
+    def test_fingerprint_ignores_literals_and_list_sizes(self):
+        self.assertEquals(
+            query_fingerprint("SELECT * FROM recipe_db_recipe WHERE abv >= 5 AND style_id IN (%s, %s)"),
+            query_fingerprint("SELECT *\n FROM recipe_db_recipe\n WHERE abv >= 6.5 AND style_id IN (%s)"),
+        )
+        self.assertNotEqual(
+            query_fingerprint("SELECT * FROM recipe_db_recipe WHERE abv >= 5"),
+            query_fingerprint("SELECT * FROM recipe_db_recipe WHERE ibu >= 5"),
+        )
+
+    def test_queries_are_not_logged_by_default(self):
+        with mock.patch.object(instrumentation.logger, "info") as log:
+            RecipesCountAnalysis(RecipeScope()).per_style()
+        log.assert_not_called()
+
+    @override_settings(ANALYTICS_QUERY_LOG=True)
+    def test_query_is_logged_with_caller(self):
+        with mock.patch.object(instrumentation.logger, "info") as log:
+            with chart_context("analyze:styles"):
+                RecipesCountAnalysis(RecipeScope()).per_style()
+
+        log.assert_called_once()
+        event, fields = log.call_args.args[0], log.call_args.kwargs
+        self.assertEquals(QUERY_LOG_EVENT, event)
+        self.assertEquals("RecipesCountAnalysis", fields["analysis"])
+        self.assertEquals("analyze:styles", fields["chart_type"])
+        self.assertEquals(0, fields["rows"])
+        self.assertIsNotNone(fields["pandas_ms"])
+
+
+@override_settings(ANALYTICS_QUERY_THREADS=2)
+class RunParallelTest(TransactionTestCase):
+    def test_results_in_order(self):
+        def thread_name(value):
+            return lambda: (value, threading.current_thread().name)
+
+        results = run_parallel(thread_name(1), thread_name(2), thread_name(3))
+        self.assertEquals([1, 2, 3], [value for value, _ in results])
+        self.assertEquals(threading.current_thread().name, results[0][1])
+        self.assertTrue(results[1][1].startswith("analytics-query"))
+
+    def test_context_is_passed_to_threads(self):
+        with chart_context("analyze:styles"):
+            results = run_parallel(lambda: 1, lambda: instrumentation._chart_type.get())
+        self.assertEquals([1, "analyze:styles"], results)
+
+    def test_sequential_within_transaction(self):
+        with transaction.atomic():
+            results = run_parallel(lambda: 1, lambda: threading.current_thread().name)
+        self.assertEquals([1, threading.current_thread().name], results)
@@ -1,31 +1,51 @@
 import math
+import time
 from datetime import datetime
+from threading import Lock
+from typing import Optional, Union, Callable, Tuple
 
+import numpy as np
 import pandas as pd
 from django.db import connection
 from pandas import DataFrame
+from scipy.signal import get_window
 
-from recipe_db.analytics import slope
+from recipe_db.analytics import grouped_slope, BOX_PLOT_QUANTILES
+from recipe_db.analytics.instrumentation import record_query
+from recipe_db.analytics.sketch import QuantileSketch
+from recipe_db.data_version import get_data_version
 from recipe_db.models import Yeast
 
+BOX_PLOT_COLUMNS = ["lowerfence", "q1", "median", "mean", "q3", "upperfence"]
+
 
 def months_ago(top_months: int) -> pd.Timestamp:
     return pd.Timestamp("now").floor("D") - pd.DateOffset(months=top_months)
 
 
-def get_style_names_dict() -> dict:
-    return dict(db_query_fetch_tuples("SELECT id, name FROM recipe_db_style"))
-
-
-def get_fermentable_names_dict() -> dict:
-    return dict(db_query_fetch_tuples("SELECT id, name FROM recipe_db_fermentable"))
+# Names of an entity type, loaded once per process. Reloaded when an entity was saved/deleted (see
+# analytics.signals module) or the data version was changed. The returned dicts are shared, don't modify them.
+class NamesRegistry:
+    def __init__(self, load_names: Callable[[], dict]) -> None:
+        self.load_names = load_names
+        self.names: Optional[dict] = None
+        self.data_version: Optional[int] = None
+        self.lock = Lock()
 
+    def get(self) -> dict:
+        data_version = get_data_version()
+        with self.lock:
+            if self.names is None or self.data_version != data_version:
+                self.names = self.load_names()
+                self.data_version = data_version
+            return self.names
 
-def get_hop_names_dict() -> dict:
-    return dict(db_query_fetch_tuples("SELECT id, name FROM recipe_db_hop"))
+    def invalidate(self) -> None:
+        with self.lock:
+            self.names = None
 
 
-def get_yeast_names_dict() -> dict:
+def load_yeast_names() -> dict:
     yeast_names = {}
     for yeast in Yeast.objects.all():
         product_name = yeast.full_name
@@ -35,12 +55,186 @@ def get_yeast_names_dict() -> dict:
     return yeast_names
 
 
+STYLE_NAMES = NamesRegistry(lambda: dict(db_query_fetch_tuples("SELECT id, name FROM recipe_db_style")))
+FERMENTABLE_NAMES = NamesRegistry(lambda: dict(db_query_fetch_tuples("SELECT id, name FROM recipe_db_fermentable")))
+HOP_NAMES = NamesRegistry(lambda: dict(db_query_fetch_tuples("SELECT id, name FROM recipe_db_hop")))
+YEAST_NAMES = NamesRegistry(load_yeast_names)
+
+
+def get_style_names_dict() -> dict:
+    return STYLE_NAMES.get()
+
+
+def get_fermentable_names_dict() -> dict:
+    return FERMENTABLE_NAMES.get()
+
+
+def get_hop_names_dict() -> dict:
+    return HOP_NAMES.get()
+
+
+def get_yeast_names_dict() -> dict:
+    return YEAST_NAMES.get()
+
+
+# Same as aggregating with [lowerfence, q1, "median", "mean", q3, upperfence], but all quantiles are calculated at once.
+# The extra aggregations are added as (column, function) columns.
+def aggregate_box_plot(df: DataFrame, value_column: str, by=None, extra_aggregations: Optional[dict] = None) -> DataFrame:
+    quantile_names = list(BOX_PLOT_QUANTILES.keys())
+    quantiles = list(BOX_PLOT_QUANTILES.values())
+
+    if by is None:
+        values = df[value_column]
+        stats = values.quantile(quantiles)
+        stats.index = quantile_names
+        stats["mean"] = values.mean()
+        return DataFrame({value_column: stats[BOX_PLOT_COLUMNS]})
+
+    grouped = df.groupby(by)
+    stats = grouped[value_column].quantile(quantiles).unstack().reindex(columns=quantiles)
+    stats.columns = quantile_names
+    stats["mean"] = grouped[value_column].mean()
+    stats = stats[BOX_PLOT_COLUMNS]
+    stats.columns = pd.MultiIndex.from_product([[value_column], BOX_PLOT_COLUMNS])
+
+    for column, function in (extra_aggregations or {}).items():
+        stats[(column, function)] = grouped[column].agg(function)
+
+    return stats
+
+
+# Same result as aggregate_box_plot() without groups, but approximated from a pre-calculated sketch
+def sketch_box_plot(sketch: QuantileSketch, value_column: str) -> DataFrame:
+    stats = pd.Series(sketch.quantiles(list(BOX_PLOT_QUANTILES.values())), index=list(BOX_PLOT_QUANTILES.keys()))
+    stats["mean"] = sketch.mean
+    return DataFrame({value_column: stats[BOX_PLOT_COLUMNS]})
+
+
+# Same as SUM(amount_percent) ... GROUP BY in SQL: missing values form their own group and a sum of NULLs is NULL
+def sum_amounts(df: DataFrame, by: list) -> DataFrame:
+    return df.groupby(by, dropna=False, sort=False)["amount_percent"].sum(min_count=1).reset_index()
+
+
 def remove_outliers(df: DataFrame, field: str, cutoff_percentile: float) -> DataFrame:
     lower_limit = df[field].quantile(cutoff_percentile)
     upper_limit = df[field].quantile(1.0 - cutoff_percentile)
     return df[df[field].between(lower_limit, upper_limit)]
 
 
+# Number of buckets, in which the outlier limits of a histogram are approximated
+OUTLIER_LIMIT_BUCKETS = 1000
+
+
+# Same result as pd.cut() on the values with outliers removed (see remove_outliers), but counting is done in the
+# database. The FROM statement has to include the WHERE clause. The number of bins is either given or calculated
+# from the value range. The outlier limits are taken from the sketch of the scope, if there is one, or approximated.
+def db_histogram(
+    column: str,
+    value_expression: str,
+    from_statement: str,
+    parameters: list,
+    precision: int,
+    bins: Union[int, Callable[[float], int]],
+    cutoff_percentile: float = 0.02,
+    sketch: Optional[QuantileSketch] = None,
+) -> DataFrame:
+    from_statement = "{} AND {} IS NOT NULL".format(from_statement, value_expression)
+
+    # Optimization: Pre-calculated sketch => outlier limits without scanning the values
+    if sketch is not None and sketch.count > 0:
+        from_statement = "{} AND {} BETWEEN %s AND %s".format(from_statement, value_expression)
+        parameters = parameters + [sketch.quantile(cutoff_percentile), sketch.quantile(1.0 - cutoff_percentile)]
+        (num_values, min_value, max_value) = db_value_range(value_expression, from_statement, parameters)
+    else:
+        (num_values, min_value, max_value) = db_trimmed_value_range(
+            value_expression, from_statement, parameters, cutoff_percentile
+        )
+        from_statement = "{} AND {} BETWEEN %s AND %s".format(from_statement, value_expression)
+        parameters = parameters + [min_value, max_value]
+
+    if num_values == 0:
+        return DataFrame(columns=[column])
+
+    # Bin edges and labels from pd.cut(), which only depend on the min and max value
+    if callable(bins):
+        bins = bins(max_value - min_value)
+    categories = pd.cut(pd.Series([min_value, max_value]), bins, precision=precision)
+    intervals = categories.cat.categories
+
+    if min_value == max_value:
+        counts = {int(categories.cat.codes[0]): num_values}
+    else:
+        # The edges are evenly spaced from the min to the max value. Values are in (edge, next edge], the first bin
+        # also includes the min value. The small offset keeps values sitting on an edge in the lower bin, even when
+        # the division is off by a rounding error.
+        query = """
+                SELECT
+                    FLOOR(({value} - %s) / %s - 0.000000001) AS bin,
+                    COUNT(*) AS count
+                {from_statement}
+                GROUP BY bin
+            """.format(value=value_expression, from_statement=from_statement)
+        width = (max_value - min_value) / len(intervals)
+        counts = {}
+        for (bin, count) in db_query_fetch_tuples(query, [min_value, width] + parameters):
+            bin = min(max(int(bin), 0), len(intervals) - 1)
+            counts[bin] = counts.get(bin, 0) + count
+
+    labels = list(map(str, intervals))
+    return DataFrame({
+        column: pd.Categorical(labels, categories=labels, ordered=True),
+        "count": [counts.get(i, 0) for i in range(len(intervals))],
+    })
+
+
+# Number, min and max of the values
+def db_value_range(value_expression: str, from_statement: str, parameters: list) -> Tuple[int, float, float]:
+    query = "SELECT COUNT(*), MIN({value}), MAX({value}) {from_statement}".format(
+        value=value_expression, from_statement=from_statement
+    )
+    (num_values, min_value, max_value) = db_query_fetch_tuples(query, parameters)[0]
+    if num_values == 0:
+        return 0, np.nan, np.nan
+    return num_values, float(min_value), float(max_value)
+
+
+# Number, min and max of the values between the cutoff percentiles. The percentiles are approximated by counting the
+# values in fine buckets. The limits are widened to the bucket containing the percentile, so a few more values are
+# kept than with exact percentiles (see remove_outliers).
+def db_trimmed_value_range(
+    value_expression: str, from_statement: str, parameters: list, cutoff_percentile: float
+) -> Tuple[int, float, float]:
+    (num_values, min_value, max_value) = db_value_range(value_expression, from_statement, parameters)
+    if num_values == 0 or min_value == max_value:
+        return num_values, min_value, max_value
+
+    query = """
+            SELECT
+                FLOOR(({value} - %s) / %s) AS bucket,
+                COUNT(*) AS count,
+                MIN({value}) AS min_value,
+                MAX({value}) AS max_value
+            {from_statement}
+            GROUP BY bucket
+            ORDER BY bucket
+        """.format(value=value_expression, from_statement=from_statement)
+    width = (max_value - min_value) / OUTLIER_LIMIT_BUCKETS
+    buckets = db_query_fetch_tuples(query, [min_value, width] + parameters)
+
+    # Buckets containing the values around the percentiles in the sorted values, like Series.quantile()
+    cumulative_counts = np.cumsum([bucket[1] for bucket in buckets])
+    lower_position = math.floor(cutoff_percentile * (num_values - 1))
+    upper_position = math.ceil((1.0 - cutoff_percentile) * (num_values - 1))
+    lower = int(np.searchsorted(cumulative_counts, lower_position, side="right"))
+    upper = int(np.searchsorted(cumulative_counts, upper_position, side="right"))
+
+    num_trimmed_values = int(cumulative_counts[upper] - cumulative_counts[lower] + buckets[lower][1])
+    return num_trimmed_values, float(buckets[lower][2]), float(buckets[upper][3])
+
+
+ROLLING_MIN_PERIODS = 4
+
+
 class RollingAverage:
     TIME_UNIT_MONTH = "month"
     TIME_UNIT_DAY = "day"
@@ -66,7 +260,7 @@ class RollingAverage:
         df = df.reindex(day_range, fill_value=0)
 
         # Rolling calculation
-        rolling_df = df.rolling(self.window, min_periods=4, win_type="cosine", center=True).mean()
+        rolling_df = df.rolling(self.window, min_periods=ROLLING_MIN_PERIODS, win_type="cosine", center=True).mean()
 
         # Find non-zero start
         start_timestamp = rolling_df[rolling_df > 0].index.min()
@@ -80,21 +274,74 @@ class RollingAverage:
         if len(df) == 0:
             return df
 
-        series_dfs = []
-        series_values = df[series_column].unique()
-        for series_value in series_values:
-            series_df = df[df[series_column].eq(series_value)]
-            series_df = series_df.drop([series_column], axis=1)
-            rolling_series_df = self.rolling(series_df, time_column)
-            if len(rolling_series_df) > 0:
-                rolling_series_df[series_column] = series_value
-                series_dfs.append(rolling_series_df)
-
-        if len(series_dfs) == 0:
+        # Same result as applying rolling() to each series, but all series are smoothened in a single pass
+        df = df[df[series_column].notnull()]
+        if len(df) == 0:
+            dummy = DataFrame(columns=df.columns)
+            return dummy
+
+        value_columns = [c for c in df.columns if c not in [series_column, time_column]]
+        series_codes, series_values = pd.factorize(df[series_column])
+        times = pd.DatetimeIndex(df[time_column])
+        num_series = len(series_values)
+
+        # Time range per series, padded with zeros on the left (half window width)
+        series_min = times.to_series().groupby(series_codes).min().values
+        series_max = times.to_series().groupby(series_codes).max().values
+        series_start = pd.DatetimeIndex(series_min) - pd.DateOffset(months=math.floor(self.window / 2))
+        time_range = pd.date_range(start=series_start.min(), end=series_max.max(), freq=self.time_freq, name=time_column)
+        range_start = time_range.searchsorted(series_start, side="left")
+        range_end = time_range.searchsorted(series_max, side="right")
+
+        # Time x series matrix, missing values within a series' time range are filled in with zeros
+        positions = np.arange(len(time_range))[:, np.newaxis]
+        in_range = (positions >= range_start) & (positions < range_end)
+        time_positions = time_range.get_indexer(times)
+        on_grid = time_positions >= 0
+        values = np.full((len(time_range), num_series, len(value_columns)), np.nan)
+        values[in_range] = 0
+        values[time_positions[on_grid], series_codes[on_grid]] = df[value_columns].values[on_grid]
+
+        # Rolling calculation
+        rolling_values = self._rolling_mean(values.reshape(len(time_range), -1)).reshape(values.shape)
+
+        # Select the same rows as rolling() would return
+        has_min_data_points = np.bincount(series_codes, minlength=num_series) > self.min_data_points
+        selected = in_range & has_min_data_points & ~np.isnan(rolling_values).all(axis=2)
+        selected &= (time_range.day == 1)[:, np.newaxis]
+        series_idx, time_idx = np.nonzero(selected.T)  # Ordered by series, then time
+        if len(series_idx) == 0:
             dummy = DataFrame(columns=df.columns)
             return dummy
 
-        return pd.concat(series_dfs)
+        result = DataFrame(rolling_values[time_idx, series_idx], columns=value_columns)
+        result.insert(0, time_column, time_range[time_idx])
+        result[series_column] = np.asarray(series_values)[series_idx]
+        result.index = result.groupby(series_idx).cumcount().values
+        return result
+
+    def _rolling_mean(self, values: np.ndarray) -> np.ndarray:
+        # Centered rolling mean with cosine weights on each column, equal to pandas' rolling().mean()
+        weights = get_window("cosine", self.window, False)
+        offset = self.window // 2
+        num_rows = values.shape[0]
+        valid = ~np.isnan(values)
+        filled = np.where(valid, values, 0.0)
+
+        weighted_sum = np.zeros(values.shape)
+        weights_sum = np.zeros(values.shape)
+        num_values = np.zeros(values.shape, dtype=int)
+        for i, weight in enumerate(weights):
+            shift = i - offset
+            start, end = max(0, -shift), min(num_rows, num_rows - shift)
+            weighted_sum[start:end] += weight * filled[start + shift:end + shift]
+            weights_sum[start:end] += weight * valid[start + shift:end + shift]
+            num_values[start:end] += valid[start + shift:end + shift]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rolling = weighted_sum / weights_sum
+        rolling[num_values < ROLLING_MIN_PERIODS] = np.nan
+        return rolling
 
 
 class Trending:
@@ -132,8 +379,9 @@ class Trending:
 
         # Calculate mean and slope on recent time frame
         trend_df = recent_df.groupby(series_column).agg(
-            {percent_column: ["mean", slope], count_column: "sum", time_column: "max"}
+            {percent_column: "mean", count_column: "sum", time_column: "max"}
         )
+        trend_df.insert(1, "slope", grouped_slope(recent_df, series_column, percent_column))
         trend_df.columns = ["mean", "slope", "data_points", "max_time"]
         trend_df = trend_df[trend_df["max_time"].eq(max_time)]  # Consider only when there's data till the end
         trend_df = trend_df[
@@ -168,25 +416,34 @@ class Trending:
 def db_query_fetch_tuples(query: str, params: list=None):
     if params is None:
         params = []
+    start = time.perf_counter()
     with connection.cursor() as cursor:
         cursor.execute(query, params)
-        return cursor.fetchall()
+        rows = cursor.fetchall()
+    record_query(query, params, len(rows), time.perf_counter() - start, caller_depth=2)
+    return rows
 
 
 def db_query_fetch_dictlist(query: str, params: list=None):
     if params is None:
         params = []
+    start = time.perf_counter()
     with connection.cursor() as cursor:
         cursor.execute(query, params)
-        return dictfetchall(cursor)
+        rows = dictfetchall(cursor)
+    record_query(query, params, len(rows), time.perf_counter() - start, caller_depth=2)
+    return rows
 
 
 def db_query_fetch_single(query: str, params: list=None):
     if params is None:
         params = []
+    start = time.perf_counter()
     with connection.cursor() as cursor:
         cursor.execute(query, params)
-        return cursor.fetchone()[0]
+        value = cursor.fetchone()[0]
+    record_query(query, params, 1, time.perf_counter() - start, caller_depth=2)
+    return value
 
 
 def dictfetchall(cursor):
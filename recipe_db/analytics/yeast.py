@@ -1,7 +1,6 @@
-import pandas as pd
-from django.db import connection
 from pandas import DataFrame
 
+from recipe_db.analytics.instrumentation import read_sql
 from recipe_db.analytics.utils import db_query_fetch_dictlist, db_query_fetch_single
 
 
@@ -34,7 +33,7 @@ class YeastSearchAnalysis:
             LIMIT 10
         """
 
-        df = pd.read_sql(query, connection)
+        df = read_sql(query)
         df['volume'] = (df['volume'] / max_volume * 100).round()
 
         return df
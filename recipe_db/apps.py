@@ -6,5 +6,8 @@ class RecipeDbConfig(AppConfig):
     def ready(self):
         from django.db.models.signals import post_save, post_delete
         from recipe_db.search.signals import entity_saved, entity_deleted
+        from recipe_db.analytics.signals import entity_changed
         post_save.connect(entity_saved)
         post_delete.connect(entity_deleted)
+        post_save.connect(entity_changed)
+        post_delete.connect(entity_changed)
@@ -0,0 +1,51 @@
+import time
+from threading import Lock
+from typing import Optional
+
+from django.db.models import F
+
+from recipe_db.models import DataVersion
+
+# Seconds until the data version is re-checked in the database
+DATA_VERSION_CHECK_INTERVAL = 60
+
+DATA_VERSION_ID = 1
+
+_data_version: Optional[int] = None
+_data_version_checked_at = 0.0
+_data_version_lock = Lock()
+
+
+def get_data_version() -> int:
+    global _data_version, _data_version_checked_at
+    with _data_version_lock:
+        now = time.monotonic()
+        if _data_version is None or now - _data_version_checked_at > DATA_VERSION_CHECK_INTERVAL:
+            row = DataVersion.objects.filter(pk=DATA_VERSION_ID).values_list("version", flat=True).first()
+            _data_version = row or 0
+            _data_version_checked_at = now
+        return _data_version
+
+
+# Has to be called after data was changed in bulk, so that in-memory data will be reloaded
+def bump_data_version() -> int:
+    global _data_version
+    updated = DataVersion.objects.filter(pk=DATA_VERSION_ID).update(version=F("version") + 1)
+    if not updated:
+        DataVersion.objects.create(pk=DATA_VERSION_ID, version=1)
+
+    with _data_version_lock:
+        _data_version = None  # Force re-check
+    return get_data_version()
+
+
+# Has to be called after the popularity was pre-calculated, the pre-calculated counts are only used until the data
+# version is bumped again. Not recorded when the data was changed concurrently.
+def bump_popularity_version() -> int:
+    version = bump_data_version()
+    DataVersion.objects.filter(pk=DATA_VERSION_ID, version=version).update(popularity_version=version)
+    return version
+
+
+def get_popularity_version() -> Optional[int]:
+    return DataVersion.objects.filter(pk=DATA_VERSION_ID).values_list("popularity_version", flat=True).first()
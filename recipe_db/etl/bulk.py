@@ -0,0 +1,237 @@
+import multiprocessing
+import os
+import time
+from contextlib import nullcontext
+from functools import partial
+from itertools import islice
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Callable, Tuple, ContextManager
+
+from django.db import transaction, DatabaseError
+
+from recipe_db.etl.format.beersmith import BeerSmithParser
+from recipe_db.etl.format.beerxml import BeerXMLParser
+from recipe_db.etl.format.mmum import MmumParser
+from recipe_db.etl.format.parser import ParserResult, FormatParser
+from recipe_db.etl.loader import RecipeBatchLoader
+from recipe_db.models import Recipe
+from recipe_db.processes import drop_inherited_connections
+from recipe_db.search.recipe_index import suspend_recipe_index_updates
+
+FORMAT_PARSERS = {
+    "beerxml": BeerXMLParser,
+    "beersmith": BeerSmithParser,
+    "mmum": MmumParser,
+}
+
+FILE_EXTENSIONS = {
+    "beerxml": [".xml"],
+    "beersmith": [".bsmx", ".xml"],
+    "mmum": [".json"],
+}
+
+# Number of batches handed to the worker processes at once, limits the parsed results waiting in memory
+BATCHES_PER_WINDOW = 10
+
+# Parser instances of a worker process, so they're created once per process rather than per file
+_parsers = {}
+
+
+class ImportTask(NamedTuple):
+    uid: str
+    file_path: str
+
+
+class ParsedFile(NamedTuple):
+    uid: str
+    result: Optional[ParserResult]
+    error: Optional[str]
+    parse_time: float
+
+
+class ImportStats:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.files = 0
+        self.imported = 0
+        self.skipped = 0
+        self.parse_errors = 0
+        self.load_errors = 0
+        self.parse_time = 0.0  # Summed up over all worker processes
+        self.wait_time = 0.0  # Waiting for the worker processes
+        self.write_time = 0.0
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    @property
+    def files_per_second(self) -> float:
+        elapsed = self.elapsed
+        return self.files / elapsed if elapsed > 0 else 0.0
+
+
+# Files of the format in a directory tree. The file name without extension is used as the source id of the recipe.
+def find_import_tasks(directory: str, source: str, format_name: str) -> Iterator[ImportTask]:
+    extensions = FILE_EXTENSIONS[format_name]
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for file_name in sorted(files):
+            (source_id, extension) = os.path.splitext(file_name)
+            if extension.lower() in extensions:
+                yield ImportTask("{}:{}".format(source, source_id), os.path.join(root, file_name))
+
+
+# Manifest file with a "<uid> <file path>" line per recipe. Relative paths are relative to the manifest.
+def read_manifest(manifest_path: str) -> Iterator[ImportTask]:
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, "rt", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            (uid, file_path) = line.split(maxsplit=1)
+            yield ImportTask(uid, os.path.join(base_dir, file_path))
+
+
+def get_parser(format_name: str) -> FormatParser:
+    if format_name not in _parsers:
+        _parsers[format_name] = FORMAT_PARSERS[format_name]()
+    return _parsers[format_name]
+
+
+# Runs in the worker processes. Errors are returned, so a broken file doesn't stop the import.
+def parse_file(format_name: str, task: ImportTask) -> ParsedFile:
+    start = time.perf_counter()
+    result = ParserResult()
+    try:
+        get_parser(format_name).parse(result, task.file_path)
+    except Exception as e:
+        return ParsedFile(task.uid, None, "{}: {}".format(type(e).__name__, e), time.perf_counter() - start)
+    return ParsedFile(task.uid, result, None, time.perf_counter() - start)
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# Parses recipe files in a process pool and streams the results to a single writer in the calling process, which
+# inserts them in bulk and commits them in batches
+class BulkRecipeImporter:
+    def __init__(
+        self,
+        format_name: str,
+        loader: RecipeBatchLoader,
+        workers: int,
+        batch_size: int,
+        replace_existing: bool = False,
+        queue_index_updates: bool = True,
+        on_error: Optional[Callable[[str, str], None]] = None,
+        on_batch: Optional[Callable[[ImportStats], None]] = None,
+    ) -> None:
+        self.format_name = format_name
+        self.loader = loader
+        self.workers = workers
+        self.batch_size = batch_size
+        self.replace_existing = replace_existing
+        self.queue_index_updates = queue_index_updates
+        self.on_error = on_error
+        self.on_batch = on_batch
+        self.stats = ImportStats()
+        self.batch: List[ParsedFile] = []
+
+    def run(self, tasks: Iterable[ImportTask]) -> ImportStats:
+        self.stats = ImportStats()
+        parse = partial(parse_file, self.format_name)
+
+        if self.workers < 1:
+            self.consume(map(parse, tasks))
+        else:
+            with multiprocessing.get_context("fork").Pool(
+                self.workers, initializer=drop_inherited_connections
+            ) as pool:
+                for window in chunked(tasks, self.batch_size * BATCHES_PER_WINDOW):
+                    chunk_size = max(1, len(window) // (self.workers * 4))
+                    self.consume(pool.imap_unordered(parse, window, chunk_size))
+
+        self.flush()
+        return self.stats
+
+    def consume(self, parsed_files: Iterator[ParsedFile]) -> None:
+        while True:
+            start = time.perf_counter()
+            parsed = next(parsed_files, None)
+            self.stats.wait_time += time.perf_counter() - start
+            if parsed is None:
+                return
+            self.add(parsed)
+
+    def add(self, parsed: ParsedFile) -> None:
+        self.stats.files += 1
+        self.stats.parse_time += parsed.parse_time
+        if parsed.error is not None:
+            self.stats.parse_errors += 1
+            self.report_error(parsed.uid, parsed.error)
+            return
+
+        self.batch.append(parsed)
+        if len(self.batch) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if len(self.batch) == 0:
+            return
+
+        start = time.perf_counter()
+        with transaction.atomic(), self.index_updates():
+            existing = Recipe.objects.filter(uid__in=[parsed.uid for parsed in self.batch])
+            existing_uids = set()
+            if self.replace_existing:
+                existing.delete()
+            else:
+                existing_uids = set(existing.values_list("uid", flat=True))
+
+            new_recipes = [(parsed.uid, parsed.result) for parsed in self.batch if parsed.uid not in existing_uids]
+            self.stats.skipped += len(self.batch) - len(new_recipes)
+            errors = self.import_recipes(new_recipes)
+
+        self.stats.imported += len(new_recipes) - len(errors)
+        self.stats.load_errors += len(errors)
+        for (uid, message) in errors:
+            self.report_error(uid, message)
+
+        self.batch = []
+        self.stats.write_time += time.perf_counter() - start
+        if self.on_batch is not None:
+            self.on_batch(self.stats)
+
+    # Imports, which are followed by a full reload of the search index, don't need to queue the recipes
+    def index_updates(self) -> ContextManager:
+        if self.queue_index_updates:
+            return nullcontext()
+        return suspend_recipe_index_updates()
+
+    def import_recipes(self, recipes: List[Tuple[str, ParserResult]]) -> List[Tuple[str, str]]:
+        try:
+            with transaction.atomic():
+                return self.loader.import_recipes(recipes)
+        except DatabaseError:
+            pass
+
+        # Find the failing recipes, e.g. a duplicate uid, by importing one at a time in a savepoint each
+        errors = []
+        for (uid, result) in recipes:
+            try:
+                with transaction.atomic():
+                    errors.extend(self.loader.import_recipes([(uid, result)]))
+            except DatabaseError as e:
+                errors.append((uid, "{}: {}".format(type(e).__name__, e)))
+        return errors
+
+    def report_error(self, uid: str, message: str) -> None:
+        if self.on_error is not None:
+            self.on_error(uid, message)
@@ -1,11 +1,22 @@
 import abc
+from collections import defaultdict
 from typing import Tuple, List
 
 from django.core.exceptions import ValidationError
-from django.db import transaction
+from django.db import transaction, DatabaseError
 
 from recipe_db.etl.format.parser import FormatParser, ParserResult
-from recipe_db.models import Recipe, RecipeHop, RecipeFermentable, RecipeYeast
+from recipe_db.models import (
+    Recipe,
+    RecipeHop,
+    RecipeFermentable,
+    RecipeYeast,
+    RecipeFermentableExtra,
+    RecipeHopExtra,
+    RecipeYeastExtra,
+    SearchIndexUpdateQueue,
+)
+from recipe_db.search.recipe_index import queue_refresh_recipes_index
 
 
 class ResultPostProcessor:
@@ -15,12 +26,12 @@ class ResultPostProcessor:
 
 
 class RecipeLoader:
+    # Fields which aren't checked by the validation
+    unvalidated_fields: List[str] = []
+
     @transaction.atomic
     def import_recipe(self, uid: str, result: ParserResult) -> None:
-        result.recipe.uid = uid
-        (source, source_id) = uid.split(":")
-        result.recipe.source = source
-        result.recipe.source_id = source_id
+        self.set_uid(result.recipe, uid)
 
         self.set_amount_percent(result.fermentables)
         self.set_amount_percent(result.hops)
@@ -43,6 +54,12 @@ class RecipeLoader:
             self.validate_and_fix_yeast(yeast)
             yeast.save()
 
+    def set_uid(self, recipe: Recipe, uid: str) -> None:
+        recipe.uid = uid
+        (source, source_id) = uid.split(":")
+        recipe.source = source
+        recipe.source_id = source_id
+
     def set_amount_percent(self, items: list) -> None:
         total_amount = 0
         for item in items:
@@ -84,7 +101,7 @@ class RecipeLoader:
         last_err = None
         for i in range(0, len(item.__dict__.keys())):
             try:
-                item.clean_fields()
+                item.clean_fields(exclude=self.unvalidated_fields)
                 return
             except ValidationError as err:
                 last_err = err
@@ -94,6 +111,104 @@ class RecipeLoader:
             raise last_err
 
 
+# Imports many recipes with one INSERT per table. save() isn't called, so the derived values are calculated the same way
+# here, and the search index is queued once per recipe instead of by the post_save signal of every row.
+class RecipeBatchLoader(RecipeLoader):
+    # The recipes are inserted together with their ingredients, so the foreign key can't be checked in the database
+    unvalidated_fields = ["recipe"]
+
+    # Returns the uids and errors of the recipes, which couldn't be validated. They're left out, the others are
+    # inserted.
+    def import_recipes(self, results: List[Tuple[str, ParserResult]]) -> List[Tuple[str, str]]:
+        valid_results = []
+        errors = []
+        for (uid, result) in results:
+            try:
+                self.prepare_recipe(uid, result)
+                valid_results.append(result)
+            except (ValidationError, ValueError) as e:
+                errors.append((uid, "{}: {}".format(type(e).__name__, e)))
+
+        if len(valid_results) > 0:
+            try:
+                self.insert_recipes(valid_results)
+            except DatabaseError:
+                # Allow to import the recipes again, e.g. one by one to find the failing one
+                self.reset_ids(valid_results)
+                raise
+
+        return errors
+
+    def prepare_recipe(self, uid: str, result: ParserResult) -> None:
+        self.set_uid(result.recipe, uid)
+
+        self.set_amount_percent(result.fermentables)
+        self.set_amount_percent(result.hops)
+
+        self.validate_and_fix_recipe(result.recipe)
+        result.recipe.derive_values()
+
+        for fermentable in result.fermentables:
+            fermentable.recipe = result.recipe
+            self.validate_and_fix_fermentable(fermentable)
+            fermentable.derive_values()
+
+        for hop in result.hops:
+            hop.recipe = result.recipe
+            self.validate_and_fix_hop(hop)
+
+        for yeast in result.yeasts:
+            yeast.recipe = result.recipe
+            self.validate_and_fix_yeast(yeast)
+
+    @transaction.atomic
+    def insert_recipes(self, results: List[ParserResult]) -> None:
+        recipes = [result.recipe for result in results]
+        fermentables = [fermentable for result in results for fermentable in result.fermentables]
+        hops = [hop for result in results for hop in result.hops]
+        yeasts = [yeast for result in results for yeast in result.yeasts]
+
+        Recipe.objects.bulk_create(recipes)
+        RecipeFermentable.objects.bulk_create(fermentables)
+        RecipeHop.objects.bulk_create(hops)
+        RecipeYeast.objects.bulk_create(yeasts)
+
+        self.insert_extras(RecipeFermentable, RecipeFermentableExtra, fermentables)
+        self.insert_extras(RecipeHop, RecipeHopExtra, hops)
+        self.insert_extras(RecipeYeast, RecipeYeastExtra, yeasts)
+
+        queue_refresh_recipes_index(SearchIndexUpdateQueue.OPERATION_UPDATE, recipes)
+
+    def insert_extras(self, model, extra_model, items: list) -> None:
+        extras = [extra for item in items for extra in item.create_extras()]
+        if len(extras) == 0:
+            return
+
+        self.load_ids(model, items)
+        extra_model.objects.bulk_create(extras)
+
+    # MySQL doesn't return the ids of rows inserted in bulk. The recipes are new, so their ingredients are read back in
+    # the order they were inserted.
+    def load_ids(self, model, items: list) -> None:
+        if all(item.pk is not None for item in items):
+            return
+
+        ids_per_recipe = defaultdict(list)
+        rows = model.objects.filter(recipe_id__in={item.recipe_id for item in items}).order_by("id")
+        for (recipe_id, item_id) in rows.values_list("recipe_id", "id"):
+            ids_per_recipe[recipe_id].append(item_id)
+
+        for item in items:
+            item.pk = ids_per_recipe[item.recipe_id].pop(0)
+
+    def reset_ids(self, results: List[ParserResult]) -> None:
+        for result in results:
+            result.recipe._state.adding = True
+            for item in result.fermentables + result.hops + result.yeasts:
+                item.pk = None
+                item._state.adding = True
+
+
 class RecipeFileProcessor:
     def __init__(
         self,
@@ -8,6 +8,7 @@ from typing import Optional, Iterable
 from django.db import transaction
 
 from recipe_db.models import RecipeHop, Hop, Fermentable, RecipeFermentable, Style, Recipe, RecipeYeast, Yeast
+from recipe_db.search.recipe_index import suspend_recipe_index_updates
 from recipe_db.utils import get_translit_names, normalize_name, TRANSLIT_SHORT
 
 
@@ -569,14 +570,17 @@ class TransactionalProcessor:
     def __init__(self, mappers: list) -> None:
         self.mappers = mappers
 
+    # Optimization: Don't queue the saved recipes for the search index => The search documents are built from the
+    # associated_* tables, which only change with update_associated, so the mapping doesn't change them
     @transaction.atomic
     def map_list(self, item_list: iter) -> None:
-        for item in item_list:
-            for mapper in self.mappers:
-                match = mapper.map_item(item)
-                if match is not None:
-                    self.save_match(item, match)
-                    break
+        with suspend_recipe_index_updates():
+            for item in item_list:
+                for mapper in self.mappers:
+                    match = mapper.map_item(item)
+                    if match is not None:
+                        self.save_match(item, match)
+                        break
 
     @abc.abstractmethod
     def save_match(self, item: object, match: object) -> str:
@@ -1,6 +1,18 @@
+import os
+import shutil
+import tempfile
+from os import path
+
 from django.test import TestCase
 
-from recipe_db.etl.mapping import get_product_id_variants
+from recipe_db.etl.bulk import BulkRecipeImporter, ImportTask, find_import_tasks, read_manifest
+from recipe_db.etl.format.beerxml import BeerXMLParser
+from recipe_db.etl.format.parser import ParserResult
+from recipe_db.etl.loader import RecipeBatchLoader, RecipeLoader
+from recipe_db.etl.mapping import get_product_id_variants, HopsProcessor
+from recipe_db.models import (
+    Recipe, RecipeHop, RecipeFermentable, RecipeYeast, RecipeHopExtra, SearchIndexUpdateQueue, Hop
+)
 
 
 class ProductIdTest(TestCase):
@@ -21,3 +33,164 @@ class ProductIdTest(TestCase):
         self.assertTrue("A 1 B" in variants)
         self.assertTrue("A1 B" in variants)
         self.assertTrue("A 1B" in variants)
+
+
+class BulkRecipeImporterTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        fixture = path.join(path.dirname(__file__), "format/fixtures/beerxml.xml")
+        shutil.copy(fixture, path.join(self.directory, "first.xml"))
+        os.mkdir(path.join(self.directory, "sub"))
+        shutil.copy(fixture, path.join(self.directory, "sub/second.xml"))
+        with open(path.join(self.directory, "broken.xml"), "wt") as f:
+            f.write("<RECIPES><RECIPE>")
+
+    def test_find_import_tasks(self):
+        tasks = list(find_import_tasks(self.directory, "test", "beerxml"))
+
+        self.assertEqual(["test:broken", "test:first", "test:second"], [task.uid for task in tasks])
+
+    def test_read_manifest(self):
+        manifest = path.join(self.directory, "manifest.txt")
+        with open(manifest, "wt") as f:
+            f.write("# uid file\ntest:1 first.xml\n\ntest:2 sub/second.xml\n")
+
+        tasks = list(read_manifest(manifest))
+
+        self.assertEqual(ImportTask("test:1", path.join(self.directory, "first.xml")), tasks[0])
+        self.assertEqual(ImportTask("test:2", path.join(self.directory, "sub/second.xml")), tasks[1])
+
+    def test_import_in_batches(self):
+        errors = []
+        importer = BulkRecipeImporter(
+            "beerxml", RecipeBatchLoader(), workers=0, batch_size=1, on_error=lambda uid, message: errors.append(uid)
+        )
+        stats = importer.run(find_import_tasks(self.directory, "test", "beerxml"))
+
+        self.assertEqual(3, stats.files)
+        self.assertEqual(2, stats.imported)
+        self.assertEqual(1, stats.parse_errors)
+        self.assertEqual(["test:broken"], errors)
+        self.assertEqual(["test:first", "test:second"], list(Recipe.objects.order_by("uid").values_list("uid", flat=True)))
+        self.assertTrue(RecipeHop.objects.filter(recipe_id="test:first").exists())
+
+        # Existing recipes are skipped
+        stats = importer.run(find_import_tasks(self.directory, "test", "beerxml"))
+        self.assertEqual(0, stats.imported)
+        self.assertEqual(2, stats.skipped)
+
+    def test_import_duplicate_uid(self):
+        tasks = [ImportTask("test:1", path.join(self.directory, "first.xml"))] * 2 + [
+            ImportTask("test:2", path.join(self.directory, "sub/second.xml"))
+        ]
+        importer = BulkRecipeImporter("beerxml", RecipeBatchLoader(), workers=0, batch_size=10)
+        stats = importer.run(tasks)
+
+        self.assertEqual(2, stats.imported)
+        self.assertEqual(1, stats.load_errors)
+        self.assertEqual(["test:1", "test:2"], list(Recipe.objects.order_by("uid").values_list("uid", flat=True)))
+
+    def test_import_with_worker_processes(self):
+        importer = BulkRecipeImporter("beerxml", RecipeBatchLoader(), workers=2, batch_size=10)
+        stats = importer.run(find_import_tasks(self.directory, "test", "beerxml"))
+
+        self.assertEqual(2, stats.imported)
+        self.assertEqual(1, stats.parse_errors)
+        self.assertEqual(2, Recipe.objects.count())
+
+    def test_import_without_index_queue(self):
+        importer = BulkRecipeImporter(
+            "beerxml", RecipeBatchLoader(), workers=0, batch_size=1, queue_index_updates=False
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            stats = importer.run(find_import_tasks(self.directory, "test", "beerxml"))
+
+        self.assertEqual(2, stats.imported)
+        self.assertFalse(SearchIndexUpdateQueue.objects.exists())
+
+
+class RecipeBatchLoaderTest(TestCase):
+    def parse_fixture(self) -> ParserResult:
+        result = ParserResult()
+        BeerXMLParser().parse(result, path.join(path.dirname(__file__), "format/fixtures/beerxml.xml"))
+        return result
+
+    def test_same_values_as_single_import(self):
+        RecipeLoader().import_recipe("test:single", self.parse_fixture())
+        errors = RecipeBatchLoader().import_recipes([("test:batch", self.parse_fixture())])
+
+        self.assertEqual([], errors)
+        single = Recipe.objects.values().get(uid="test:single")
+        batch = Recipe.objects.values().get(uid="test:batch")
+        for field in ["og", "fg", "original_plato", "final_plato", "abv", "ebc", "srm", "created_month"]:
+            self.assertEqual(single[field], batch[field], field)
+
+        def ingredient_values(model, uid: str) -> list:
+            return list(model.objects.filter(recipe_id=uid).order_by("id").values_list(
+                "kind_raw", "amount", "amount_percent"
+            ))
+
+        for model in [RecipeFermentable, RecipeHop, RecipeYeast]:
+            self.assertEqual(ingredient_values(model, "test:single"), ingredient_values(model, "test:batch"))
+        self.assertEqual(
+            list(RecipeFermentable.objects.filter(recipe_id="test:single").values_list("color_ebc", flat=True)),
+            list(RecipeFermentable.objects.filter(recipe_id="test:batch").values_list("color_ebc", flat=True)),
+        )
+
+    def test_queue_search_index_once_per_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeBatchLoader().import_recipes([("test:1", self.parse_fixture()), ("test:2", self.parse_fixture())])
+
+        entity_ids = SearchIndexUpdateQueue.objects.order_by("entity_id").values_list("entity_id", flat=True)
+        self.assertEqual(["test:1", "test:2"], list(entity_ids))
+
+    def test_insert_extras(self):
+        result = self.parse_fixture()
+        result.hops[0]._extras.append(("origin", "US"))
+        RecipeBatchLoader().import_recipes([("test:1", result)])
+
+        extra = RecipeHopExtra.objects.get()
+        self.assertEqual(result.hops[0].pk, extra.hop_id)
+        self.assertEqual(("origin", "US"), (extra.key, extra.value))
+
+    def test_load_ids_in_insert_order(self):
+        loader = RecipeBatchLoader()
+        results = [self.parse_fixture(), self.parse_fixture()]
+        loader.import_recipes([("test:1", results[0]), ("test:2", results[1])])
+        hops = results[0].hops + results[1].hops
+        ids = [hop.pk for hop in hops]
+
+        for hop in hops:
+            hop.pk = None
+        loader.load_ids(RecipeHop, hops)
+
+        self.assertEqual(ids, [hop.pk for hop in hops])
+
+    def test_invalid_uid(self):
+        errors = RecipeBatchLoader().import_recipes([("invalid", self.parse_fixture()), ("test:1", self.parse_fixture())])
+
+        self.assertEqual(["invalid"], [uid for (uid, message) in errors])
+        self.assertEqual(["test:1"], list(Recipe.objects.values_list("uid", flat=True)))
+
+
+class StaticMapper:
+    def __init__(self, match: object) -> None:
+        self.match = match
+
+    def map_item(self, item: object) -> object:
+        return self.match
+
+
+class TransactionalProcessorTest(TestCase):
+    def test_mapping_not_queued_for_search_index(self):
+        hop = Hop.objects.create(id="citra", name="Citra")
+        recipe = Recipe.objects.create(uid="test:1", source="test", source_id="1")
+        RecipeHop.objects.create(recipe=recipe, kind_raw="Citra")
+        SearchIndexUpdateQueue.objects.all().delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            HopsProcessor([StaticMapper(hop)]).map_unmapped()
+
+        self.assertEqual("citra", RecipeHop.objects.get().kind_id)
+        self.assertFalse(SearchIndexUpdateQueue.objects.exists())
@@ -0,0 +1,111 @@
+import json
+
+import pandas as pd
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe_db.analytics.instrumentation import QUERY_LOG_EVENT, MEMOIZE_LOG_EVENT
+
+SORT_COLUMNS = {
+    "total": "db_ms_total",
+    "mean": "db_ms_mean",
+    "max": "db_ms_max",
+    "count": "count",
+}
+
+
+class Command(BaseCommand):
+    help = "Summarize the slowest analyzer queries from the log file (needs ANALYTICS_QUERY_LOG enabled)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--file", "-f", type=str, help="Log file, defaults to the configured LOG_FILE")
+        parser.add_argument("--limit", "-l", type=int, default=20, help="Number of fingerprints to show")
+        parser.add_argument("--sort", "-s", choices=SORT_COLUMNS.keys(), default="total", help="Sort by DB time")
+        parser.add_argument("--explain", action="store_true", help="Show the last captured EXPLAIN of a query")
+
+    def handle(self, *args, **options) -> None:
+        log_file = options["file"] or settings.LOGGING["handlers"]["file"]["filename"]
+        events = read_log_events(log_file, QUERY_LOG_EVENT)
+        if len(events) == 0:
+            raise CommandError("No analyzer queries found in %s" % log_file)
+
+        memoize_events = read_log_events(log_file, MEMOIZE_LOG_EVENT)
+        if len(memoize_events) > 0:
+            self.stdout.write(
+                "Memoization: %d requests  %d hits  %d misses  saved %.1f ms"
+                % (
+                    len(memoize_events),
+                    memoize_events["hits"].sum(),
+                    memoize_events["misses"].sum(),
+                    memoize_events["saved_ms"].sum(),
+                )
+            )
+            self.stdout.write("")
+
+        summary = summarize_queries(events).sort_values(SORT_COLUMNS[options["sort"]], ascending=False)
+        for fingerprint, row in summary.head(options["limit"]).iterrows():
+            self.stdout.write(
+                "%s  %5d x  total %9.1f ms  mean %8.1f ms  p95 %8.1f ms  max %8.1f ms  pandas %8.1f ms  %8.0f rows"
+                % (
+                    fingerprint,
+                    row["count"],
+                    row["db_ms_total"],
+                    row["db_ms_mean"],
+                    row["db_ms_p95"],
+                    row["db_ms_max"],
+                    row["pandas_ms_total"],
+                    row["rows_mean"],
+                )
+            )
+            self.stdout.write("    analyses: %s" % (row["analyses"] or "-"))
+            self.stdout.write("    charts:   %s" % (row["chart_types"] or "-"))
+            self.stdout.write("    params:   %s" % row["params_count"])
+            self.stdout.write("    " + row["query"])
+            if options["explain"] and isinstance(row["explain"], list):
+                for explain_row in row["explain"]:
+                    self.stdout.write("    > " + json.dumps(explain_row, default=str))
+            self.stdout.write("")
+
+
+def read_log_events(log_file: str, event_name: str) -> pd.DataFrame:
+    events = []
+    with open(log_file, encoding="utf-8") as file:
+        for line in file:
+            # Skip other events without parsing them
+            if event_name not in line:
+                continue
+            try:
+                event = json.loads(line)
+            except ValueError:
+                continue
+            if event.get("event") == event_name:
+                events.append(event)
+    return pd.DataFrame(events)
+
+
+def summarize_queries(events: pd.DataFrame) -> pd.DataFrame:
+    for column in ["pandas_ms", "analysis", "chart_type", "explain"]:
+        if column not in events:
+            events[column] = None
+
+    def join_unique(values: pd.Series) -> str:
+        return ", ".join(sorted(values.dropna().astype(str).unique()))
+
+    def last_explain(values: pd.Series):
+        values = values.dropna()
+        return values.iloc[-1] if len(values) > 0 else None
+
+    return events.groupby("fingerprint").agg(
+        count=("db_ms", "size"),
+        db_ms_total=("db_ms", "sum"),
+        db_ms_mean=("db_ms", "mean"),
+        db_ms_p95=("db_ms", lambda values: values.quantile(0.95)),
+        db_ms_max=("db_ms", "max"),
+        pandas_ms_total=("pandas_ms", lambda values: pd.to_numeric(values).sum()),
+        rows_mean=("rows", "mean"),
+        params_count=("params_count", join_unique),
+        analyses=("analysis", join_unique),
+        chart_types=("chart_type", join_unique),
+        query=("query", "first"),
+        explain=("explain", last_explain),
+    )
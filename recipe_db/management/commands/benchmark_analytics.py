@@ -0,0 +1,174 @@
+import json
+import time
+from typing import Optional, Callable, Dict
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from pandas import DataFrame
+
+from recipe_db.analytics import slope, grouped_slope, lowerfence, q1, q3, upperfence
+from recipe_db.analytics.spotlight.fermentable import FermentableAnalysis
+from recipe_db.analytics.spotlight.hop import HopAnalysis
+from recipe_db.analytics.spotlight.style import StyleAnalysis
+from recipe_db.analytics.utils import RollingAverage, aggregate_box_plot
+from recipe_db.models import Hop, Fermentable, Style
+
+SERIES_SIZES = [50, 500, 5000]
+NUM_MONTHS = 150
+RECIPE_HOP_SIZES = [100000, 1000000]  # The latter is about the size of the full recipehop table
+NUM_STYLES = 150
+
+
+class Command(BaseCommand):
+    help = "Benchmark the analytics calculations on generated data"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--benchmarks", "-b", nargs="+", type=str, help="Benchmarks to run")
+        parser.add_argument("--repeat", "-r", type=int, default=3, help="Number of runs, the best one is reported")
+        parser.add_argument("--save", type=str, help="Save the query timings to a file, e.g. before a migration")
+        parser.add_argument("--compare", type=str, help="Compare the query timings with a saved file")
+
+    def handle(self, *args, **options) -> None:
+        benchmarks = options["benchmarks"] or ["rolling", "slope", "boxplot"]
+        self.repeat = options["repeat"]
+        self.save_file = options["save"]
+        self.compare_file = options["compare"]
+        if "rolling" in benchmarks:
+            self.benchmark_rolling()
+        if "slope" in benchmarks:
+            self.benchmark_slope()
+        if "boxplot" in benchmarks:
+            self.benchmark_boxplot()
+        if "queries" in benchmarks:
+            self.benchmark_queries()
+
+    def benchmark_rolling(self):
+        self.stdout.write("Benchmark rolling average of multiple series")
+        smoothing = RollingAverage()
+        for num_series in SERIES_SIZES:
+            df = generate_series_data(num_series)
+            per_series = self.measure(lambda: rolling_per_series(smoothing, df, "kind_id", "month"), repeat=1)
+            vectorized = self.measure(lambda: smoothing.rolling_multiple_series(df, "kind_id", "month"))
+            self.report(num_series, per_series, vectorized)
+
+    def benchmark_slope(self):
+        self.stdout.write("Benchmark slope of multiple series")
+        for num_series in SERIES_SIZES:
+            df = generate_series_data(num_series)
+            per_series = self.measure(lambda: df.groupby("kind_id")["recipes_percent"].agg(slope), repeat=1)
+            vectorized = self.measure(lambda: grouped_slope(df, "kind_id", "recipes_percent"))
+            self.report(num_series, per_series, vectorized)
+
+    def benchmark_boxplot(self):
+        self.stdout.write("Benchmark box plot aggregation per style")
+        agg = [lowerfence, q1, "median", "mean", q3, upperfence]
+        for num_rows in RECIPE_HOP_SIZES:
+            df = generate_recipe_hop_data(num_rows)
+            per_quantile = self.measure(
+                lambda: df.groupby("style_id").agg({"amount_percent": agg, "recipe_id": "nunique"}), repeat=1
+            )
+            aggregated = self.measure(
+                lambda: aggregate_box_plot(df, "amount_percent", by="style_id", extra_aggregations={"recipe_id": "nunique"})
+            )
+            self.report("{} rows".format(num_rows), per_quantile, aggregated)
+
+    # Runs on the database, compare the timings before and after a schema change with --save and --compare
+    def benchmark_queries(self):
+        self.stdout.write("Benchmark popularity, amount and pairing queries of the most used entities")
+        baseline = {}
+        if self.compare_file:
+            with open(self.compare_file) as f:
+                baseline = json.load(f)
+
+        timings = {}
+        for label, callback in get_benchmark_queries().items():
+            timings[label] = self.measure(callback)
+            if label in baseline:
+                self.report(label, baseline[label], timings[label])
+            else:
+                self.stdout.write("{:>30}: {:9.1f} ms".format(label, timings[label] * 1000))
+
+        if self.save_file:
+            with open(self.save_file, "w") as f:
+                json.dump(timings, f, indent=2)
+
+    def measure(self, callback, repeat: Optional[int] = None) -> float:
+        timings = []
+        for _ in range(repeat or self.repeat):
+            start = time.perf_counter()
+            callback()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def report(self, label, baseline: float, optimized: float):
+        if isinstance(label, int):
+            label = "{} series".format(label)
+        self.stdout.write("{:>30}: {:9.1f} ms => {:9.1f} ms ({:.1f}x)".format(
+            label, baseline * 1000, optimized * 1000, baseline / optimized
+        ))
+
+
+def get_benchmark_queries() -> Dict[str, Callable]:
+    hop = Hop.objects.order_by("-recipes_count").first()
+    fermentable = Fermentable.objects.order_by("-recipes_count").first()
+    style = Style.objects.order_by("-recipes_count").first()
+
+    hop_analysis = HopAnalysis(hop)
+    fermentable_analysis = FermentableAnalysis(fermentable)
+    style_analysis = StyleAnalysis(style)
+    return {
+        "hop popularity": hop_analysis.popularity,
+        "hop amount per style": hop_analysis.amount_per_style,
+        "hop amount per use": hop_analysis.amount_per_use,
+        "hop pairings": hop_analysis.pairings,
+        "fermentable popularity": fermentable_analysis.popularity,
+        "fermentable amount per style": fermentable_analysis.amount_per_style,
+        "style popularity": style_analysis.popularity,
+        "style hops amount": style_analysis.popular_hops_amount,
+        "style hop pairings": style_analysis.hop_pairings,
+    }
+
+
+def generate_series_data(num_series: int, seed: int = 1) -> DataFrame:
+    rng = np.random.default_rng(seed)
+    months = pd.date_range(start="2012-01-01", periods=NUM_MONTHS, freq="MS")
+    total_recipes = rng.integers(100, 1000, size=NUM_MONTHS)
+
+    # Every series starts at a random month and has some months without recipes
+    series = np.repeat(np.arange(num_series), NUM_MONTHS)
+    month_positions = np.tile(np.arange(NUM_MONTHS), num_series)
+    starts = rng.integers(0, NUM_MONTHS - 1, size=num_series)
+    keep = (month_positions >= starts[series]) & (rng.random(len(series)) >= 0.2)
+    series, month_positions = series[keep], month_positions[keep]
+
+    df = DataFrame({
+        "month": months[month_positions].date,
+        "kind_id": np.char.add("series-", series.astype(str)).astype(object),
+        "recipes": rng.integers(1, 100, size=len(series)),
+        "total_recipes": total_recipes[month_positions],
+    })
+    df["recipes_percent"] = df["recipes"] / df["total_recipes"]
+    return df
+
+
+def generate_recipe_hop_data(num_rows: int, seed: int = 1) -> DataFrame:
+    rng = np.random.default_rng(seed)
+    recipe_ids = rng.integers(0, num_rows // 4, size=num_rows)
+    return DataFrame({
+        "recipe_id": recipe_ids,
+        "style_id": np.char.add("style-", (recipe_ids % NUM_STYLES).astype(str)).astype(object),
+        "amount_percent": rng.random(num_rows),
+    })
+
+
+# Smoothens every series on its own, for comparison
+def rolling_per_series(smoothing: RollingAverage, df: DataFrame, series_column: str, time_column: str) -> DataFrame:
+    series_dfs = []
+    for series_value in df[series_column].unique():
+        series_df = df[df[series_column].eq(series_value)].drop([series_column], axis=1)
+        rolling_series_df = smoothing.rolling(series_df, time_column)
+        if len(rolling_series_df) > 0:
+            rolling_series_df[series_column] = series_value
+            series_dfs.append(rolling_series_df)
+    return pd.concat(series_dfs)
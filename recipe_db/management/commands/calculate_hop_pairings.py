@@ -1,6 +1,10 @@
+import time
+
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
-from recipe_db.analytics.metrics.hop import HopMetricCalculator
+from recipe_db.analytics.cooccurrence import CooccurrenceMatrix
+from recipe_db.analytics.instrumentation import read_sql
 from recipe_db.models import Hop, HopPairing
 
 HOP_MIN_RECIPES = 20
@@ -9,18 +13,36 @@ class Command(BaseCommand):
     help = "Calculate hop pairings"
 
     def handle(self, *args, **options) -> None:
-        calculator = HopMetricCalculator()
+        start = time.perf_counter()
+        query = """
+            SELECT DISTINCT rh.recipe_id, rh.kind_id
+            FROM recipe_db_recipehop AS rh
+            WHERE rh.kind_id IS NOT NULL
+        """
+        df = read_sql(query)
+        load_time = time.perf_counter()
+        self.stdout.write("Loaded {} recipe hops in {:.1f}s".format(len(df), load_time - start))
 
-        for hop in Hop.objects.all():
-            hop.pairings.delete()  # Remove existing pairings
-            if hop.recipes_count is None or hop.recipes_count < HOP_MIN_RECIPES:
-                continue
+        # Number of recipes per hop pair, calculated for all hops at once
+        matrix = CooccurrenceMatrix(df["recipe_id"], df["kind_id"])
+        counts = matrix.counts()
+        hop_ids = set(Hop.objects.filter(recipes_count__gte=HOP_MIN_RECIPES).values_list("id", flat=True))
 
-            self.stdout.write("Calculate pairings for hop {}".format(hop.name))
-            pairings = calculator.clac_pairings(hop)
+        pairings = []
+        for i, hop_id in enumerate(matrix.entity_ids):
+            if hop_id not in hop_ids:
+                continue
+            row = counts.getrow(i)
+            for paired_i, count in zip(row.indices, row.data):
+                pairings.append(HopPairing(hop_id=hop_id, paired_hop_id=matrix.entity_ids[paired_i], rank=int(count)))
+        count_time = time.perf_counter()
+        self.stdout.write("Calculated {} pairings for {} hops in {:.1f}s".format(
+            len(pairings), len(hop_ids), count_time - load_time
+        ))
 
-            for kind_id, count in pairings.items():
-                self.stdout.write("- Pairing: {} -> {} recipes".format(kind_id, count))
-                paired_hop = Hop.objects.get(pk=kind_id)
-                pairing = HopPairing(hop=hop, paired_hop=paired_hop, rank=count)
-                pairing.save()
+        with transaction.atomic():
+            HopPairing.objects.all().delete()  # Remove existing pairings
+            HopPairing.objects.bulk_create(pairings, batch_size=1000)
+        write_time = time.perf_counter()
+        self.stdout.write("Saved pairings in {:.1f}s".format(write_time - count_time))
+        self.stdout.write("Total: {:.1f}s".format(write_time - start))
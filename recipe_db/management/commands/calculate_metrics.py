@@ -1,12 +1,13 @@
 import math
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from recipe_db.analytics.metrics.fermentable import FermentableMetricCalculator
 from recipe_db.analytics.metrics.hop import HopMetricCalculator
 from recipe_db.analytics.metrics.style import StyleMetricCalculator
 from recipe_db.analytics.metrics.yeast import YeastMetricCalculator
-from recipe_db.models import Style, Hop, Fermentable, Yeast
+from recipe_db.models import Style, Hop, Fermentable, Yeast, MetricSketch
 
 
 class Command(BaseCommand):
@@ -29,10 +30,13 @@ class Command(BaseCommand):
     def calculate_for_style(self):
         self.stdout.write("Calculate style stats")
         calculator = StyleMetricCalculator()
+        sketches = []
         for style in Style.objects.all():
             self.stdout.write("Style {}".format(style.name))
             self.calculate_all_style_metrics(calculator, style)
             style.save()
+            sketches.extend(self.calculate_sketches(calculator, MetricSketch.STYLE, style))
+        self.save_sketches(MetricSketch.STYLE, sketches)
 
         style_percentiles = calculator.calc_percentiles()
         for style in Style.objects.all():
@@ -44,10 +48,13 @@ class Command(BaseCommand):
     def calculate_for_hop(self):
         self.stdout.write("Calculate hop stats")
         calculator = HopMetricCalculator()
+        sketches = []
         for hop in Hop.objects.all():
             self.stdout.write("Hop {}".format(hop.name))
             self.calculate_all_hop_metrics(calculator, hop)
             hop.save()
+            sketches.extend(self.calculate_sketches(calculator, MetricSketch.HOP, hop))
+        self.save_sketches(MetricSketch.HOP, sketches)
 
         hop_percentiles = calculator.calc_percentiles()
         for hop in Hop.objects.all():
@@ -59,10 +66,13 @@ class Command(BaseCommand):
     def calculate_for_fermentable(self):
         self.stdout.write("Calculate fermentable stats")
         calculator = FermentableMetricCalculator()
+        sketches = []
         for fermentable in Fermentable.objects.all():
             self.stdout.write("Fermentable {}".format(fermentable.name))
             self.calculate_all_fermentable_metrics(calculator, fermentable)
             fermentable.save()
+            sketches.extend(self.calculate_sketches(calculator, MetricSketch.FERMENTABLE, fermentable))
+        self.save_sketches(MetricSketch.FERMENTABLE, sketches)
 
         fermentable_percentiles = calculator.calc_percentiles()
         for fermentable in Fermentable.objects.all():
@@ -86,6 +96,21 @@ class Command(BaseCommand):
             yeast.save()
             self.stdout.write(str(yeast.recipes_percentile))
 
+    def calculate_sketches(self, calculator, entity_type: str, entity) -> list:
+        sketches = []
+        for metric in calculator.available_metrics:
+            sketch = calculator.calc_sketch(entity, metric)
+            sketches.append(
+                MetricSketch(entity_type=entity_type, entity_id=entity.id, metric=metric.value, sketch=sketch.to_bytes())
+            )
+        return sketches
+
+    def save_sketches(self, entity_type: str, sketches: list) -> None:
+        self.stdout.write("Save {} {} sketches".format(len(sketches), entity_type))
+        with transaction.atomic():
+            MetricSketch.objects.filter(entity_type=entity_type).delete()
+            MetricSketch.objects.bulk_create(sketches, batch_size=1000)
+
     def calculate_all_style_metrics(self, calculator: StyleMetricCalculator, style: Style) -> None:
         style.recipes_count = calculator.calc_recipes_count(style)
 
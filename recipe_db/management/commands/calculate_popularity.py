@@ -0,0 +1,81 @@
+from typing import List, Tuple
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipe_db.data_version import bump_popularity_version
+from recipe_db.models import MonthlyPopularity
+
+# Entity type => (table, entity column), the same tables as the popularity queries on the recipes
+POPULARITY_TABLES = {
+    MonthlyPopularity.STYLE: ("recipe_db_recipe_associated_styles", "style_id"),
+    MonthlyPopularity.HOP: ("recipe_db_recipehop", "kind_id"),
+    MonthlyPopularity.FERMENTABLE: ("recipe_db_recipefermentable", "kind_id"),
+    MonthlyPopularity.YEAST: ("recipe_db_recipeyeast", "kind_id"),
+}
+
+
+class Command(BaseCommand):
+    help = "Pre-calculate the number of recipes per month and entity (run after update_associated)"
+
+    def handle(self, *args, **options) -> None:
+        self.calculate_recipes_per_month()
+        self.calculate_popularity_per_month()
+
+        # Invalidate in-memory data (e.g. the analytics snapshot) and use the pre-calculated counts from now on
+        bump_popularity_version()
+
+    def calculate_recipes_per_month(self):
+        self.stdout.write("Calculate recipes per month")
+        rebuild_table("recipe_db_monthlyrecipecount", [("""
+            INSERT INTO {table} (month, recipes)
+            SELECT
+                r.created_month AS month,
+                COUNT(*) AS recipes
+            FROM recipe_db_recipe AS r
+            WHERE r.created_month IS NOT NULL
+            GROUP BY month
+        """, [])])
+
+    def calculate_popularity_per_month(self):
+        self.stdout.write("Calculate popularity per month of {}".format(", ".join(POPULARITY_TABLES.keys())))
+        inserts = []
+        for entity_type, (table, column) in POPULARITY_TABLES.items():
+            inserts.append(("""
+                INSERT INTO {{table}} (month, entity_type, entity_id, recipes)
+                SELECT
+                    r.created_month AS month,
+                    %s AS entity_type,
+                    a.{column} AS entity_id,
+                    COUNT(DISTINCT r.uid) AS recipes
+                FROM recipe_db_recipe AS r
+                JOIN {source} AS a
+                    ON r.uid = a.recipe_id
+                WHERE r.created_month IS NOT NULL
+                    AND a.{column} IS NOT NULL
+                GROUP BY month, a.{column}
+            """.format(source=table, column=column), [entity_type]))
+        rebuild_table("recipe_db_monthlypopularity", inserts)
+
+
+# Fills a copy of the table and swaps it in on MySQL, so readers see the old rows until the new ones are complete.
+# Other databases replace the rows within a transaction.
+def rebuild_table(table: str, inserts: List[Tuple[str, list]]) -> None:
+    with connection.cursor() as cursor:
+        if connection.vendor != "mysql":
+            with transaction.atomic():
+                cursor.execute("DELETE FROM {}".format(table))
+                for query, params in inserts:
+                    cursor.execute(query.format(table=table), params)
+            return
+
+        # Cleanup
+        cursor.execute("DROP TABLE IF EXISTS {}_old".format(table))
+        cursor.execute("DROP TABLE IF EXISTS {}_new".format(table))
+
+        # Recreate
+        cursor.execute("CREATE TABLE {table}_new LIKE {table}".format(table=table))
+        for query, params in inserts:
+            cursor.execute(query.format(table=table + "_new"), params)
+        cursor.execute("RENAME TABLE {table} TO {table}_old, {table}_new TO {table}".format(table=table))
+        cursor.execute("DROP TABLE IF EXISTS {}_old".format(table))
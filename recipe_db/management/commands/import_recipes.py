@@ -0,0 +1,84 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe_db.data_version import bump_data_version
+from recipe_db.etl.bulk import BulkRecipeImporter, ImportStats, FORMAT_PARSERS, find_import_tasks, read_manifest
+from recipe_db.etl.loader import RecipeBatchLoader
+
+
+class Command(BaseCommand):
+    help = "Load all recipes from a directory tree or a manifest file into the database"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", help="Directory with the recipe files or a manifest file with <uid> <file path> lines"
+        )
+        parser.add_argument("--format", "-f", choices=FORMAT_PARSERS.keys(), required=True, help="Recipe file format")
+        parser.add_argument("--source", "-s", type=str, help="Source of the recipes, required for directories")
+        parser.add_argument(
+            "--workers", "-w", type=int, default=os.cpu_count(), help="Parser processes, 0 to parse in process"
+        )
+        parser.add_argument("--batch-size", "-b", type=int, default=500, help="Recipes per transaction")
+        parser.add_argument("--replace", action="store_true", help="Replace existing data")
+        parser.add_argument(
+            "--no-index-queue",
+            action="store_true",
+            help="Don't queue the recipes for the search index, when it's reloaded with load_elasticsearch_data anyway",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if os.path.isdir(path):
+            if not options["source"]:
+                raise CommandError("--source is required to import a directory")
+            tasks = find_import_tasks(path, options["source"], options["format"])
+        elif os.path.isfile(path):
+            tasks = read_manifest(path)
+        else:
+            raise CommandError("Path {} does not exist".format(path))
+
+        importer = BulkRecipeImporter(
+            options["format"],
+            RecipeBatchLoader(),
+            workers=options["workers"],
+            batch_size=options["batch_size"],
+            replace_existing=options["replace"],
+            queue_index_updates=not options["no_index_queue"],
+            on_error=self.report_error,
+            on_batch=self.report_progress,
+        )
+        stats = importer.run(tasks)
+
+        self.report_progress(stats)
+        self.stdout.write(
+            "Parse:  {:10.1f} s in workers, {:.1f} ms per file".format(
+                stats.parse_time, stats.parse_time * 1000 / max(stats.files, 1)
+            )
+        )
+        self.stdout.write("Wait:   {:10.1f} s for parsed files".format(stats.wait_time))
+        self.stdout.write(
+            "Write:  {:10.1f} s in the database, {:.1f} ms per recipe".format(
+                stats.write_time, stats.write_time * 1000 / max(stats.imported, 1)
+            )
+        )
+        self.stdout.write("Total:  {:10.1f} s".format(stats.elapsed))
+
+        # Invalidate in-memory data, e.g. the analytics snapshot
+        if stats.imported > 0:
+            bump_data_version()
+
+    def report_error(self, uid: str, message: str) -> None:
+        self.stderr.write("{}: {}".format(uid, message))
+
+    def report_progress(self, stats: ImportStats) -> None:
+        self.stdout.write(
+            "{} files, {} imported, {} skipped, {} parse errors, {} load errors, {:.1f} files/s".format(
+                stats.files,
+                stats.imported,
+                stats.skipped,
+                stats.parse_errors,
+                stats.load_errors,
+                stats.files_per_second,
+            )
+        )
@@ -1,10 +1,19 @@
+import multiprocessing
+from functools import partial
+
 import tqdm
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from elasticsearch.helpers import streaming_bulk
 
 from recipe_db.models import Recipe
-from recipe_db.search.elasticsearch import get_elasticsearch, RECIPES_INDEX_NAME
-from recipe_db.search.recipe_index import get_recipes_bulk_inserts
+from recipe_db.search.elasticsearch import (
+    get_elasticsearch,
+    RECIPES_INDEX_NAME,
+    bulk_load_settings,
+    index_recipe_range,
+    init_index_worker,
+)
+from recipe_db.search.recipe_index import get_recipes_bulk_inserts, get_recipe_uid_ranges
 
 
 class Command(BaseCommand):
@@ -14,9 +23,16 @@ class Command(BaseCommand):
         parser.add_argument("--limit", help="Number of records to load")
         parser.add_argument("--reset", action="store_true", help="Reset index")
         parser.add_argument("--forcemerge", action="store_true", help="Force merge after update")
+        parser.add_argument(
+            "--workers", "-w", type=int, default=1, help="Processes, which load a range of recipes each"
+        )
+        parser.add_argument("--threads", "-t", type=int, default=4, help="Concurrent bulk requests per process")
 
     def handle(self, *args, **options) -> None:
         es = get_elasticsearch()
+        workers = options["workers"]
+        if workers > 1 and options["limit"] is not None:
+            raise CommandError("--limit can't be combined with multiple workers")
 
         # Reset the index
         reset = options["reset"]
@@ -24,24 +40,50 @@ class Command(BaseCommand):
             self.stdout.write("Delete old index")
             es.options(ignore_status=[400, 404]).indices.delete(index=RECIPES_INDEX_NAME)
 
-        # Execute updates
+        # Execute updates, no refreshes and replicas until all recipes are loaded
+        with bulk_load_settings(es):
+            if workers > 1:
+                self.load_parallel(workers, options["threads"])
+            else:
+                self.load(int(options["limit"]) if options["limit"] is not None else None)
+
+        # Optimize index
+        if options["forcemerge"]:
+            self.stdout.write("Force merge index")
+            es.indices.forcemerge(index=RECIPES_INDEX_NAME)
+
+        self.stdout.write("Refreshing index")
+        es.indices.refresh(index=RECIPES_INDEX_NAME)
+
+    def load(self, limit) -> None:
         self.stdout.write("Bulk load recipes")
-        limit = int(options["limit"]) if options["limit"] is not None else None
         num_records = limit or Recipe.objects.count()
         successes = 0
         progress = tqdm.tqdm(unit="docs", total=num_records)
 
-        for ok, action in streaming_bulk(es, actions=get_recipes_bulk_inserts(limit)):
+        for ok, action in streaming_bulk(get_elasticsearch(), actions=get_recipes_bulk_inserts(limit)):
             progress.update(1)
             successes += ok
 
         progress.close()
         self.stdout.write(f"Indexed {successes}/{num_records} documents")
 
-        # Optimize index
-        if options["forcemerge"]:
-            self.stdout.write("Force merge index")
-            es.indices.forcemerge(index=RECIPES_INDEX_NAME)
+    def load_parallel(self, workers: int, threads: int) -> None:
+        uid_ranges = get_recipe_uid_ranges(workers)
+        self.stdout.write(f"Bulk load recipes in {len(uid_ranges)} ranges")
 
-        self.stdout.write("Refreshing index")
-        es.indices.refresh(index=RECIPES_INDEX_NAME)
+        successes = 0
+        documents = 0
+        seconds = 0.0
+        with multiprocessing.get_context("fork").Pool(len(uid_ranges), initializer=init_index_worker) as pool:
+            for result in pool.imap_unordered(partial(index_recipe_range, thread_count=threads), uid_ranges):
+                start_uid, end_uid = result.uid_range
+                self.stdout.write(
+                    f"Range {start_uid or '-'} to {end_uid or '-'}: indexed {result.successes}/{result.documents} "
+                    f"documents in {result.seconds:.1f} s, {result.documents_per_second:.0f} docs/s"
+                )
+                successes += result.successes
+                documents += result.documents
+                seconds = max(seconds, result.seconds)
+
+        self.stdout.write(f"Indexed {successes}/{documents} documents, {documents / max(seconds, 0.001):.0f} docs/s")
@@ -20,14 +20,17 @@ class Command(BaseCommand):
         self.stdout.write("Bulk load updates")
         num_updates = SearchIndexUpdateQueue.objects.filter(index=RECIPES_INDEX_NAME).count()
 
+        # Multiple updates of the same recipe are combined, so there are usually less documents than updates
         successes = 0
-        progress = tqdm.tqdm(unit="docs", total=num_updates)
+        documents = 0
+        progress = tqdm.tqdm(unit="docs")
         for ok, action in streaming_bulk(es, actions=get_recipes_bulk_updates()):
             progress.update(1)
             successes += ok
+            documents += 1
 
         progress.close()
-        self.stdout.write(f"Indexed {successes}/{num_updates} documents")
+        self.stdout.write(f"Indexed {successes}/{documents} documents for {num_updates} updates")
 
         # Optimize index
         if options["forcemerge"]:
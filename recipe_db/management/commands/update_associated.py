@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
 from django.db import connection, transaction
 
+from recipe_db.data_version import bump_data_version
+
 
 class Command(BaseCommand):
     help = "Update the associated_* tables"
@@ -19,6 +21,9 @@ class Command(BaseCommand):
         if "style" in entities:
             self.calculate_for_style()
 
+        # Invalidate in-memory data, e.g. the analytics snapshot
+        bump_data_version()
+
     def calculate_for_hop(self):
         self.stdout.write("Calculate associated hops")
         with connection.cursor() as cursor:
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 10:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_db", "0015_searchindexupdatequeue"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MonthlyRecipeCount",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("month", models.DateField(unique=True)),
+                ("recipes", models.IntegerField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name="MonthlyPopularity",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("month", models.DateField()),
+                ("entity_type", models.CharField(max_length=16)),
+                ("entity_id", models.CharField(max_length=255)),
+                ("recipes", models.IntegerField()),
+            ],
+            options={
+                "indexes": [models.Index(fields=["entity_type", "month"], name="recipe_db_m_entity__6b1448_idx")],
+            },
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_db", "0017_dataversion"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="MetricSketch",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("entity_type", models.CharField(max_length=16)),
+                ("entity_id", models.CharField(max_length=255)),
+                ("metric", models.CharField(max_length=32)),
+                ("sketch", models.BinaryField()),
+            ],
+            options={
+                "unique_together": {("entity_type", "entity_id", "metric")},
+            },
+        ),
+    ]
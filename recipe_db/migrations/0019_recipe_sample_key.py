@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:05
+
+import random
+
+import recipe_db.models
+from django.db import migrations, models
+
+
+# The field default is only evaluated once for existing recipes
+def assign_sample_keys(apps, schema_editor):
+    if schema_editor.connection.vendor == "mysql":
+        schema_editor.execute("UPDATE recipe_db_recipe SET sample_key = RAND()")
+        return
+
+    Recipe = apps.get_model("recipe_db", "Recipe")
+    for uid in Recipe.objects.values_list("uid", flat=True).iterator():
+        Recipe.objects.filter(uid=uid).update(sample_key=random.random())
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_db", "0018_metricsketch"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="sample_key",
+            field=models.FloatField(default=recipe_db.models.get_random_sample_key),
+        ),
+        migrations.RunPython(assign_sample_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["sample_key"], name="recipe_db_r_sample__974111_idx"),
+        ),
+    ]
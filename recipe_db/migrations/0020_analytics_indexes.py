@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:14
+
+from django.db import migrations, models
+
+# Index on (entity, recipe) for the associated entities, the tables only have an index on each column
+ASSOCIATED_INDEXES = [
+    ("associated_styles", "style", "recipe_db_ras_style_recipe_idx"),
+    ("associated_hops", "hop", "recipe_db_rah_hop_recipe_idx"),
+    ("associated_fermentables", "fermentable", "recipe_db_raf_ferm_recipe_idx"),
+    ("associated_yeasts", "yeast", "recipe_db_ray_yeast_recipe_idx"),
+]
+
+
+def get_associated_indexes(apps):
+    Recipe = apps.get_model("recipe_db", "Recipe")
+    for field_name, entity_field, index_name in ASSOCIATED_INDEXES:
+        through = Recipe._meta.get_field(field_name).remote_field.through
+        yield through, models.Index(fields=[entity_field, "recipe"], name=index_name)
+
+
+def add_associated_indexes(apps, schema_editor):
+    for through, index in get_associated_indexes(apps):
+        schema_editor.add_index(through, index)
+
+
+def remove_associated_indexes(apps, schema_editor):
+    for through, index in get_associated_indexes(apps):
+        schema_editor.remove_index(through, index)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_db", "0019_recipe_sample_key"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["created", "uid"], name="recipe_db_r_created_614868_idx"),
+        ),
+        migrations.RemoveIndex(
+            model_name="recipe",
+            name="recipe_db_r_created_b37299_idx",
+        ),
+        migrations.AddIndex(
+            model_name="recipefermentable",
+            index=models.Index(fields=["kind", "recipe", "amount_percent"], name="recipe_db_r_kind_id_1d093b_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipefermentable",
+            index=models.Index(fields=["recipe", "kind", "amount_percent"], name="recipe_db_r_recipe__39fe48_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipehop",
+            index=models.Index(fields=["kind", "recipe", "amount_percent"], name="recipe_db_r_kind_id_e7fb9a_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipehop",
+            index=models.Index(fields=["recipe", "kind", "amount_percent"], name="recipe_db_r_recipe__ce9874_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipehop",
+            index=models.Index(fields=["kind", "use", "recipe"], name="recipe_db_r_kind_id_1576e2_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipeyeast",
+            index=models.Index(fields=["kind", "recipe"], name="recipe_db_r_kind_id_853407_idx"),
+        ),
+        migrations.RunPython(add_associated_indexes, remove_associated_indexes),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 11:16
+
+from django.db import migrations, models
+from django.db.models.functions import TruncMonth
+
+
+def assign_created_months(apps, schema_editor):
+    Recipe = apps.get_model("recipe_db", "Recipe")
+    Recipe.objects.update(created_month=TruncMonth("created"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_db", "0020_analytics_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="created_month",
+            field=models.DateField(blank=True, default=None, editable=False, null=True),
+        ),
+        migrations.RunPython(assign_created_months, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["created_month"], name="recipe_db_r_created_dab227_idx"),
+        ),
+    ]
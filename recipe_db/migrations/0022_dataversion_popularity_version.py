@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-17 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("recipe_db", "0021_recipe_created_month"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dataversion",
+            name="popularity_version",
+            field=models.IntegerField(blank=True, default=None, null=True),
+        ),
+    ]
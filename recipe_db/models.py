@@ -3,6 +3,7 @@ from __future__ import annotations
 import codecs
 import datetime
 import math
+import random
 import re
 from collections import OrderedDict
 from typing import Optional, List, Tuple, Iterable
@@ -41,6 +42,16 @@ def get_tomorrow_date():
     return datetime.date.today() + datetime.timedelta(days=1)
 
 
+def get_month(date: Optional[datetime.date]) -> Optional[datetime.date]:
+    if date is None:
+        return None
+    return datetime.date(date.year, date.month, 1)
+
+
+def get_random_sample_key() -> float:
+    return random.random()
+
+
 def create_human_readable_id(value: str) -> str:
     value = codecs.encode(value, "translit/long")
     return re.sub("[\\s\\/-]+", "-", re.sub("[^\\w\\s\\/-]", "", value)).lower()
@@ -933,6 +944,8 @@ class Recipe(models.Model):
         null=True,
         validators=[MinValueValidator(datetime.date(1990, 1, 1)), MaxValueValidator(get_tomorrow_date)],
     )
+    # First day of the month the recipe was created, so monthly queries can group on the index. Set on save.
+    created_month = models.DateField(default=None, blank=True, null=True, editable=False)
 
     # Characteristics
     style = models.ForeignKey(Style, on_delete=models.SET_NULL, default=None, blank=True, null=True)
@@ -966,6 +979,9 @@ class Recipe(models.Model):
         default=None, blank=True, null=True, validators=[GreaterThanValueValidator(0), MaxValueValidator(5000)]
     )
 
+    # Random position of the recipe, to draw random samples using the index, see RecipesListAnalysis.random
+    sample_key = models.FloatField(default=get_random_sample_key)
+
     # Mashing
     mash_water = models.IntegerField(default=None, blank=True, null=True, validators=[GreaterThanValueValidator(0)])
     sparge_water = models.IntegerField(default=None, blank=True, null=True, validators=[MinValueValidator(0)])
@@ -975,6 +991,11 @@ class Recipe(models.Model):
     cast_out_wort = models.IntegerField(default=None, blank=True, null=True, validators=[GreaterThanValueValidator(0)])
 
     def save(self, *args, **kwargs) -> None:
+        self.derive_values()
+        super().save(*args, **kwargs)
+
+    # Calculate the values, which can be derived from others. Done on save, RecipeBatchLoader calls it for bulk inserts.
+    def derive_values(self) -> None:
         self.derive_missing_values("ebc", "srm", ebc_to_srm)
         self.derive_missing_values("srm", "ebc", srm_to_ebc)
         self.derive_missing_values("original_plato", "og", plato_to_gravity)
@@ -991,7 +1012,7 @@ class Recipe(models.Model):
         if self.abv is None and self.og is not None and self.fg is not None:
             self.abv = alcohol_by_volume(self.og, self.fg)
 
-        super().save(*args, **kwargs)
+        self.created_month = get_month(self.created)
 
     def derive_missing_values(self, from_field_name: str, to_field_name: str, calc_function: callable) -> None:
         if getattr(self, to_field_name) is None:
@@ -1008,7 +1029,9 @@ class Recipe(models.Model):
             models.Index(fields=['abv']),
             models.Index(fields=['og']),
             models.Index(fields=['srm']),
-            models.Index(fields=['created']),
+            models.Index(fields=['created', 'uid']),
+            models.Index(fields=['created_month']),
+            models.Index(fields=['sample_key']),
         ]
 
 
@@ -1056,12 +1079,18 @@ class RecipeFermentable(models.Model):
         pass
 
     def save(self, *args, **kwargs) -> None:
+        self.derive_values()
+        super().save(*args, **kwargs)
+
+        for extra in self.create_extras():
+            extra.save()
+
+    def derive_values(self) -> None:
         self.derive_missing_values("color_lovibond", "color_ebc", lovibond_to_ebc)
         self.derive_missing_values("color_ebc", "color_lovibond", ebc_to_lovibond)
-        super().save(*args, **kwargs)
 
-        for extra in self._extras:
-            RecipeFermentableExtra(fermentable=self, key=extra[0], value=extra[1]).save()
+    def create_extras(self) -> list:
+        return [RecipeFermentableExtra(fermentable=self, key=extra[0], value=extra[1]) for extra in self._extras]
 
     def derive_missing_values(self, from_field_name: str, to_field_name: str, calc_function: callable) -> None:
         if getattr(self, to_field_name) is None:
@@ -1114,6 +1143,12 @@ class RecipeFermentable(models.Model):
         gallons = liters_to_gallons(cast_out_wort)
         return ppg * amount_lbs / gallons
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'recipe', 'amount_percent']),
+            models.Index(fields=['recipe', 'kind', 'amount_percent']),
+        ]
+
 
 # Extra metadata that was parsed, but is not represented in the data model
 class RecipeFermentableExtra(models.Model):
@@ -1182,8 +1217,11 @@ class RecipeHop(models.Model):
 
     def save(self, *args, **kwargs) -> None:
         super().save(*args, **kwargs)
-        for extra in self._extras:
-            RecipeHopExtra(hop=self, key=extra[0], value=extra[1]).save()
+        for extra in self.create_extras():
+            extra.save()
+
+    def create_extras(self) -> list:
+        return [RecipeHopExtra(hop=self, key=extra[0], value=extra[1]) for extra in self._extras]
 
     @classmethod
     def get_uses(cls) -> dict:
@@ -1208,6 +1246,13 @@ class RecipeHop(models.Model):
         """Account for better utilization from pellets vs. whole"""
         return 1.15 if self.form == self.PELLET else 1.0
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'recipe', 'amount_percent']),
+            models.Index(fields=['recipe', 'kind', 'amount_percent']),
+            models.Index(fields=['kind', 'use', 'recipe']),
+        ]
+
 
 # Extra metadata that was parsed, but is not represented in the data model
 class RecipeHopExtra(models.Model):
@@ -1281,8 +1326,11 @@ class RecipeYeast(models.Model):
 
     def save(self, *args, **kwargs) -> None:
         super().save(*args, **kwargs)
-        for extra in self._extras:
-            RecipeYeastExtra(yeast=self, key=extra[0], value=extra[1]).save()
+        for extra in self.create_extras():
+            extra.save()
+
+    def create_extras(self) -> list:
+        return [RecipeYeastExtra(yeast=self, key=extra[0], value=extra[1]) for extra in self._extras]
 
     @property
     def attenuation(self) -> Optional[float]:
@@ -1297,6 +1345,11 @@ class RecipeYeast(models.Model):
 
         return None
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'recipe']),
+        ]
+
 
 # Extra metadata that was parsed, but is not represented in the data model
 class RecipeYeastExtra(models.Model):
@@ -1326,3 +1379,50 @@ class SearchIndexUpdateQueue(models.Model):
         indexes = [
             models.Index(fields=['index', 'updated_at']),
         ]
+
+
+# Pre-calculated number of recipes per month and associated entity, see calculate_popularity command
+class MonthlyPopularity(models.Model):
+    STYLE = "style"
+    HOP = "hop"
+    FERMENTABLE = "fermentable"
+    YEAST = "yeast"
+
+    month = models.DateField()
+    entity_type = models.CharField(max_length=16)
+    entity_id = models.CharField(max_length=255)
+    recipes = models.IntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['entity_type', 'month']),
+        ]
+
+
+# Pre-calculated total number of recipes per month, see calculate_popularity command
+class MonthlyRecipeCount(models.Model):
+    month = models.DateField(unique=True)
+    recipes = models.IntegerField()
+
+
+# Pre-calculated quantile sketch of a metric per entity, see calculate_metrics command and analytics.sketch module
+class MetricSketch(models.Model):
+    STYLE = "style"
+    HOP = "hop"
+    FERMENTABLE = "fermentable"
+
+    entity_type = models.CharField(max_length=16)
+    entity_id = models.CharField(max_length=255)
+    metric = models.CharField(max_length=32)
+    sketch = models.BinaryField()
+
+    class Meta:
+        unique_together = [["entity_type", "entity_id", "metric"]]
+
+
+# Incremented whenever the recipe data was changed in bulk, used to invalidate in-memory data, see data_version module
+class DataVersion(models.Model):
+    version = models.IntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+    # Version at which the calculate_popularity command pre-calculated the monthly counts
+    popularity_version = models.IntegerField(default=None, blank=True, null=True)
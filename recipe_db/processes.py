@@ -0,0 +1,8 @@
+from django.db import connections
+
+
+# Runs in forked worker processes. The inherited database connections belong to the parent process, which may be
+# within a transaction, so they're dropped without closing them. The workers open their own connections when needed.
+def drop_inherited_connections() -> None:
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
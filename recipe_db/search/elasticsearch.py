@@ -1,12 +1,16 @@
-from typing import Iterable, Optional
+import time
+from contextlib import contextmanager
+from typing import Iterable, Optional, NamedTuple, Tuple
 
 from django.conf import settings
 from elastic_transport import ObjectApiResponse
 
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import parallel_bulk
 from recipe_db.analytics.scope import RecipeScope
 from recipe_db.models import Recipe
-from recipe_db.search.recipe_index import RECIPES_INDEX_NAME
+from recipe_db.processes import drop_inherited_connections
+from recipe_db.search.recipe_index import RECIPES_INDEX_NAME, get_recipes_bulk_inserts
 from recipe_db.search.result import RecipeResultBuilder
 
 # We can boost ingredients fields
@@ -22,21 +26,77 @@ def get_elasticsearch():
     if ELASTICSEARCH is None:
         ELASTICSEARCH = Elasticsearch(
             settings.__getattr__("ELASTICSEARCH_URL"),
-            basic_auth=("elastic", settings.__getattr__("ELASTICSEARCH_PASSWORD"))
+            basic_auth=("elastic", settings.__getattr__("ELASTICSEARCH_PASSWORD")),
         )
     return ELASTICSEARCH
 
 
+# Index settings, which slow down loading many documents. They're restored afterwards.
+BULK_LOAD_SETTINGS = {
+    "refresh_interval": "-1",
+    "number_of_replicas": 0,
+}
+
+
+@contextmanager
+def bulk_load_settings(es: Elasticsearch):
+    es.options(ignore_status=[400]).indices.create(index=RECIPES_INDEX_NAME)  # Exists already
+    current = es.indices.get_settings(index=RECIPES_INDEX_NAME)[RECIPES_INDEX_NAME]["settings"]["index"]
+    previous = {name: current.get(name) for name in BULK_LOAD_SETTINGS}  # None resets to the default
+
+    es.indices.put_settings(index=RECIPES_INDEX_NAME, settings={"index": BULK_LOAD_SETTINGS})
+    try:
+        yield
+    finally:
+        es.indices.put_settings(index=RECIPES_INDEX_NAME, settings={"index": previous})
+
+
+class RangeIndexResult(NamedTuple):
+    uid_range: Tuple[Optional[str], Optional[str]]
+    documents: int
+    successes: int
+    seconds: float
+
+    @property
+    def documents_per_second(self) -> float:
+        return self.documents / self.seconds if self.seconds > 0 else 0.0
+
+
+# Runs in a forked worker process, which needs its own Elasticsearch client and database connections
+def init_index_worker() -> None:
+    global ELASTICSEARCH
+    ELASTICSEARCH = None
+    drop_inherited_connections()
+
+
+# Index the recipes of a uid range, see get_recipe_uid_ranges(). The bulk requests are sent from multiple threads.
+def index_recipe_range(
+    uid_range: Tuple[Optional[str], Optional[str]],
+    thread_count: int,
+    chunk_size: int = 500,
+) -> RangeIndexResult:
+    start = time.perf_counter()
+    documents = 0
+    successes = 0
+
+    actions = get_recipes_bulk_inserts(None, *uid_range)
+    for ok, action in parallel_bulk(get_elasticsearch(), actions, thread_count=thread_count, chunk_size=chunk_size):
+        documents += 1
+        successes += ok
+
+    return RangeIndexResult(uid_range, documents, successes, time.perf_counter() - start)
+
+
 class RecipeSearchResult:
     def __init__(self, result: ObjectApiResponse):
-        self.hits = result[('hits')]['total']['value']
-        self.hits_accuracy = result['hits']['total']['relation']
-        self._result = result['hits']['hits']
+        self.hits = result[("hits")]["total"]["value"]
+        self.hits_accuracy = result["hits"]["total"]["relation"]
+        self._result = result["hits"]["hits"]
         super().__init__()
 
     @property
     def recipes(self) -> Iterable[Recipe]:
-        ids = list(map(lambda r: r['_id'], self._result))
+        ids = list(map(lambda r: r["_id"], self._result))
         builder = RecipeResultBuilder()
         recipes = list(Recipe.objects.filter(uid__in=ids))
         recipes = sorted(recipes, key=lambda r: ids.index(r.uid))
@@ -48,36 +108,39 @@ def execute_search(scope: RecipeScope) -> RecipeSearchResult:
     criteria = []
 
     if scope.search_term is not None:
-        criteria.append({
-            'multi_match': {
-                'query': scope.search_term,
-                'fields': SEARCHABLE_TEXT_FIELDS,
+        criteria.append(
+            {
+                "multi_match": {
+                    "query": scope.search_term,
+                    "fields": SEARCHABLE_TEXT_FIELDS,
+                }
             }
-        })
+        )
 
+    # Recipes with any of the hops or styles, like the analyzer scopes
     if scope.hop_criteria is not None and len(scope.hop_criteria.hops) > 0:
-        criteria.append({
-            'term': {
-                'hop_ids.keyword': scope.hop_criteria.hops[0].id,
+        criteria.append(
+            {
+                "terms": {
+                    "hop_ids.keyword": [hop.id for hop in scope.hop_criteria.hops],
+                }
             }
-        })
+        )
 
     if scope.style_criteria is not None and len(scope.style_criteria.styles) > 0:
-        criteria.append({
-            'term': {
-                'style_ids.keyword': scope.style_criteria.styles[0].id,
+        criteria.append(
+            {
+                "terms": {
+                    "style_ids.keyword": [style.id for style in scope.style_criteria.styles],
+                }
             }
-        })
+        )
 
     if len(criteria) == 1:
         query = criteria[0]  # Single criteria query
     else:
         # AND query
-        query = {
-            "bool": {
-                "must": criteria
-            }
-        }
+        query = {"bool": {"must": criteria}}
 
     return search_query(query, RESULT_SIZE)
 
@@ -89,18 +152,18 @@ def search_query(query, limit: int) -> RecipeSearchResult:
         size=limit,
         # The function_score in combination with random_score randomizes results with equal score
         query={
-            'function_score': {
-                'query': query,
-                'functions': [
+            "function_score": {
+                "query": query,
+                "functions": [
                     {
-                        'random_score': {
-                            'seed': 12345678910,
-                            'field': '_seq_no',
+                        "random_score": {
+                            "seed": 12345678910,
+                            "field": "_seq_no",
                         },
-                        'weight': 0.0001,
+                        "weight": 0.0001,
                     }
                 ],
-                'boost_mode': 'sum',
+                "boost_mode": "sum",
             }
         },
     )
@@ -1,31 +1,133 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
 from itertools import chain
-from typing import Optional, Iterable
+from typing import Optional, Iterable, List, Dict, Callable, Tuple
+
+from django.db import connection, transaction
 
 from recipe_db.models import Recipe, SearchIndexUpdateQueue
 
 RECIPES_INDEX_NAME = 'recipes'
 CHUNK_SIZE = 10000
 
+UPDATE = SearchIndexUpdateQueue.OPERATION_UPDATE
+DELETE = SearchIndexUpdateQueue.OPERATION_DELETE
+
+# Receives the queued updates instead of the queue table, see redirect_recipe_index_updates()
+_redirect: ContextVar[Optional[Callable[[str, str], None]]] = ContextVar("recipe_index_redirect", default=None)
+
+
+# Updates of the current transaction, which are written on commit. Django connections are per thread, so are these.
+class PendingIndexUpdates(threading.local):
+    def __init__(self) -> None:
+        self.updates: Dict[str, str] = {}
+        self.flush: Optional[Callable] = None
+
+
+_pending = PendingIndexUpdates()
+
 
 def queue_refresh_recipe_index(operation: str, recipe: Recipe) -> None:
-    index_update = SearchIndexUpdateQueue()
-    index_update.operation = operation
-    index_update.index = RECIPES_INDEX_NAME
-    index_update.entity_id = recipe.uid
-    index_update.save()
+    queue_refresh_recipe_uids(operation, [recipe.uid])
+
+
+def queue_refresh_recipes_index(operation: str, recipes: List[Recipe]) -> None:
+    queue_refresh_recipe_uids(operation, [recipe.uid for recipe in recipes])
+
+
+# Within a transaction, the updates are collected and written with a single INSERT on commit. A recipe is only queued
+# once per transaction, with the last operation. Updates of rolled back savepoints may remain: the index refresh
+# removes recipes, which don't exist, and deletes of recipes, which still exist on commit, are queued as updates.
+def queue_refresh_recipe_uids(operation: str, uids: Iterable[str]) -> None:
+    redirect = _redirect.get()
+    if redirect is not None:
+        for uid in uids:
+            redirect(operation, uid)
+        return
+
+    if not connection.in_atomic_block:
+        write_index_updates({uid: operation for uid in uids})
+        return
+
+    updates = get_pending_updates()
+    for uid in uids:
+        updates[uid] = operation
+
+
+def get_pending_updates() -> Dict[str, str]:
+    # Start over when the previous transaction was committed or rolled back, which dropped the callback
+    if _pending.flush is None or not is_on_commit_pending(_pending.flush):
+        updates = {}
+
+        def flush() -> None:
+            write_index_updates(undo_rolled_back_deletes(updates))
+
+        _pending.updates = updates
+        _pending.flush = flush
+        transaction.on_commit(flush)
+
+    return _pending.updates
 
 
-def get_recipes_bulk_inserts(limit: Optional[int]) -> Iterable[dict]:
+def is_on_commit_pending(callback: Callable) -> bool:
+    return any(entry[1] is callback for entry in connection.run_on_commit)
+
+
+# A delete within a rolled back savepoint would remove an existing recipe from the index
+def undo_rolled_back_deletes(updates: Dict[str, str]) -> Dict[str, str]:
+    deleted_uids = [uid for (uid, operation) in updates.items() if operation == DELETE]
+    for i in range(0, len(deleted_uids), CHUNK_SIZE):
+        existing = Recipe.objects.filter(uid__in=deleted_uids[i:i + CHUNK_SIZE]).values_list("uid", flat=True)
+        for uid in existing:
+            updates[uid] = UPDATE
+    return updates
+
+
+def write_index_updates(updates: Dict[str, str]) -> None:
+    SearchIndexUpdateQueue.objects.bulk_create(
+        [
+            SearchIndexUpdateQueue(operation=operation, index=RECIPES_INDEX_NAME, entity_id=uid)
+            for (uid, operation) in updates.items()
+        ],
+        batch_size=CHUNK_SIZE,
+    )
+
+
+# Bulk jobs, which reindex the recipes afterwards anyway, don't need to queue updates
+@contextmanager
+def suspend_recipe_index_updates():
+    with redirect_recipe_index_updates(lambda operation, uid: None):
+        yield
+
+
+# Passes the queued updates (operation, uid) to the callback instead, e.g. to collect the affected recipes of a job
+@contextmanager
+def redirect_recipe_index_updates(callback: Callable[[str, str], None]):
+    token = _redirect.set(callback)
+    try:
+        yield
+    finally:
+        _redirect.reset(token)
+
+
+# Documents of all recipes or the recipes in a range of uids, see get_recipe_uid_ranges()
+def get_recipes_bulk_inserts(
+    limit: Optional[int],
+    start_uid: Optional[str] = None,
+    end_uid: Optional[str] = None,
+) -> Iterable[dict]:
     processed = 0
 
-    last_uid = "0"
+    last_uid = start_uid or "0"
     while True:
         processed_in_chunk = 0
         recipes = Recipe.objects \
             .prefetch_related("associated_styles", "associated_fermentables", "associated_hops", "associated_yeasts") \
-            .filter(uid__gt=last_uid) \
-            .order_by('uid') \
-            .all()[:CHUNK_SIZE]
+            .filter(uid__gt=last_uid)
+        if end_uid is not None:
+            recipes = recipes.filter(uid__lte=end_uid)
+        recipes = recipes.order_by('uid').all()[:CHUNK_SIZE]
 
         for recipe in recipes:
             yield bulk_add_recipe_document(recipe)
@@ -42,22 +144,71 @@ def get_recipes_bulk_inserts(limit: Optional[int]) -> Iterable[dict]:
             return
 
 
+# Splits the recipes into ranges of uids with about the same number of recipes. A range is (start, end], None stands
+# for the first or last recipe.
+def get_recipe_uid_ranges(num_ranges: int) -> List[Tuple[Optional[str], Optional[str]]]:
+    num_recipes = Recipe.objects.count()
+    boundaries = []
+    for i in range(1, num_ranges):
+        offset = num_recipes * i // num_ranges
+        uids = list(Recipe.objects.order_by('uid').values_list('uid', flat=True)[offset:offset + 1])
+        if len(uids) > 0 and uids[0] not in boundaries:
+            boundaries.append(uids[0])
+
+    return list(zip([None] + boundaries, boundaries + [None]))
+
+
+# Reads the queue in chunks. Within a chunk, each recipe is only indexed once with its last operation, the recipes are
+# loaded together and the processed entries are deleted with a single statement.
 def get_recipes_bulk_updates() -> Iterable[dict]:
-    updates = SearchIndexUpdateQueue.objects.filter(index=RECIPES_INDEX_NAME).order_by('updated_at')
-    for update in updates:
-        # Generate the bulk document for the Elasticsearch update
-        if update.operation == SearchIndexUpdateQueue.OPERATION_DELETE:
-            yield bulk_delete_recipe_document(update.entity_id)
-        elif update.operation == SearchIndexUpdateQueue.OPERATION_UPDATE:
-            recipe = (Recipe.objects
-                      .prefetch_related("associated_styles", "associated_fermentables", "associated_hops", "associated_yeasts")
-                      .get(pk=update.entity_id))
-            yield bulk_add_recipe_document(recipe)
-        else:
-            continue
+    last_id = 0
+    while True:
+        updates = list(
+            SearchIndexUpdateQueue.objects
+            .filter(index=RECIPES_INDEX_NAME, id__gt=last_id)
+            .order_by('id')
+            .values_list('id', 'entity_id', 'operation')[:CHUNK_SIZE]
+        )
+        if len(updates) == 0:
+            return
+        last_id = updates[-1][0]
+
+        operations = {}
+        for (_, entity_id, operation) in updates:
+            operations[entity_id] = operation
+
+        updated_uids = [uid for (uid, operation) in operations.items() if operation == UPDATE]
+        recipes = (Recipe.objects
+                   .prefetch_related("associated_styles", "associated_fermentables", "associated_hops", "associated_yeasts")
+                   .in_bulk(updated_uids))
+
+        # Generate the bulk documents for the Elasticsearch update
+        for (uid, operation) in operations.items():
+            if operation == DELETE:
+                yield bulk_delete_recipe_document(uid)
+            elif operation == UPDATE:
+                if uid in recipes:
+                    yield bulk_add_recipe_document(recipes[uid])
+                else:
+                    yield bulk_delete_recipe_document(uid)  # Recipe doesn't exist (anymore)
+
+        # Updates processed
+        delete_index_updates([update[0] for update in updates])
+
+        # No more updates to process
+        if len(updates) < CHUNK_SIZE:
+            return
+
 
-        # Update processed
-        update.delete()
+# Optimization: Delete with a single statement => QuerySet.delete() would load the rows to send post_delete signals
+def delete_index_updates(ids: List[int]) -> None:
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM {} WHERE id IN ({})".format(
+                SearchIndexUpdateQueue._meta.db_table, ", ".join(["%s"] * len(ids))
+            ),
+            ids,
+        )
 
 
 def bulk_delete_recipe_document(recipe_uid: str) -> dict:
@@ -1,7 +1,9 @@
+from typing import Optional
+
 from django.db.models import Model
 
 from recipe_db.models import Recipe, RecipeYeast, RecipeFermentable, RecipeHop, SearchIndexUpdateQueue
-from recipe_db.search.recipe_index import queue_refresh_recipe_index
+from recipe_db.search.recipe_index import queue_refresh_recipe_index, queue_refresh_recipe_uids
 
 
 UPDATE = SearchIndexUpdateQueue.OPERATION_UPDATE
@@ -13,9 +15,9 @@ def entity_saved(sender: Model, instance: object, **kwargs) -> None:
         queue_refresh_recipe_index(UPDATE, instance)
         return
 
-    affected_recipe = get_affected_recipe(instance)
-    if affected_recipe:
-        queue_refresh_recipe_index(UPDATE, affected_recipe)
+    affected_recipe_uid = get_affected_recipe_uid(instance)
+    if affected_recipe_uid:
+        queue_refresh_recipe_uids(UPDATE, [affected_recipe_uid])
 
 
 def entity_deleted(sender: Model, instance: object, **kwargs) -> None:
@@ -23,17 +25,18 @@ def entity_deleted(sender: Model, instance: object, **kwargs) -> None:
         queue_refresh_recipe_index(DELETE, instance)
         return
 
-    affected_recipe = get_affected_recipe(instance)
-    if affected_recipe:
-        queue_refresh_recipe_index(UPDATE, affected_recipe)
+    affected_recipe_uid = get_affected_recipe_uid(instance)
+    if affected_recipe_uid:
+        queue_refresh_recipe_uids(UPDATE, [affected_recipe_uid])
 
 
-def get_affected_recipe(instance):
+# Optimization: Use the foreign key value => The recipe isn't loaded for every saved ingredient
+def get_affected_recipe_uid(instance) -> Optional[str]:
     if isinstance(instance, RecipeHop):
-        return instance.recipe
+        return instance.recipe_id
     elif isinstance(instance, RecipeFermentable):
-        return instance.recipe
+        return instance.recipe_id
     elif isinstance(instance, RecipeYeast):
-        return instance.recipe
+        return instance.recipe_id
 
     return None
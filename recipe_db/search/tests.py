@@ -0,0 +1,137 @@
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+
+from recipe_db.models import Recipe, RecipeHop, SearchIndexUpdateQueue
+from recipe_db.search.recipe_index import suspend_recipe_index_updates, redirect_recipe_index_updates, \
+    get_recipes_bulk_updates, get_recipes_bulk_inserts, get_recipe_uid_ranges, RECIPES_INDEX_NAME, UPDATE, DELETE
+
+
+class RecipeIndexQueueTest(TestCase):
+    def get_queue(self) -> list:
+        return list(SearchIndexUpdateQueue.objects.order_by("id").values_list("entity_id", "operation"))
+
+    def create_recipe(self, uid: str) -> Recipe:
+        recipe = Recipe.objects.create(uid=uid, source="test", source_id=uid)
+        for kind_raw in ["Citra", "Mosaic", "Simcoe"]:
+            RecipeHop.objects.create(recipe=recipe, kind_raw=kind_raw)
+        return recipe
+
+    def test_queue_once_per_recipe_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe("test:1")
+            self.create_recipe("test:2")
+            self.assertEqual([], self.get_queue())
+
+        self.assertEqual([("test:1", UPDATE), ("test:2", UPDATE)], self.get_queue())
+
+    def test_last_operation_wins(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_recipe("test:1").delete()
+
+        self.assertEqual([("test:1", DELETE)], self.get_queue())
+
+    def test_discard_rolled_back_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.create_recipe("test:1")
+                    raise ValueError()
+            except ValueError:
+                pass
+            self.create_recipe("test:2")
+
+        self.assertEqual([("test:2", UPDATE)], self.get_queue())
+
+    def test_update_recipe_of_rolled_back_delete(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = self.create_recipe("test:1")
+            try:
+                with transaction.atomic():
+                    recipe.delete()
+                    raise ValueError()
+            except ValueError:
+                pass
+
+        self.assertTrue(Recipe.objects.filter(uid="test:1").exists())
+        self.assertEqual([("test:1", UPDATE)], self.get_queue())
+
+    def test_suspend(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with suspend_recipe_index_updates():
+                self.create_recipe("test:1")
+
+        self.assertEqual([], self.get_queue())
+
+    def test_redirect(self):
+        updates = set()
+        with self.captureOnCommitCallbacks(execute=True):
+            with redirect_recipe_index_updates(lambda operation, uid: updates.add((uid, operation))):
+                self.create_recipe("test:1")
+
+        self.assertEqual({("test:1", UPDATE)}, updates)
+        self.assertEqual([], self.get_queue())
+
+
+class RecipesBulkUpdatesTest(TestCase):
+    def queue(self, uid: str, operation: str) -> None:
+        SearchIndexUpdateQueue.objects.create(index=RECIPES_INDEX_NAME, entity_id=uid, operation=operation)
+
+    def test_last_operation_per_recipe(self):
+        Recipe.objects.create(uid="test:1", source="test", source_id="1", name="First")
+        Recipe.objects.create(uid="test:2", source="test", source_id="2", name="Second")
+        self.queue("test:1", UPDATE)
+        self.queue("test:2", UPDATE)
+        self.queue("test:1", UPDATE)
+        self.queue("test:2", DELETE)
+        self.queue("test:3", UPDATE)  # Doesn't exist
+
+        with self.assertNumQueries(7):  # Queue, recipes, 4 prefetches, delete
+            documents = list(get_recipes_bulk_updates())
+
+        self.assertEqual(3, len(documents))
+        self.assertEqual(("test:1", "First"), (documents[0]["_id"], documents[0]["_source"]["name"]))
+        self.assertEqual({"delete": {"_index": RECIPES_INDEX_NAME, "_id": "test:2"}}, documents[1])
+        self.assertEqual({"delete": {"_index": RECIPES_INDEX_NAME, "_id": "test:3"}}, documents[2])
+        self.assertEqual(0, SearchIndexUpdateQueue.objects.count())
+
+    def test_chunks(self):
+        Recipe.objects.create(uid="test:1", source="test", source_id="1")
+        for _ in range(3):
+            self.queue("test:1", UPDATE)
+        self.queue("test:2", DELETE)
+
+        with mock.patch("recipe_db.search.recipe_index.CHUNK_SIZE", 2):
+            documents = list(get_recipes_bulk_updates())
+
+        self.assertEqual(["test:1", "test:1"], [document["_id"] for document in documents[:2]])
+        self.assertEqual({"delete": {"_index": RECIPES_INDEX_NAME, "_id": "test:2"}}, documents[2])
+        self.assertEqual(0, SearchIndexUpdateQueue.objects.count())
+
+
+class RecipeUidRangesTest(TestCase):
+    def setUp(self) -> None:
+        for i in range(10):
+            Recipe.objects.create(uid="test:{}".format(i), source="test", source_id=str(i))
+
+    def test_ranges_cover_all_recipes_once(self):
+        uid_ranges = get_recipe_uid_ranges(3)
+
+        self.assertEqual(3, len(uid_ranges))
+        self.assertIsNone(uid_ranges[0][0])
+        self.assertIsNone(uid_ranges[-1][1])
+
+        uids = []
+        for (start_uid, end_uid) in uid_ranges:
+            range_uids = [document["_id"] for document in get_recipes_bulk_inserts(None, start_uid, end_uid)]
+            self.assertGreaterEqual(len(range_uids), 3)
+            uids.extend(range_uids)
+        self.assertEqual(["test:{}".format(i) for i in range(10)], uids)
+
+    def test_more_ranges_than_recipes(self):
+        uid_ranges = get_recipe_uid_ranges(20)
+
+        uids = [document["_id"] for (start, end) in uid_ranges for document in get_recipes_bulk_inserts(None, start, end)]
+        self.assertEqual(10, len(uids))
+        self.assertEqual(10, len(set(uids)))
@@ -4,6 +4,7 @@ import datetime
 from abc import ABC
 from typing import Optional
 
+from recipe_db.analytics.instrumentation import chart_context
 from recipe_db.analytics.recipe import RecipesPopularityAnalysis
 from recipe_db.analytics.scope import RecipeScope
 from recipe_db.analytics.utils import months_ago
@@ -51,7 +52,8 @@ class AdminChartFactory:
 
     @classmethod
     def plot_chart(cls, chart_type: str, filter_param: Optional[str] = "") -> Chart:
-        return cls.get_chart(chart_type, filter_param).plot()
+        with chart_context("admin:" + cls.normalize_type(chart_type)):
+            return cls.get_chart(chart_type, filter_param).plot()
 
     @classmethod
     def is_supported_chart(cls, chart_type: str) -> bool:
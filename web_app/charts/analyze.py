@@ -2,6 +2,7 @@ from abc import ABC
 
 from recipe_db.analytics.fermentable import FermentableAmountAnalysis
 from recipe_db.analytics.hop import HopPairingAnalysis, HopAmountAnalysis
+from recipe_db.analytics.instrumentation import chart_context
 from recipe_db.analytics.recipe import RecipesTrendAnalysis, RecipesPopularityAnalysis, CommonStylesAnalysis
 from recipe_db.analytics.scope import RecipeScope
 from web_app.charts.utils import Chart, ChartDefinition, NoDataException
@@ -188,7 +189,8 @@ class AnalyzeChartFactory:
 
     @classmethod
     def plot_chart(cls, chart_type: str, scope: RecipeScope) -> Chart:
-        return cls.get_chart(chart_type, scope).plot()
+        with chart_context("analyze:" + cls.normalize_type(chart_type)):
+            return cls.get_chart(chart_type, scope).plot()
 
     @classmethod
     def is_supported_chart(cls, chart_type: str) -> bool:
@@ -1,5 +1,6 @@
 from abc import ABC
 
+from recipe_db.analytics.instrumentation import chart_context
 from recipe_db.analytics.spotlight.fermentable import FermentableAnalysis
 from recipe_db.models import Fermentable
 from web_app.charts.utils import NoDataException, Chart, ChartDefinition
@@ -126,7 +127,8 @@ class FermentableChartFactory:
 
     @classmethod
     def plot_chart(cls, fermentable: Fermentable, chart_type: str) -> Chart:
-        return cls.get_chart(fermentable, chart_type).plot()
+        with chart_context("fermentable:" + cls.normalize_type(chart_type)):
+            return cls.get_chart(fermentable, chart_type).plot()
 
     @classmethod
     def is_supported_chart(cls, chart_type: str) -> bool:
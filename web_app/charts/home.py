@@ -1,5 +1,6 @@
 from abc import ABC
 
+from recipe_db.analytics.instrumentation import chart_context
 from recipe_db.analytics.recipe import RecipesPopularityAnalysis
 from recipe_db.analytics.scope import RecipeScope, HopSelection, StyleSelection
 from recipe_db.models import Hop, Style
@@ -123,7 +124,8 @@ class HomeChartFactory:
 
     @classmethod
     def plot_chart(cls, chart_type: str) -> Chart:
-        return cls.get_chart(chart_type).plot()
+        with chart_context("home:" + cls.normalize_type(chart_type)):
+            return cls.get_chart(chart_type).plot()
 
     @classmethod
     def is_supported_chart(cls, chart_type: str) -> bool:
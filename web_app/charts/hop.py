@@ -1,5 +1,6 @@
 from abc import ABC
 
+from recipe_db.analytics.instrumentation import chart_context
 from recipe_db.analytics.spotlight.hop import HopAnalysis
 from recipe_db.models import Hop
 from web_app.charts.utils import NoDataException, Chart, ChartDefinition
@@ -217,7 +218,8 @@ class HopChartFactory:
 
     @classmethod
     def plot_chart(cls, hop: Hop, chart_type: str) -> Chart:
-        return cls.get_chart(hop, chart_type).plot()
+        with chart_context("hop:" + cls.normalize_type(chart_type)):
+            return cls.get_chart(hop, chart_type).plot()
 
     @classmethod
     def is_supported_chart(cls, chart_type: str) -> bool:
@@ -1,6 +1,7 @@
 from abc import ABC
 from typing import Optional
 
+from recipe_db.analytics.instrumentation import chart_context
 from recipe_db.analytics.spotlight.style import StyleAnalysis
 from recipe_db.models import Style
 from web_app.charts.utils import NoDataException, Chart, ChartDefinition
@@ -245,7 +246,8 @@ class StyleChartFactory:
 
     @classmethod
     def plot_chart(cls, style: Style, chart_type: str, filter_param: Optional[str] = "") -> Chart:
-        return cls.get_chart(style, chart_type, filter_param).plot()
+        with chart_context("style:" + cls.normalize_type(chart_type)):
+            return cls.get_chart(style, chart_type, filter_param).plot()
 
     @classmethod
     def is_supported_chart(cls, chart_type: str) -> bool:
@@ -5,6 +5,7 @@ from enum import Enum
 from typing import Optional
 
 from recipe_db.analytics.hop import HopSearchAnalysis
+from recipe_db.analytics.instrumentation import chart_context
 from recipe_db.analytics.recipe import RecipesPopularityAnalysis, RecipesTrendAnalysis
 from recipe_db.analytics.scope import RecipeScope, HopSelection, YeastSelection
 from recipe_db.analytics.spotlight.hop import HOP_FILTER_TO_USES
@@ -273,7 +274,8 @@ class TrendChartFactory:
 
     @classmethod
     def plot_chart(cls, chart_type: str, period: TrendPeriod, filter_param: Optional[str] = "") -> Chart:
-        return cls.get_chart(chart_type, period, filter_param).plot()
+        with chart_context("trend:" + cls.normalize_type(chart_type)):
+            return cls.get_chart(chart_type, period, filter_param).plot()
 
     @classmethod
     def is_supported_chart(cls, chart_type: str) -> bool:
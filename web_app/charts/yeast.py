@@ -1,5 +1,6 @@
 from abc import ABC
 
+from recipe_db.analytics.instrumentation import chart_context
 from recipe_db.analytics.spotlight.yeast import YeastAnalysis
 from recipe_db.models import Yeast
 from web_app.charts.utils import NoDataException, Chart, ChartDefinition
@@ -113,7 +114,8 @@ class YeastChartFactory:
 
     @classmethod
     def plot_chart(cls, yeast: Yeast, chart_type: str) -> Chart:
-        return cls.get_chart(yeast, chart_type).plot()
+        with chart_context("yeast:" + cls.normalize_type(chart_type)):
+            return cls.get_chart(yeast, chart_type).plot()
 
     @classmethod
     def is_supported_chart(cls, chart_type: str) -> bool:
@@ -1,11 +1,15 @@
 import random
+import time
 from typing import Iterable, List
+from urllib.parse import urlparse
 
 import requests
 from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.test import Client
 from django.urls import reverse
 
+from recipe_db.analytics.memoize import bundle
 from recipe_db.models import Hop, Fermentable, Yeast, Style
 from web_app.charts.fermentable import FermentableChartFactory
 from web_app.charts.hop import HopChartFactory
@@ -23,9 +27,18 @@ class Command(BaseCommand):
 
     def add_arguments(self, parser):
         parser.add_argument("--entities", "-e", nargs="+", type=str, help="Entities to recalculate")
+        parser.add_argument(
+            "--in-process",
+            action="store_true",
+            help="Render the charts in this process, all charts of an entity are calculated from shared data",
+        )
 
     def handle(self, *args, **options) -> None:
         entities = options["entities"] or ["style", "hop", "fermentable", "yeast", "trend"]
+        if options["in_process"]:
+            self.warmup_in_process(entities)
+            return
+
         if "style" in entities:
             self.warmup_urls(self.randomize_set(self.get_warmup_urls_for_style()))
         if "hop" in entities:
@@ -37,14 +50,46 @@ class Command(BaseCommand):
         if "trend" in entities:
             self.warmup_urls(self.randomize_set(self.get_warmup_urls_for_trends()))
 
-    def get_warmup_urls_for_style(self) -> Iterable[str]:
+    def warmup_in_process(self, entities: List[str]) -> None:
+        bundles = []
+        if "style" in entities:
+            bundles += [self.generate_style_urls([style]) for style in self.unique(self.get_warmup_styles())]
+        if "hop" in entities:
+            bundles += [self.generate_hop_urls([hop]) for hop in self.unique(self.get_warmup_hops())]
+        if "fermentable" in entities:
+            bundles += [
+                self.generate_fermentable_urls([fermentable])
+                for fermentable in self.unique(self.get_warmup_fermentables())
+            ]
+        if "yeast" in entities:
+            bundles += [self.generate_yeast_urls([yeast]) for yeast in self.unique(self.get_warmup_yeasts())]
+        if "trend" in entities:
+            bundles.append(self.get_warmup_urls_for_trends())
+
+        # The requests pass the regular view and cache middleware, so the same cache entries are populated
+        app_url = urlparse(BASE_URL)
+        client = Client(raise_request_exception=False, HTTP_HOST=app_url.netloc)
+        for urls in bundles:
+            start = time.perf_counter()
+            with bundle():
+                for url in urls:
+                    self.stdout.write(url)
+                    response = client.get(urlparse(url).path, secure=app_url.scheme == "https")
+                    self.stdout.write(str(response.status_code))
+            self.stdout.write("Bundle - %.3f sec." % (time.perf_counter() - start))
+
+    def unique(self, items: Iterable) -> list:
+        return list({item.id: item for item in items}.values())
+
+    def get_warmup_styles(self) -> Iterable[Style]:
         # Most popular styles by search
-        styles = Style.get_most_searched(WARMUP_MOST_SEARCHED)
-        yield from self.generate_style_urls(styles)
+        yield from Style.get_most_searched(WARMUP_MOST_SEARCHED)
 
         # Largest datasets
-        styles = Style.objects.filter(recipes_percentile__gt=WARMUP_PERCENTILE)
-        yield from self.generate_style_urls(styles)
+        yield from Style.objects.filter(recipes_percentile__gt=WARMUP_PERCENTILE)
+
+    def get_warmup_urls_for_style(self) -> Iterable[str]:
+        yield from self.generate_style_urls(self.get_warmup_styles())
 
     def generate_style_urls(self, styles):
         for style in styles:
@@ -68,14 +113,15 @@ class Command(BaseCommand):
                         ),
                     )
 
-    def get_warmup_urls_for_hop(self) -> Iterable[str]:
+    def get_warmup_hops(self) -> Iterable[Hop]:
         # Most popular hops by search
-        hops = Hop.get_most_searched(WARMUP_MOST_SEARCHED)
-        yield from self.generate_hop_urls(hops)
+        yield from Hop.get_most_searched(WARMUP_MOST_SEARCHED)
 
         # Largest datasets
-        hops = Hop.objects.filter(recipes_percentile__gt=WARMUP_PERCENTILE)
-        yield from self.generate_hop_urls(hops)
+        yield from Hop.objects.filter(recipes_percentile__gt=WARMUP_PERCENTILE)
+
+    def get_warmup_urls_for_hop(self) -> Iterable[str]:
+        yield from self.generate_hop_urls(self.get_warmup_hops())
 
     def generate_hop_urls(self, hops) -> Iterable[str]:
         for hop in hops:
@@ -90,14 +136,15 @@ class Command(BaseCommand):
                     ),
                 )
 
-    def get_warmup_urls_for_fermentable(self) -> Iterable[str]:
+    def get_warmup_fermentables(self) -> Iterable[Fermentable]:
         # Most popular fermentables by search
-        fermentables = Fermentable.get_most_searched(WARMUP_MOST_SEARCHED)
-        yield from self.generate_fermentable_urls(fermentables)
+        yield from Fermentable.get_most_searched(WARMUP_MOST_SEARCHED)
 
         # Largest datasets
-        fermentables = Fermentable.objects.filter(recipes_percentile__gt=WARMUP_PERCENTILE)
-        yield from self.generate_fermentable_urls(fermentables)
+        yield from Fermentable.objects.filter(recipes_percentile__gt=WARMUP_PERCENTILE)
+
+    def get_warmup_urls_for_fermentable(self) -> Iterable[str]:
+        yield from self.generate_fermentable_urls(self.get_warmup_fermentables())
 
     def generate_fermentable_urls(self, fermentables) -> Iterable[str]:
         for fermentable in fermentables:
@@ -112,14 +159,15 @@ class Command(BaseCommand):
                     ),
                 )
 
-    def get_warmup_urls_for_yeast(self) -> Iterable[str]:
+    def get_warmup_yeasts(self) -> Iterable[Yeast]:
         # Most popular yeasts by search
-        yeasts = Yeast.get_most_searched(WARMUP_MOST_SEARCHED)
-        yield from self.generate_yeast_urls(yeasts)
+        yield from Yeast.get_most_searched(WARMUP_MOST_SEARCHED)
 
         # Largest datasets
-        yeasts = Yeast.objects.filter(recipes_percentile__gt=WARMUP_PERCENTILE)
-        yield from self.generate_yeast_urls(yeasts)
+        yield from Yeast.objects.filter(recipes_percentile__gt=WARMUP_PERCENTILE)
+
+    def get_warmup_urls_for_yeast(self) -> Iterable[str]:
+        yield from self.generate_yeast_urls(self.get_warmup_yeasts())
 
     def generate_yeast_urls(self, yeasts) -> Iterable[str]:
         for yeast in yeasts:
@@ -0,0 +1,30 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from recipe_db.analytics.instrumentation import log_memoize_stats
+from recipe_db.analytics.memoize import memoization
+
+
+# Shared analyses (e.g. recipes per month) are only calculated once per request. The memoization stats of the request
+# are logged with ANALYTICS_QUERY_LOG.
+class AnalyticsMemoizationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with memoization() as stats:
+            response = self.get_response(request)
+        log_memoize_stats(stats, request.path)
+        return response
+
+    async def __acall__(self, request):
+        with memoization() as stats:
+            response = await self.get_response(request)
+        log_memoize_stats(stats, request.path)
+        return response
@@ -0,0 +1,49 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Optional
+
+from recipe_db.data_version import get_data_version
+
+
+# In-process LRU cache for rendered results, limited by number of entries and total size. All entries are dropped
+# when the data version changes, so results don't expire by time.
+class ResultCache:
+    def __init__(self, max_entries: int, max_bytes: int) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.data_version: Optional[int] = None
+        self.lock = Lock()
+
+    def get(self, key) -> Optional[bytes]:
+        data_version = get_data_version()
+        with self.lock:
+            self._check_data_version(data_version)
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+
+        data_version = get_data_version()
+        with self.lock:
+            self._check_data_version(data_version)
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = value
+            self.size += len(value)
+
+            # Evict least recently used entries
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def _check_data_version(self, data_version: int) -> None:
+        if self.data_version != data_version:
+            self.entries.clear()
+            self.size = 0
+            self.data_version = data_version
@@ -0,0 +1,98 @@
+import json
+from unittest import mock
+
+from django.core.cache import caches
+from django.test import TransactionTestCase, RequestFactory, override_settings
+from django.utils.cache import get_cache_key
+
+from recipe_db.models import Hop, Recipe, RecipeHop
+from web_app.result_cache import ResultCache
+from web_app.views.utils import CHART_EXECUTOR
+
+LOCMEM_CACHES = {
+    alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": alias}
+    for alias in ["default", "data", "images"]
+}
+
+
+# The calculations run in the threads of the chart executor, which only see committed data
+@override_settings(CACHES=LOCMEM_CACHES, ANALYTICS_CHART_THREADS=2)
+class AsyncViewsTest(TransactionTestCase):
+    def setUp(self) -> None:
+        for cache in caches.all():
+            cache.clear()
+
+        self.hop = Hop.objects.create(id="citra", name="Citra", use=Hop.AROMA, recipes_count=3)
+        for i in range(3):
+            recipe = Recipe.objects.create(uid="r%d" % i, name="Recipe %d" % i, abv=5.0 + i)
+            RecipeHop.objects.create(recipe=recipe, kind=self.hop, use=RecipeHop.DRY_HOP, amount_percent=10.0 * (i + 1))
+            recipe.associated_hops.set([self.hop])
+
+        # Counts the calculations which are handed to the chart executor
+        patcher = mock.patch.object(CHART_EXECUTOR, "submit", wraps=CHART_EXECUTOR.submit)
+        self.submit = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_chart_data_cached(self):
+        url = "/hops/aroma/citra/charts/amount-used-per-use.json"
+        response = await self.async_client.get(url)
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(1, self.submit.call_count)
+        self.assertIn("max-age=", response["Cache-Control"])
+
+        cached_response = await self.async_client.get(url)
+        self.assertEqual(200, cached_response.status_code)
+        self.assertEqual(response.content, cached_response.content)
+        self.assertEqual(1, self.submit.call_count)
+
+    async def test_chart_data_cache_key(self):
+        # The responses are stored under the same keys as with cache_page
+        url = "/hops/aroma/citra/charts/amount-used-per-use.json"
+        await self.async_client.get(url)
+        request = RequestFactory().get(url)
+        self.assertIsNotNone(get_cache_key(request, key_prefix="", cache=caches["data"]))
+        self.assertIsNone(get_cache_key(request, key_prefix="", cache=caches["images"]))
+
+    async def test_trend_chart_no_data(self):
+        response = await self.async_client.get("/trends/recent/popular-hops.json")
+        self.assertEqual(200, response.status_code)
+        await self.async_client.get("/trends/recent/popular-hops.json")
+        self.assertEqual(1, self.submit.call_count)
+
+    async def test_unknown_chart(self):
+        response = await self.async_client.get("/hops/aroma/citra/charts/unknown.json")
+        self.assertEqual(404, response.status_code)
+        response = await self.async_client.get("/hops/aroma/citra/charts/unknown.json")
+        self.assertEqual(404, response.status_code)
+        self.assertEqual(2, self.submit.call_count)
+
+    async def test_recipes_not_cached(self):
+        for _ in range(2):
+            response = await self.async_client.get("/hops/aroma/citra/recipes/random.inc")
+            self.assertEqual(200, response.status_code)
+            self.assertIn("max-age=0", response["Cache-Control"])
+        self.assertEqual(2, self.submit.call_count)
+
+    async def test_analyze_count(self):
+        with mock.patch("web_app.views.analyze.ANALYZER_RESULTS", ResultCache(max_entries=10, max_bytes=10000)):
+            response = await self.async_client.get("/analyze/count.json?hops=citra")
+            self.assertEqual(200, response.status_code)
+            self.assertEqual({"count": 3}, json.loads(response.content))
+            self.assertIn("max-age=0", response["Cache-Control"])
+
+            # Served from the analyzer results
+            response = await self.async_client.get("/analyze/count.json?hops=citra")
+            self.assertEqual({"count": 3}, json.loads(response.content))
+            self.assertEqual(1, self.submit.call_count)
+
+            response = await self.async_client.get("/analyze/count.json")
+            self.assertEqual({"count": 3}, json.loads(response.content))
+            self.assertEqual(2, self.submit.call_count)
+
+    async def test_analyze_chart(self):
+        with mock.patch("web_app.views.analyze.ANALYZER_RESULTS", ResultCache(max_entries=10, max_bytes=100000)):
+            response = await self.async_client.get("/analyze/charts/popular-hops-amount.json")
+            self.assertEqual(200, response.status_code)
+            response = await self.async_client.get("/analyze/charts/popular-hops-amount.json")
+            self.assertEqual(200, response.status_code)
+            self.assertEqual(1, self.submit.call_count)
@@ -1,6 +1,7 @@
 import json
 from typing import List, Tuple, Optional
 
+from asgiref.sync import sync_to_async
 from django.http import HttpResponse, HttpRequest, Http404, JsonResponse
 from django.shortcuts import render
 from django.urls import reverse
@@ -14,7 +15,12 @@ from web_app import DEFAULT_PAGE_CACHE_TIME
 from web_app.charts.analyze import AnalyzeChartFactory
 from web_app.charts.utils import NoDataException
 from web_app.meta import PageMeta
-from web_app.views.utils import render_chart, FORMAT_JSON, render_recipes_list, no_data_response
+from web_app.result_cache import ResultCache
+from web_app.views.utils import render_chart, FORMAT_JSON, render_recipes_list, no_data_response, async_cache_page, \
+    run_calculation
+
+# Popular filter combinations are served from memory until the data is changed
+ANALYZER_RESULTS = ResultCache(max_entries=5000, max_bytes=128 * 1024 * 1024)
 
 
 @cache_page(DEFAULT_PAGE_CACHE_TIME, cache="default")
@@ -23,29 +29,48 @@ def result(request: HttpRequest) -> HttpResponse:
     return render(request, "analyze.html", {"meta": meta})
 
 
-@cache_page(0)
-def count(request: HttpRequest) -> HttpResponse:
-    recipes_scope = get_scope(request)
-    count = RecipesCountAnalysis(recipes_scope).total()
-    return HttpResponse(json.dumps({"count": count}), content_type="application/json")
+@async_cache_page(0)
+async def count(request: HttpRequest) -> HttpResponse:
+    recipes_scope = await sync_to_async(get_scope)(request)
+    cache_key = ("count", recipes_scope.get_key())
+    content = await sync_to_async(ANALYZER_RESULTS.get)(cache_key)
+    if content is None:
+        count = await run_calculation(RecipesCountAnalysis(recipes_scope).total)
+        content = json.dumps({"count": count}).encode()
+        await sync_to_async(ANALYZER_RESULTS.set)(cache_key, content)
 
+    return HttpResponse(content, content_type="application/json")
 
-@cache_page(0)
-def chart(request: HttpRequest, chart_type: str) -> HttpResponse:
-    recipes_scope = get_scope(request)
-    if AnalyzeChartFactory.is_supported_chart(chart_type):
-        try:
-            chart = AnalyzeChartFactory.plot_chart(chart_type, recipes_scope)
-        except NoDataException:
-            return no_data_response()
-    else:
+
+@async_cache_page(0)
+async def chart(request: HttpRequest, chart_type: str) -> HttpResponse:
+    if not AnalyzeChartFactory.is_supported_chart(chart_type):
         raise Http404("Unknown chart type %s." % chart_type)
 
-    return render_chart(chart, FORMAT_JSON)
+    recipes_scope = await sync_to_async(get_scope)(request)
+    cache_key = ("chart", chart_type, recipes_scope.get_key())
+    content = await sync_to_async(ANALYZER_RESULTS.get)(cache_key)
+    if content is None:
+        content = await run_calculation(plot_chart, chart_type, recipes_scope)
+        await sync_to_async(ANALYZER_RESULTS.set)(cache_key, content)
+
+    return HttpResponse(content, content_type="application/json")
+
+
+def plot_chart(chart_type: str, recipes_scope: RecipeScope) -> bytes:
+    try:
+        chart = AnalyzeChartFactory.plot_chart(chart_type, recipes_scope)
+        return render_chart(chart, FORMAT_JSON).content
+    except NoDataException:
+        return no_data_response().content
+
+
+@async_cache_page(0)
+async def recipes(request: HttpRequest) -> HttpResponse:
+    return await run_calculation(random_recipes, request)
 
 
-@cache_page(0)
-def recipes(request: HttpRequest) -> HttpResponse:
+def random_recipes(request: HttpRequest) -> HttpResponse:
     recipes_scope = get_scope(request)
     analysis = RecipesListAnalysis(recipes_scope)
     recipes_list = analysis.random(24)
@@ -81,9 +106,9 @@ def get_scope(request: HttpRequest) -> RecipeScope:
 
 def get_style_criteria(value: str) -> Optional[RecipeScope.StyleCriteria]:
     style_ids = list(map(str.strip, value.split(",")))
-    styles = Style.objects.filter(id__in=style_ids)
+    styles = list(Style.objects.filter(id__in=style_ids))
 
-    if styles.count() > 0:
+    if len(styles) > 0:
         style_criteria = RecipeScope.StyleCriteria()
         style_criteria.styles = styles
         return style_criteria
@@ -93,9 +118,9 @@ def get_style_criteria(value: str) -> Optional[RecipeScope.StyleCriteria]:
 
 def get_hop_criteria(value: str) -> Optional[RecipeScope.HopCriteria]:
     hops_ids = list(map(str.strip, value.split(",")))
-    hops = Hop.objects.filter(id__in=hops_ids)
+    hops = list(Hop.objects.filter(id__in=hops_ids))
 
-    if hops.count() > 0:
+    if len(hops) > 0:
         hop_criteria = RecipeScope.HopCriteria()
         hop_criteria.hops = hops
         return hop_criteria
@@ -105,9 +130,9 @@ def get_hop_criteria(value: str) -> Optional[RecipeScope.HopCriteria]:
 
 def get_fermentable_criteria(value: str) -> Optional[RecipeScope.FermentableCriteria]:
     fermentable_ids = list(map(str.strip, value.split(",")))
-    fermentables = Fermentable.objects.filter(id__in=fermentable_ids)
+    fermentables = list(Fermentable.objects.filter(id__in=fermentable_ids))
 
-    if fermentables.count() > 0:
+    if len(fermentables) > 0:
         fermentable_criteria = RecipeScope.FermentableCriteria()
         fermentable_criteria.fermentables = fermentables
         return fermentable_criteria
@@ -117,9 +142,9 @@ def get_fermentable_criteria(value: str) -> Optional[RecipeScope.FermentableCrit
 
 def get_yeast_criteria(value: str) -> Optional[RecipeScope.YeastCriteria]:
     yeasts_ids = list(map(str.strip, value.split(",")))
-    yeasts = Yeast.objects.filter(id__in=yeasts_ids)
+    yeasts = list(Yeast.objects.filter(id__in=yeasts_ids))
 
-    if yeasts.count() > 0:
+    if len(yeasts) > 0:
         yeast_criteria = RecipeScope.YeastCriteria()
         yeast_criteria.yeasts = yeasts
         return yeast_criteria
@@ -12,7 +12,7 @@ from web_app.charts.fermentable import FermentableChartFactory
 from web_app.charts.utils import NoDataException
 from web_app.meta import FermentableMeta, FermentableOverviewMeta
 from web_app.views.utils import render_chart, FORMAT_PNG, render_recipes_list, no_data_response, \
-    get_fermentable_description, get_fermentable_type_description
+    async_cache_page, run_calculation, get_fermentable_description, get_fermentable_type_description
 
 
 @cache_page(DEFAULT_PAGE_CACHE_TIME, cache="default")
@@ -104,14 +104,14 @@ def detail(request: HttpRequest, slug: str, category_id: str) -> HttpResponse:
     return render(request, "fermentable/detail.html", context)
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
-def chart_data(request: HttpRequest, slug: str, category_id: str, chart_type: str) -> HttpResponse:
-    return chart(request, slug, category_id, chart_type, "json")
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
+async def chart_data(request: HttpRequest, slug: str, category_id: str, chart_type: str) -> HttpResponse:
+    return await run_calculation(chart, request, slug, category_id, chart_type, "json")
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
-def chart_image(request: HttpRequest, slug: str, category_id: str, chart_type: str, format: str) -> HttpResponse:
-    return chart(request, slug, category_id, chart_type, format)
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
+async def chart_image(request: HttpRequest, slug: str, category_id: str, chart_type: str, format: str) -> HttpResponse:
+    return await run_calculation(chart, request, slug, category_id, chart_type, format)
 
 
 def chart(request: HttpRequest, slug: str, category_id: str, chart_type: str, format: str) -> HttpResponse:
@@ -141,8 +141,12 @@ def chart(request: HttpRequest, slug: str, category_id: str, chart_type: str, fo
     return render_chart(chart, format)
 
 
-@cache_page(0)
-def recipes(request: HttpRequest, slug: str, category_id: str) -> HttpResponse:
+@async_cache_page(0)
+async def recipes(request: HttpRequest, slug: str, category_id: str) -> HttpResponse:
+    return await run_calculation(random_recipes, request, slug, category_id)
+
+
+def random_recipes(request: HttpRequest, slug: str, category_id: str) -> HttpResponse:
     fermentable = get_object_or_404(Fermentable, pk=slug.lower())
 
     if fermentable.recipes_count is None or fermentable.recipes_count <= 0:
@@ -14,7 +14,8 @@ from web_app.charts.utils import NoDataException
 from web_app.meta import HopMeta, HopOverviewMeta, HopFlavorOverviewMeta, HopFlavorMeta
 from web_app.views.hop_flavor import redirect_to_hop_flavor
 from web_app.views.utils import render_chart, FORMAT_PNG, render_recipes_list, no_data_response, \
-    get_hop_type_description, get_flavor_description, get_hop_description, get_flavor_category_description
+    async_cache_page, run_calculation, get_hop_type_description, get_flavor_description, get_hop_description, \
+    get_flavor_category_description
 
 
 @cache_page(DEFAULT_PAGE_CACHE_TIME, cache="default")
@@ -108,14 +109,14 @@ def detail(request: HttpRequest, slug: str, category_id: str) -> HttpResponse:
     return render(request, "hop/detail.html", context)
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
-def chart_data(request: HttpRequest, slug: str, category_id: str, chart_type: str) -> HttpResponse:
-    return chart(request, slug, category_id, chart_type, "json")
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
+async def chart_data(request: HttpRequest, slug: str, category_id: str, chart_type: str) -> HttpResponse:
+    return await run_calculation(chart, request, slug, category_id, chart_type, "json")
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
-def chart_image(request: HttpRequest, slug: str, category_id: str, chart_type: str, format: str) -> HttpResponse:
-    return chart(request, slug, category_id, chart_type, format)
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
+async def chart_image(request: HttpRequest, slug: str, category_id: str, chart_type: str, format: str) -> HttpResponse:
+    return await run_calculation(chart, request, slug, category_id, chart_type, format)
 
 
 def chart(request: HttpRequest, slug: str, category_id: str, chart_type: str, format: str) -> HttpResponse:
@@ -138,8 +139,12 @@ def chart(request: HttpRequest, slug: str, category_id: str, chart_type: str, fo
     return render_chart(chart, format)
 
 
-@cache_page(0)
-def recipes(request: HttpRequest, slug: str, category_id: str) -> HttpResponse:
+@async_cache_page(0)
+async def recipes(request: HttpRequest, slug: str, category_id: str) -> HttpResponse:
+    return await run_calculation(random_recipes, request, slug, category_id)
+
+
+def random_recipes(request: HttpRequest, slug: str, category_id: str) -> HttpResponse:
     hop = get_object_or_404(Hop, pk=slug.lower())
 
     if hop.recipes_count is None or hop.recipes_count <= 0:
@@ -12,7 +12,7 @@ from web_app.charts.style import StyleChartFactory
 from web_app.charts.utils import NoDataException
 from web_app.meta import StyleOverviewMeta, StyleMeta
 from web_app.views.utils import render_chart, FORMAT_PNG, render_recipes_list, no_data_response, \
-    get_style_description
+    async_cache_page, run_calculation, get_style_description
 
 
 @cache_page(DEFAULT_PAGE_CACHE_TIME, cache="default")
@@ -66,14 +66,14 @@ def display_style(request: HttpRequest, style: Style) -> HttpResponse:
     return render(request, "style/detail.html", context)
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
-def category_chart_data(request: HttpRequest, category_slug: str, chart_type: str) -> HttpResponse:
-    return category_chart(request, category_slug, chart_type, "json")
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
+async def category_chart_data(request: HttpRequest, category_slug: str, chart_type: str) -> HttpResponse:
+    return await run_calculation(category_chart, request, category_slug, chart_type, "json")
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
-def category_chart_image(request: HttpRequest, category_slug: str, chart_type: str, format: str) -> HttpResponse:
-    return category_chart(request, category_slug, chart_type, format)
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
+async def category_chart_image(request: HttpRequest, category_slug: str, chart_type: str, format: str) -> HttpResponse:
+    return await run_calculation(category_chart, request, category_slug, chart_type, format)
 
 
 def category_chart(request: HttpRequest, category_slug: str, chart_type: str, format: str) -> HttpResponse:
@@ -87,14 +87,14 @@ def category_chart(request: HttpRequest, category_slug: str, chart_type: str, fo
     return display_chart(request, style, chart_type, format)
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
-def chart_data(request: HttpRequest, slug: str, category_slug: str, chart_type: str) -> HttpResponse:
-    return chart(request, slug, category_slug, chart_type, "json")
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
+async def chart_data(request: HttpRequest, slug: str, category_slug: str, chart_type: str) -> HttpResponse:
+    return await run_calculation(chart, request, slug, category_slug, chart_type, "json")
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
-def chart_image(request: HttpRequest, slug: str, category_slug: str, chart_type: str, format: str) -> HttpResponse:
-    return chart(request, slug, category_slug, chart_type, format)
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
+async def chart_image(request: HttpRequest, slug: str, category_slug: str, chart_type: str, format: str) -> HttpResponse:
+    return await run_calculation(chart, request, slug, category_slug, chart_type, format)
 
 
 def chart(request: HttpRequest, slug: str, category_slug: str, chart_type: str, format: str) -> HttpResponse:
@@ -110,8 +110,12 @@ def chart(request: HttpRequest, slug: str, category_slug: str, chart_type: str,
     return display_chart(request, style, chart_type, format)
 
 
-@cache_page(0)
-def category_recipes(request: HttpRequest, category_slug: str) -> HttpResponse:
+@async_cache_page(0)
+async def category_recipes(request: HttpRequest, category_slug: str) -> HttpResponse:
+    return await run_calculation(category_random_recipes, request, category_slug)
+
+
+def category_random_recipes(request: HttpRequest, category_slug: str) -> HttpResponse:
     style = get_object_or_404(Style, slug=category_slug.lower())
 
     if not style.is_category:
@@ -121,8 +125,12 @@ def category_recipes(request: HttpRequest, category_slug: str) -> HttpResponse:
     return render_recipes_list(request, recipes_list, "Styles")
 
 
-@cache_page(0)
-def recipes(request: HttpRequest, slug: str, category_slug: str) -> HttpResponse:
+@async_cache_page(0)
+async def recipes(request: HttpRequest, slug: str, category_slug: str) -> HttpResponse:
+    return await run_calculation(random_recipes, request, slug, category_slug)
+
+
+def random_recipes(request: HttpRequest, slug: str, category_slug: str) -> HttpResponse:
     style = get_object_or_404(Style, slug=slug.lower())
 
     if style.is_category:
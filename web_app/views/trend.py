@@ -9,7 +9,7 @@ from web_app import DEFAULT_PAGE_CACHE_TIME
 from web_app.charts.trend import TrendChartFactory, TrendPeriod
 from web_app.charts.utils import NoDataException
 from web_app.meta import TrendMeta, PopularHopsMeta, PopularYeastsMeta, PopularStylesMeta
-from web_app.views.utils import render_chart, no_data_response
+from web_app.views.utils import render_chart, no_data_response, async_cache_page, run_calculation
 
 
 @cache_page(DEFAULT_PAGE_CACHE_TIME, cache="default")
@@ -33,14 +33,14 @@ def overview(request: HttpRequest, period: str) -> HttpResponse:
     return render(request, "trend/overview.html", context)
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
-def chart_data(request: HttpRequest, period: str, chart_type: str) -> HttpResponse:
-    return chart(request, period, chart_type, "json")
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
+async def chart_data(request: HttpRequest, period: str, chart_type: str) -> HttpResponse:
+    return await run_calculation(chart, request, period, chart_type, "json")
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
-def chart_image(request: HttpRequest, period: str, chart_type: str, format: str) -> HttpResponse:
-    return chart(request, period, chart_type, format)
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
+async def chart_image(request: HttpRequest, period: str, chart_type: str, format: str) -> HttpResponse:
+    return await run_calculation(chart, request, period, chart_type, format)
 
 
 def chart(request: HttpRequest, period: str, chart_type: str, format: str) -> HttpResponse:
@@ -1,10 +1,14 @@
-from typing import Optional, Iterable
+import functools
+from typing import Optional, Iterable, Callable
 
+from asgiref.sync import sync_to_async
 from django.http import HttpResponse, Http404, HttpRequest, JsonResponse
+from django.middleware.cache import CacheMiddleware
 from django.shortcuts import render
 from django.urls import reverse
 from django.views.decorators.cache import cache_page
 
+from recipe_db.analytics.executor import BoundedExecutor, run_in_executor
 from recipe_db.models import Style, Hop, Fermentable, Yeast, Recipe, Tag
 from recipe_db.search.result import RecipeResultBuilder
 from web_app.charts.utils import Chart
@@ -14,6 +18,13 @@ FORMAT_SVG = "svg"
 FORMAT_JSON = "json"
 FORMATS = [FORMAT_PNG, FORMAT_SVG, FORMAT_JSON]
 
+# Chart calculations of the async views run in this pool, so a few slow calculations can't block the process
+CHART_EXECUTOR = BoundedExecutor("ANALYTICS_CHART_THREADS", "chart")
+
+
+async def run_calculation(callback: Callable, *args):
+    return await run_in_executor(CHART_EXECUTOR, callback, *args)
+
 
 def render_chart(chart: Chart, data_format: str) -> HttpResponse:
     if data_format == FORMAT_PNG:
@@ -143,3 +154,26 @@ def conditional_cache_page(timeout, condition, *, cache=None, key_prefix=None):
             return func(request, *args, **kwargs)
         return wrapper
     return decorator
+
+
+def async_cache_page(timeout: int, *, cache: Optional[str] = None, key_prefix: Optional[str] = None):
+    """Caches the response of an async view like cache_page, with the same cache keys (key prefix, Vary headers).
+    The cache middleware runs in a thread like the async cache API does, so the view itself stays async.
+    A timeout of 0 only sets the cache headers.
+    """
+
+    def decorator(view):
+        middleware = CacheMiddleware(view, page_timeout=timeout, cache_alias=cache, key_prefix=key_prefix)
+
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            response = await sync_to_async(middleware.process_request)(request)
+            if response is not None:
+                return response
+
+            response = await view(request, *args, **kwargs)
+            return await sync_to_async(middleware.process_response)(request, response)
+
+        return wrapper
+
+    return decorator
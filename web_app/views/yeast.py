@@ -12,7 +12,7 @@ from web_app.charts.utils import NoDataException
 from web_app.charts.yeast import YeastChartFactory
 from web_app.meta import YeastMeta, YeastOverviewMeta
 from web_app.views.utils import render_chart, FORMAT_PNG, render_recipes_list, no_data_response, \
-    get_yeast_type_description, get_yeast_description
+    async_cache_page, run_calculation, get_yeast_type_description, get_yeast_description
 
 
 @cache_page(DEFAULT_PAGE_CACHE_TIME, cache="default")
@@ -89,14 +89,14 @@ def detail(request: HttpRequest, slug: str, type_id: str) -> HttpResponse:
     return render(request, "yeast/detail.html", context)
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
-def chart_data(request: HttpRequest, slug: str, type_id: str, chart_type: str) -> HttpResponse:
-    return chart(request, slug, type_id, chart_type, "json")
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="data")
+async def chart_data(request: HttpRequest, slug: str, type_id: str, chart_type: str) -> HttpResponse:
+    return await run_calculation(chart, request, slug, type_id, chart_type, "json")
 
 
-@cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
-def chart_image(request: HttpRequest, slug: str, type_id: str, chart_type: str, format: str) -> HttpResponse:
-    return chart(request, slug, type_id, chart_type, format)
+@async_cache_page(DEFAULT_PAGE_CACHE_TIME, cache="images")
+async def chart_image(request: HttpRequest, slug: str, type_id: str, chart_type: str, format: str) -> HttpResponse:
+    return await run_calculation(chart, request, slug, type_id, chart_type, format)
 
 
 def chart(request: HttpRequest, slug: str, type_id: str, chart_type: str, format: str) -> HttpResponse:
@@ -119,8 +119,12 @@ def chart(request: HttpRequest, slug: str, type_id: str, chart_type: str, format
     return render_chart(chart, format)
 
 
-@cache_page(0)
-def recipes(request: HttpRequest, slug: str, type_id: str) -> HttpResponse:
+@async_cache_page(0)
+async def recipes(request: HttpRequest, slug: str, type_id: str) -> HttpResponse:
+    return await run_calculation(random_recipes, request, slug, type_id)
+
+
+def random_recipes(request: HttpRequest, slug: str, type_id: str) -> HttpResponse:
     yeast = get_object_or_404(Yeast, pk=slug.lower())
 
     if yeast.recipes_count is None or yeast.recipes_count <= 0: